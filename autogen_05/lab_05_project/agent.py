@@ -6,6 +6,8 @@ from autogen_agentchat.messages import TextMessage
 
 import autogen_05.lab_05_project.messages as messages
 from autogen_05.lab_05_project.gemini_client import GeminiClient
+from common.constants import Constants
+from common.metrics.metrics import Metrics
 
 class Agent(RoutedAgent):
 
@@ -19,9 +21,11 @@ class Agent(RoutedAgent):
     @message_handler
     async def handle_message(self, message: messages.Message, ctx: MessageContext) -> messages.Message:
         print(f"{self.id.type}: Received message")
-        text_message = TextMessage(content=message.content, source="user")
-        response = await self._delegate.on_messages([text_message], ctx.cancellation_token)
-        idea = response.chat_message.content
+        with Metrics.step("autogen_world", self.id.type):
+            text_message = TextMessage(content=message.content, source="user")
+            response = await self._delegate.on_messages([text_message], ctx.cancellation_token)
+            Metrics.record_llm_result(Constants.GEMINI_MODEL_LITE, response.chat_message)
+            idea = response.chat_message.content
         if random.random() < self._CHANCES_THAT_I_BOUNCE_IDEA_OFF_ANOTHER:
             recipient = messages.find_recipient()
             message = f"Here is my business idea. It may not be your speciality, but please refine it and make it better. {idea}"
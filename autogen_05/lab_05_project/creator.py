@@ -10,6 +10,8 @@ from autogen_ext.models.openai import OpenAIChatCompletionClient
 import autogen_05.lab_05_project.messages as messages
 from autogen_05.lab_05_project.gemini_client import GeminiClient
 from autogen_05.lab_05_project.lab_constants import LabConstants
+from common.constants import Constants
+from common.metrics.metrics import Metrics
 
 load_dotenv(override=True)
 
@@ -40,7 +42,9 @@ class Creator(RoutedAgent):
         filename = message.content
         agent_name = filename.split(".")[0]
         text_message = TextMessage(content=self.get_user_prompt(), source="user")
-        response = await self._delegate.on_messages([text_message], ctx.cancellation_token)
+        with Metrics.step("autogen_world", self.id.type):
+            response = await self._delegate.on_messages([text_message], ctx.cancellation_token)
+            Metrics.record_llm_result(Constants.GEMINI_MODEL_LITE, response.chat_message)
         with open(f'{LabConstants.PATH}/{filename}', "w", encoding="utf-8") as f:
             f.write(response.chat_message.content)
         print(f"** Creator has created python code for agent {agent_name} - about to register with Runtime")
@@ -3,14 +3,19 @@ import os
 from autogen_core.models import ModelFamily
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 
+from common.clients.gemini_client_registry import GeminiClientRegistry
 from common.constants import Constants
 
 class GeminiClient:
 
     @staticmethod
     def get_gemini_chat_client(temperature: float) -> OpenAIChatCompletionClient:
+        # Must be called from inside the runtime's event loop (agent factories are), so that every agent
+        # shares the loop's rate limited connection pool.
         return OpenAIChatCompletionClient(model=Constants.GEMINI_MODEL_LITE,
                                           api_key=os.getenv(Constants.GOOGLE_API_KEY),
+                                          base_url=Constants.GEMINI_BASE_URL,
+                                          http_client=GeminiClientRegistry.get_async_http_client(),
                                           model_info={'vision': True,
                                                     'function_calling': True,
                                                     'json_output': True,
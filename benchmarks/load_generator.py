@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.stub_llm_server import StubLlmServer
+from common.cassettes.cassette import Cassette, CassetteMode
+from common.constants import Constants
+
+@dataclass
+class LoadReport:
+    name: str
+    concurrency: int
+    wall_seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def completed(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.wall_seconds if self.wall_seconds else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def record_error(self, error: BaseException):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def format(self) -> str:
+        errors = ', '.join(f'{name}={count}' for name, count in self.errors.items()) or 'none'
+        return (f"{self.name}: concurrency={self.concurrency} completed={self.completed} errors={errors}\n"
+                f"  throughput={self.throughput:.2f} req/s wall={self.wall_seconds:.2f}s\n"
+                f"  latency p50={self.percentile(0.50):.3f}s p90={self.percentile(0.90):.3f}s "
+                f"p95={self.percentile(0.95):.3f}s p99={self.percentile(0.99):.3f}s max={self.percentile(1.0):.3f}s")
+
+class LoadGenerator:
+    """ Drives an entry point at a fixed concurrency and collects latency percentiles and throughput """
+
+    def __init__(self, concurrency: int, requests: int):
+        self._concurrency = concurrency
+        self._requests = requests
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
+
+    @property
+    def requests(self) -> int:
+        return self._requests
+
+    async def run_async(self, name: str, call: Callable[[int], Awaitable[Any]]) -> LoadReport:
+        report = LoadReport(name, self._concurrency)
+        next_index = iter(range(self._requests))
+
+        async def worker():
+            for index in next_index:
+                started = time.perf_counter()
+                try:
+                    await call(index)
+                    report.latencies.append(time.perf_counter() - started)
+                except Exception as e:
+                    report.record_error(e)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(self._concurrency)])
+        report.wall_seconds = time.perf_counter() - started
+        return report
+
+    def run_sync(self, name: str, call: Callable[[int], Any]) -> LoadReport:
+        report = LoadReport(name, self._concurrency)
+
+        def timed(index: int):
+            started = time.perf_counter()
+            try:
+                call(index)
+                report.latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                report.record_error(e)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            list(executor.map(timed, range(self._requests)))
+        report.wall_seconds = time.perf_counter() - started
+        return report
+
+class Scenarios:
+    """ The real entry points, imported lazily so they pick up the stub endpoints configured in main() """
+
+    _QUESTIONS = ["What is your background?", "Which languages do you use?", "Tell me about your last role.",
+                  "Are you open to consulting work?", "What is your favourite project?"]
+
+    _ABORT_SETTLE_SECONDS = 10.0
+
+    def __init__(self, generator: LoadGenerator, work_dir: str, server: Optional[StubLlmServer] = None):
+        self._generator = generator
+        self._work_dir = work_dir
+        self._server = server
+
+    def simple_chat(self) -> LoadReport:
+        from foundations_01.simple_chat_agent_02 import SimpleChatAgent
+
+        linked_in_path, summary_path = self._write_persona_files()
+        agent = SimpleChatAgent('Stub Persona', linked_in_path, summary_path)
+        return self._generator.run_sync('SimpleChatAgent.chat',
+                                        lambda i: agent.chat(self._QUESTIONS[i % len(self._QUESTIONS)], []))
+
+    def simple_chat_async(self) -> LoadReport:
+        # Every session is a coroutine on one loop, so run with e.g. --concurrency 500 to see hundreds served at once.
+        from foundations_01.simple_chat_agent_02 import SimpleChatAgent
+
+        linked_in_path, summary_path = self._write_persona_files()
+        agent = SimpleChatAgent('Stub Persona', linked_in_path, summary_path)
+        return asyncio.run(self._generator.run_async('SimpleChatAgent.achat',
+                                                     lambda i: agent.achat(self._get_question(i), [])))
+
+    def validator_chat_async(self) -> LoadReport:
+        from foundations_01.chat_agent_with_validator_03 import ChatAgentWithValidator
+
+        linked_in_path, summary_path = self._write_persona_files()
+        agent = ChatAgentWithValidator('Stub Persona', linked_in_path, summary_path)
+        return asyncio.run(self._generator.run_async('ChatAgentWithValidator.achat',
+                                                     lambda i: agent.achat(self._get_question(i), [])))
+
+    def validator_chat_speculative(self) -> LoadReport:
+        # Two candidates generated and evaluated at once, against validator_chat_async's generate, evaluate, rerun.
+        from foundations_01.chat_agent_with_validator_03 import ChatAgentWithValidator
+
+        linked_in_path, summary_path = self._write_persona_files()
+        agent = ChatAgentWithValidator('Stub Persona', linked_in_path, summary_path, candidates=2)
+        report = asyncio.run(self._generator.run_async('ChatAgentWithValidator.achat[speculative]',
+                                                       lambda i: agent.achat(self._get_question(i), [])))
+        self._check_cancelled_candidates_aborted(report)
+        return report
+
+    def pushover_chat_async(self) -> LoadReport:
+        from foundations_01.agent_with_pushover_04 import AgentWithPushover
+
+        linked_in_path, summary_path = self._write_persona_files()
+        agent = AgentWithPushover('Stub Persona', linked_in_path, summary_path)
+        return asyncio.run(self._generator.run_async('AgentWithPushover.achat',
+                                                     lambda i: agent.achat(self._get_question(i), [])))
+
+    def persona_context(self) -> LoadReport:
+        # The same questions against a long profile, with the whole profile in every prompt and then retrieval.
+        from common.metrics.metrics import Metrics
+        from foundations_01.persona_context import PersonaContext
+        from foundations_01.simple_chat_agent_02 import SimpleChatAgent
+
+        topics = ["Python", "Rust", "distributed systems", "consulting", "agentic AI", "data pipelines", "teaching"]
+        summary = '\n\n'.join(f"In role {number} I worked on {topics[number % len(topics)]} for a client in the "
+                               f"{['finance', 'health', 'retail'][number % 3]} sector, leading a team of {number % 9 + 2} "
+                               f"and shipping the project in {number % 11 + 3} months." for number in range(300))
+        linked_in_path, summary_path = self._write_persona_files(summary)
+        report = None
+        for mode in (PersonaContext.MODE_FULL, PersonaContext.MODE_RETRIEVAL):
+            agent = SimpleChatAgent('Stub Persona', linked_in_path, summary_path, context_mode=mode)
+            tokens_before = self._get_input_tokens(Metrics.snapshot())
+            report = asyncio.run(self._generator.run_async(f'SimpleChatAgent.achat[{mode}]',
+                                                           lambda i: agent.achat(self._get_question(i), [])))
+            tokens = self._get_input_tokens(Metrics.snapshot()) - tokens_before
+            if mode == PersonaContext.MODE_FULL:
+                print(report.format(), flush=True)
+            print(f"{report.name}: input_tokens/request={tokens / max(report.completed, 1):.0f}", flush=True)
+        # The retrieval run's report is printed by main() like any other scenario's.
+        return report
+
+    def deep_research(self) -> LoadReport:
+        from open_ai_02.deep_research_03 import DeepResearch
+
+        return asyncio.run(self._generator.run_async('DeepResearch._run_end_to_end_research',
+                                                     lambda i: DeepResearch._run_end_to_end_research(f"Topic {i}")))
+
+    def sales_agent(self) -> LoadReport:
+        from open_ai_02.sales_agent_02 import SalesAgent
+
+        agent = SalesAgent()
+        return asyncio.run(self._generator.run_async('SalesAgent._select_best_email_for',
+                                                     lambda i: agent._select_best_email_for(f"Write cold email {i}")))
+
+    def sidekick(self) -> LoadReport:
+        from lang_graph_04.lab_05.sidekick import Sidekick
+
+        async def run():
+            sidekicks = []
+            for _ in range(self._generator.concurrency):
+                sidekick = Sidekick()
+                await sidekick.setup(tools=[])
+                sidekicks.append(sidekick)
+            return await self._generator.run_async(
+                'Sidekick.run_superstep',
+                lambda i: sidekicks[i % len(sidekicks)].run_superstep(f"Task {i}", "Any clear answer", []))
+
+        return asyncio.run(run())
+
+    def world(self) -> LoadReport:
+        # World binds a fixed gRPC port and loads generated agents from the working directory, so runs are serial.
+        from autogen_05.lab_05_project.world import World
+
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'autogen_05', 'lab_05_project', 'agent.py'),
+                    self._work_dir)
+        os.chdir(self._work_dir)
+        sys.path.insert(0, self._work_dir)
+        serial = LoadGenerator(concurrency=1, requests=self._generator.requests)
+        return asyncio.run(serial.run_async('World.main', lambda i: World.main()))
+
+    def email_outbox(self) -> LoadReport:
+        # Times how long a send holds up its caller, then how long the outbox takes to drain to the stand-in.
+        from common.tools.send_grid_email import SendGridEmail
+
+        report = self._generator.run_sync('SendGridEmail.send_email',
+                                          lambda i: SendGridEmail.send_email(f"Subject {i}", f"Body {i}",
+                                                                             SendGridEmail.EMAIL_TYPE_PLAIN))
+        started = time.perf_counter()
+        SendGridEmail.flush(timeout=None)
+        print(f"Outbox drained in {time.perf_counter() - started:.2f}s", flush=True)
+        return report
+
+    def _check_cancelled_candidates_aborted(self, report: LoadReport):
+        """ Every candidate cancelled mid-request should have closed its connection, which the stub server sees as
+            an aborted request once its simulated latency is up """
+        from common.metrics.metrics import Metrics
+
+        cancelled = sum(series["value"] for series in Metrics.snapshot().get(Metrics.SPECULATIVE_CANDIDATES, [])
+                        if series["labels"].get('outcome') == 'cancelled')
+        if self._server is None or not cancelled:
+            return
+        deadline = time.monotonic() + self._ABORT_SETTLE_SECONDS
+        while self._server.stats()["aborted"] < cancelled and time.monotonic() < deadline:
+            time.sleep(0.1)
+        aborted = self._server.stats()["aborted"]
+        print(f"Cancelled candidates: {cancelled:g}, requests aborted at the server: {aborted}", flush=True)
+        if aborted < cancelled:
+            report.record_error(RuntimeError(f"{cancelled - aborted:g} cancelled candidates kept their requests running"))
+
+    def _get_question(self, index: int) -> str:
+        # Distinct per session, so identical requests aren't coalesced into one and the load is real.
+        return f"{self._QUESTIONS[index % len(self._QUESTIONS)]} (session {index})"
+
+    @staticmethod
+    def _get_input_tokens(snapshot: Dict[str, List[Dict[str, Any]]]) -> float:
+        from common.metrics.metrics import Metrics
+
+        return sum(series["value"] for series in snapshot.get(Metrics.LLM_TOKENS, [])
+                   if series["labels"].get('direction') == 'input')
+
+    def _write_persona_files(self, summary: str = "A software engineer who builds agentic AI systems."):
+        from pypdf import PdfWriter
+
+        linked_in_path = os.path.join(self._work_dir, 'linkedin.pdf')
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        with open(linked_in_path, 'wb') as f:
+            writer.write(f)
+        summary_path = os.path.join(self._work_dir, 'summary.txt')
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary)
+        return linked_in_path, summary_path
+
+def _configure_offline_environment(base_url: str, requests_per_minute: int):
+    from common.rate_limiting.gemini_rate_limiter import GeminiRateLimiter, ModelBudget
+
+    Constants.GEMINI_BASE_URL = base_url
+    os.environ.setdefault(Constants.GOOGLE_API_KEY, 'stub-key')
+    os.environ[Constants.SENDGRID_HOST] = base_url.split('/v1beta/')[0]
+    os.environ[Constants.PUSHOVER_HOST] = base_url.split('/v1beta/')[0]
+    os.environ.setdefault(Constants.SENDGRID_API_KEY, 'stub-key')
+    os.environ.setdefault(Constants.EMAIL_ID_FROM, 'from@example.com')
+    os.environ.setdefault(Constants.EMAIL_ID_TO, 'to@example.com')
+    # The free tier budgets would throttle the benchmark itself rather than the code under test.
+    for model in (Constants.GEMINI_MODEL_LITE, Constants.GEMINI_MODEL_MEDIUM):
+        GeminiRateLimiter.configure(model, ModelBudget(requests_per_minute=requests_per_minute,
+                                                       tokens_per_minute=requests_per_minute * 10_000,
+                                                       max_concurrency=256))
+
+def main():
+    scenario_names = ['simple_chat', 'simple_chat_async', 'validator_chat_async', 'validator_chat_speculative',
+                      'pushover_chat_async', 'persona_context', 'deep_research', 'sales_agent', 'sidekick', 'world',
+                      'email_outbox']
+    parser = argparse.ArgumentParser(description="Load test the agent entry points against a stub LLM server")
+    parser.add_argument('scenarios', nargs='*', default=['simple_chat'], help=f"Any of: {', '.join(scenario_names)}")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--base-url', default=None, help="Use an already running stub instead of starting one")
+    parser.add_argument('--latency', default='lognormal:0.3:0.5')
+    parser.add_argument('--tool-call-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--requests-per-minute', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--cassette', default=None, help="Record to, or replay from, this cassette file")
+    parser.add_argument('--cassette-mode', default=CassetteMode.REPLAY.value,
+                        choices=[CassetteMode.RECORD.value, CassetteMode.REPLAY.value])
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(scenario_names)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server: Optional[StubLlmServer] = None
+    base_url = args.base_url
+    if base_url is None:
+        server = StubLlmServer(latency=args.latency, tool_call_rate=args.tool_call_rate,
+                               error_rate=args.error_rate, seed=args.seed).start()
+        base_url = server.openai_base_url
+    _configure_offline_environment(base_url, args.requests_per_minute)
+    cassette = Cassette(args.cassette, CassetteMode(args.cassette_mode)) if args.cassette else None
+    if cassette:
+        Cassette.activate(cassette)
+
+    work_dir = tempfile.mkdtemp(prefix='loadgen-')
+    os.environ.setdefault(Constants.EMAIL_OUTBOX_PATH, os.path.join(work_dir, 'email_outbox.sqlite'))
+    scenarios = Scenarios(LoadGenerator(args.concurrency, args.requests), work_dir, server)
+    try:
+        for name in args.scenarios:
+            print(getattr(scenarios, name)().format(), flush=True)
+    finally:
+        if cassette:
+            print(f"Cassette: {cassette.stats()}")
+        if server:
+            print(f"Stub server: {server.stats()}")
+            server.stop()
+
+if __name__ == '__main__':
+    main()
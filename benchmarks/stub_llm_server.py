@@ -0,0 +1,388 @@
+import argparse
+import json
+import math
+import random
+import re
+import select
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qsl
+
+class _StubHttpServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 refuses connections long before hundreds of concurrent clients are served.
+    request_queue_size = 1024
+    daemon_threads = True
+
+class LatencyDistribution:
+    """ Parses specs like 'constant:0.2', 'uniform:0.1:0.5' or 'lognormal:0.3:0.6' (median seconds, sigma) """
+
+    def __init__(self, spec: str, rng: random.Random):
+        self._spec = spec
+        self._rng = rng
+        kind, *params = spec.split(':')
+        self._kind = kind
+        self._params = [float(param) for param in params]
+        if kind not in ('constant', 'uniform', 'lognormal', 'exponential'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def __str__(self) -> str:
+        return self._spec
+
+    def sample(self) -> float:
+        if self._kind == 'constant':
+            return self._params[0]
+        if self._kind == 'uniform':
+            return self._rng.uniform(self._params[0], self._params[1])
+        if self._kind == 'exponential':
+            return self._rng.expovariate(1.0 / self._params[0])
+        return self._rng.lognormvariate(math.log(self._params[0]), self._params[1])
+
+class _SchemaFaker:
+    """ Builds a small instance that satisfies an OpenAI (JSON schema) or Gemini (OpenAPI subset) schema """
+
+    _ARRAY_LENGTH = 3
+
+    def __init__(self, root: Dict[str, Any], text: str):
+        self._root = root
+        self._text = text
+
+    def build(self, schema: Optional[Dict[str, Any]] = None) -> Any:
+        schema = self._root if schema is None else schema
+        if '$ref' in schema:
+            return self.build(self._resolve(schema['$ref']))
+        for key in ('anyOf', 'oneOf', 'allOf'):
+            if schema.get(key):
+                options = [option for option in schema[key] if option.get('type') != 'null']
+                return self.build(options[0] if options else schema[key][0])
+        if schema.get('enum'):
+            return schema['enum'][0]
+
+        schema_type = str(schema.get('type', 'object')).lower()
+        if schema_type == 'object':
+            return {name: self.build(property_schema) for name, property_schema in schema.get('properties', {}).items()}
+        if schema_type == 'array':
+            return [self.build(schema.get('items', {})) for _ in range(self._ARRAY_LENGTH)]
+        if schema_type == 'boolean':
+            return True
+        if schema_type in ('integer', 'number'):
+            return 1
+        return self._text
+
+    def _resolve(self, reference: str) -> Dict[str, Any]:
+        node = self._root
+        for part in reference.lstrip('#/').split('/'):
+            node = node[part]
+        return node
+
+class _Reply:
+
+    def __init__(self, text: str, tool_name: Optional[str] = None, tool_arguments: Optional[Dict[str, Any]] = None):
+        self.text = text
+        self.tool_name = tool_name
+        self.tool_arguments = tool_arguments
+
+class StubLlmServer:
+    """ Local OpenAI-compatible (and minimal native Gemini) chat endpoint for offline benchmarking,
+        plus stand-ins for the SendGrid and Pushover APIs """
+
+    _WORDS = ("agentic systems coordinate tools and models to plan research write and review work "
+              "while keeping latency and cost predictable for every user request").split()
+    _TEMPLATE_MARKER = "Here is the template:\n\n"
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 latency: str = 'lognormal:0.3:0.5',
+                 token_delay_seconds: float = 0.005,
+                 completion_tokens: int = 60,
+                 tool_call_rate: float = 0.3,
+                 error_rate: float = 0.0,
+                 retry_after_seconds: float = 1.0,
+                 seed: Optional[int] = None):
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._latency = LatencyDistribution(latency, self._rng)
+        self._token_delay_seconds = token_delay_seconds
+        self._completion_tokens = completion_tokens
+        self._tool_call_rate = tool_call_rate
+        self._error_rate = error_rate
+        self._retry_after_seconds = retry_after_seconds
+        self._server = _StubHttpServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "streamed": 0, "tool_calls": 0, "structured": 0, "rate_limited": 0, "notifications": 0,
+                       "emails": 0, "aborted": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def openai_base_url(self) -> str:
+        # Mirrors the path layout of Constants.GEMINI_BASE_URL so it can be swapped in directly.
+        return f'{self.url}/v1beta/openai/'
+
+    def start(self) -> 'StubLlmServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-llm-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self):
+        self._thread.join()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('content-length') or 0)
+                data = self.rfile.read(length)
+                if self.headers.get('content-type', '').startswith('application/x-www-form-urlencoded'):
+                    body = dict(parse_qsl(data.decode('utf-8')))
+                else:
+                    body = json.loads(data or b'{}')
+                server._handle(self, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _handle(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]):
+        self._count('requests')
+        if handler.path.endswith('/v3/mail/send'):
+            # SendGrid stand-in so email sending steps stay offline too; counts one email per recipient.
+            self._count('emails', sum(len(personalization.get('to', []))
+                                      for personalization in body.get('personalizations', [])))
+            time.sleep(self._latency.sample())
+            return self._send_json(handler, 202, {})
+        if handler.path.endswith('/1/messages.json'):
+            # Pushover stand-in, answered like the real API.
+            self._count('notifications')
+            return self._send_json(handler, 200, {"status": 1, "request": str(uuid.uuid4())})
+        if self._error_rate and self._random() < self._error_rate:
+            self._count('rate_limited')
+            return self._send_json(handler, 429, {"error": {"code": 429, "message": "Stub rate limit",
+                                                            "status": "RESOURCE_EXHAUSTED"}},
+                                   {'retry-after': str(self._retry_after_seconds)})
+
+        time.sleep(self._latency.sample())
+        if self._is_disconnected(handler):
+            # The client cancelled while the "model" was working, as a timed out or discarded call should.
+            self._count('aborted')
+            handler.close_connection = True
+            return
+        if handler.path.endswith('/chat/completions'):
+            return self._handle_openai(handler, body)
+        gemini_match = re.search(r'/models/([^/:]+):generateContent$', handler.path.split('?')[0])
+        if gemini_match:
+            return self._handle_gemini(handler, gemini_match.group(1), body)
+        self._send_json(handler, 404, {"error": {"message": f"Unknown path {handler.path}"}})
+
+    def _handle_openai(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]):
+        messages = body.get('messages', [])
+        tools = [tool['function'] for tool in body.get('tools') or [] if tool.get('type') == 'function']
+        must_call_tool = body.get('tool_choice') == 'required'
+        last_role = messages[-1].get('role') if messages else None
+        response_format = body.get('response_format') or {}
+        schema = (response_format.get('json_schema') or {}).get('schema') if response_format.get('type') == 'json_schema' else None
+        reply = self._build_reply(messages, tools, must_call_tool, last_role == 'tool', schema, 'parameters')
+
+        model = body.get('model', 'stub')
+        prompt_tokens = len(json.dumps(messages)) // 4
+        if body.get('stream'):
+            self._count('streamed')
+            return self._stream_openai(handler, model, reply, prompt_tokens,
+                                       bool((body.get('stream_options') or {}).get('include_usage')))
+
+        message: Dict[str, Any] = {"role": "assistant", "content": reply.text}
+        finish_reason = 'stop'
+        if reply.tool_name:
+            message = {"role": "assistant", "content": None,
+                       "tool_calls": [{"id": self._new_id('call'), "type": "function",
+                                       "function": {"name": reply.tool_name,
+                                                    "arguments": json.dumps(reply.tool_arguments)}}]}
+            finish_reason = 'tool_calls'
+        completion_tokens = len((reply.text or '').split()) or 1
+        self._send_json(handler, 200, {"id": self._new_id('chatcmpl'), "object": "chat.completion",
+                                       "created": int(time.time()), "model": model,
+                                       "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                                       "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                                 "total_tokens": prompt_tokens + completion_tokens}})
+
+    def _stream_openai(self, handler: BaseHTTPRequestHandler, model: str, reply: _Reply, prompt_tokens: int,
+                       include_usage: bool):
+        chunk_id = self._new_id('chatcmpl')
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        handler.send_response(200)
+        handler.send_header('content-type', 'text/event-stream')
+        handler.send_header('cache-control', 'no-cache')
+        handler.send_header('connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+
+        events: List[Dict[str, Any]] = [chunk({"role": "assistant", "content": ""})]
+        if reply.tool_name:
+            arguments = json.dumps(reply.tool_arguments)
+            events.append(chunk({"tool_calls": [{"index": 0, "id": self._new_id('call'), "type": "function",
+                                                 "function": {"name": reply.tool_name, "arguments": ""}}]}))
+            events += [chunk({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]})
+                       for piece in self._split(arguments, 16)]
+            events.append(chunk({}, 'tool_calls'))
+        else:
+            events += [chunk({"content": piece}) for piece in self._split_words(reply.text)]
+            events.append(chunk({}, 'stop'))
+        completion_tokens = len((reply.text or '').split()) or 1
+        if include_usage:
+            events.append({"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                           "model": model, "choices": [],
+                           "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                     "total_tokens": prompt_tokens + completion_tokens}})
+
+        for index, event in enumerate(events):
+            if index > 1:
+                time.sleep(self._token_delay_seconds)
+            handler.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+    def _handle_gemini(self, handler: BaseHTTPRequestHandler, model: str, body: Dict[str, Any]):
+        contents = body.get('contents', [])
+        tools = [declaration for tool in body.get('tools') or []
+                 for declaration in tool.get('functionDeclarations') or tool.get('function_declarations') or []]
+        tool_config = body.get('toolConfig') or body.get('tool_config') or {}
+        calling_config = tool_config.get('functionCallingConfig') or tool_config.get('function_calling_config') or {}
+        must_call_tool = str(calling_config.get('mode', '')).upper() == 'ANY'
+        last_parts = contents[-1].get('parts', []) if contents else []
+        after_tool = any('functionResponse' in part or 'function_response' in part for part in last_parts)
+        generation_config = body.get('generationConfig') or body.get('generation_config') or {}
+        schema = generation_config.get('responseSchema') or generation_config.get('response_schema')
+        reply = self._build_reply(contents, tools, must_call_tool, after_tool, schema, 'parameters')
+
+        part = {"text": reply.text}
+        if reply.tool_name:
+            part = {"functionCall": {"name": reply.tool_name, "args": reply.tool_arguments}}
+        prompt_tokens = len(json.dumps(contents)) // 4
+        completion_tokens = len((reply.text or '').split()) or 1
+        self._send_json(handler, 200, {"candidates": [{"content": {"role": "model", "parts": [part]},
+                                                       "finishReason": "STOP", "index": 0}],
+                                       "usageMetadata": {"promptTokenCount": prompt_tokens,
+                                                         "candidatesTokenCount": completion_tokens,
+                                                         "totalTokenCount": prompt_tokens + completion_tokens},
+                                       "modelVersion": model})
+
+    def _build_reply(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], must_call_tool: bool,
+                     after_tool: bool, schema: Optional[Dict[str, Any]], parameters_key: str) -> _Reply:
+        text = self._make_text()
+        if tools and not after_tool and (must_call_tool or self._random() < self._tool_call_rate):
+            self._count('tool_calls')
+            with self._rng_lock:
+                tool = self._rng.choice(tools)
+            parameters = tool.get(parameters_key) or {"type": "object", "properties": {}}
+            return _Reply(None, tool['name'], _SchemaFaker(parameters, text).build())
+        if schema:
+            self._count('structured')
+            return _Reply(json.dumps(_SchemaFaker(schema, text).build()))
+        template = self._find_template(messages)
+        if template:
+            # The autogen Creator asks for python code built from a template; echoing it keeps World runnable.
+            return _Reply(template)
+        return _Reply(text)
+
+    def _find_template(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        for message in reversed(messages):
+            content = message.get('content')
+            if isinstance(content, list):
+                content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+            if isinstance(content, str) and self._TEMPLATE_MARKER in content:
+                return content.split(self._TEMPLATE_MARKER, 1)[1]
+        return None
+
+    def _make_text(self) -> str:
+        with self._rng_lock:
+            return ' '.join(self._rng.choice(self._WORDS) for _ in range(self._completion_tokens))
+
+    @staticmethod
+    def _split(text: str, size: int) -> Iterator[str]:
+        return (text[i:i + size] for i in range(0, len(text), size))
+
+    @staticmethod
+    def _split_words(text: str) -> Iterator[str]:
+        return (match.group(0) for match in re.finditer(r'\S+\s*', text))
+
+    @staticmethod
+    def _new_id(prefix: str) -> str:
+        return f'{prefix}-{uuid.uuid4().hex[:24]}'
+
+    @staticmethod
+    def _is_disconnected(handler: BaseHTTPRequestHandler) -> bool:
+        # Clients send nothing more while waiting for a reply, so a readable socket with no data left means closed.
+        try:
+            readable, _, _ = select.select([handler.connection], [], [], 0)
+            return bool(readable) and not handler.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    @staticmethod
+    def _send_json(handler: BaseHTTPRequestHandler, status: int, payload: Dict[str, Any],
+                   headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('content-type', 'application/json')
+        handler.send_header('content-length', str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub LLM server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='lognormal:0.3:0.5',
+                        help="constant:S | uniform:LO:HI | exponential:MEAN | lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument('--token-delay', type=float, default=0.005, help="Seconds between streamed chunks")
+    parser.add_argument('--completion-tokens', type=int, default=60)
+    parser.add_argument('--tool-call-rate', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    server = StubLlmServer(args.host, args.port, args.latency, args.token_delay, args.completion_tokens,
+                           args.tool_call_rate, args.error_rate, seed=args.seed)
+    print(f"Stub LLM server listening on {server.openai_base_url}", flush=True)
+    server.start()
+    try:
+        server.wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import os
+from enum import Enum
+from typing import Any, List, Optional
+
+from common.budget.token_estimator import TokenEstimator
+from common.constants import Constants
+from common.metrics.metrics import Metrics
+
+class BudgetPolicy(str, Enum):
+    TRUNCATE_OLDEST = 'truncate_oldest'
+    DROP_TOOL_OUTPUTS = 'drop_tool_outputs'
+    REJECT = 'reject'
+
+class PromptBudgetExceeded(ValueError):
+    """ Raised when a prompt cannot be brought within budget, or the policy is to reject rather than trim """
+
+    # A client error, so ModelFailover doesn't hold it against the model or retry it on the alternate.
+    status_code = 413
+
+class PromptBudget:
+    """ Checks the estimated size of a prompt before it is sent and trims it according to a policy:
+        drop the oldest turns, blank out tool outputs (oldest first, then drop turns) or reject outright """
+
+    DEFAULT_MAX_PROMPT_TOKENS = 32_000
+    DEFAULT_RESERVED_OUTPUT_TOKENS = 8_192
+    DEFAULT_CONTEXT_WINDOW = 128_000
+    _WARN_FRACTION = 0.8
+    _DROPPED_TOOL_OUTPUT = '[tool output omitted to fit the prompt budget]'
+
+    _CONTEXT_WINDOWS = {Constants.GEMINI_MODEL_LITE: 1_048_576,
+                        Constants.GEMINI_MODEL_MEDIUM: 1_048_576}
+
+    _DEFAULT: Optional['PromptBudget'] = None
+
+    def __init__(self,
+                 max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+                 policy: BudgetPolicy = BudgetPolicy.TRUNCATE_OLDEST,
+                 reserved_output_tokens: int = DEFAULT_RESERVED_OUTPUT_TOKENS):
+        self._max_prompt_tokens = max_prompt_tokens
+        self._policy = BudgetPolicy(policy)
+        self._reserved_output_tokens = reserved_output_tokens
+
+    @property
+    def policy(self) -> BudgetPolicy:
+        return self._policy
+
+    @classmethod
+    def get_default(cls) -> 'PromptBudget':
+        """ Shared budget, configurable through PROMPT_MAX_TOKENS and PROMPT_BUDGET_POLICY """
+        if cls._DEFAULT is None:
+            cls._DEFAULT = PromptBudget(int(os.getenv(Constants.PROMPT_MAX_TOKENS, cls.DEFAULT_MAX_PROMPT_TOKENS)),
+                                        BudgetPolicy(os.getenv(Constants.PROMPT_BUDGET_POLICY,
+                                                               BudgetPolicy.TRUNCATE_OLDEST.value)))
+        return cls._DEFAULT
+
+    def get_limit(self, model: Optional[str] = None) -> int:
+        # Without a model (e.g. before failover has picked one) the smallest known window applies.
+        context_window = (self._CONTEXT_WINDOWS.get(model, self.DEFAULT_CONTEXT_WINDOW) if model
+                          else min(self._CONTEXT_WINDOWS.values()))
+        return min(self._max_prompt_tokens, context_window - self._reserved_output_tokens)
+
+    def fit(self, messages: List[Any], model: Optional[str] = None, reserved_tokens: int = 0) -> List[Any]:
+        """ Return messages trimmed to the budget; reserved_tokens covers prompt text sent alongside them """
+        limit = self.get_limit(model) - reserved_tokens
+        sizes = [TokenEstimator.estimate_message(message) for message in messages]
+        total = sum(sizes)
+        Metrics.increment(Metrics.PROMPT_TOKENS, total + reserved_tokens, model=model)
+        if total <= limit:
+            if total > self._WARN_FRACTION * limit:
+                Metrics.increment(Metrics.PROMPT_BUDGET_ACTIONS, model=model, action='warned')
+                print(f"Prompt budget: ~{total + reserved_tokens} tokens is close to the {limit + reserved_tokens} limit")
+            return messages
+        if self._policy == BudgetPolicy.REJECT:
+            self._reject(total + reserved_tokens, limit + reserved_tokens, model)
+
+        messages, sizes = list(messages), list(sizes)
+        if self._policy == BudgetPolicy.DROP_TOOL_OUTPUTS:
+            total = self._drop_tool_outputs(messages, sizes, limit, model)
+        if total > limit:
+            total = self._truncate_oldest(messages, sizes, limit, model)
+        if total > limit:
+            self._reject(total + reserved_tokens, limit + reserved_tokens, model)
+        print(f"Prompt budget: trimmed prompt to ~{total + reserved_tokens} tokens ({self._policy.value})")
+        return messages
+
+    def _drop_tool_outputs(self, messages: List[Any], sizes: List[int], limit: int, model: Optional[str]) -> int:
+        for index, message in enumerate(messages):
+            if sum(sizes) <= limit:
+                break
+            if TokenEstimator.describe(message)[0] == 'tool':
+                messages[index] = self._replace_content(message, self._DROPPED_TOOL_OUTPUT)
+                sizes[index] = TokenEstimator.estimate_message(messages[index])
+                Metrics.increment(Metrics.PROMPT_BUDGET_ACTIONS, model=model, action='dropped_tool_output')
+        return sum(sizes)
+
+    @staticmethod
+    def _truncate_oldest(messages: List[Any], sizes: List[int], limit: int, model: Optional[str]) -> int:
+        # System messages and the current turn (the last user message and any tool calls after it) are always kept.
+        roles = [TokenEstimator.describe(message)[0] for message in messages]
+        first = 0
+        while first < len(roles) and roles[first] == 'system':
+            first += 1
+        current_turn = max((index for index, role in enumerate(roles) if role == 'user'), default=len(roles) - 1)
+        while sum(sizes) > limit and first < current_turn:
+            del messages[first], sizes[first], roles[first]
+            current_turn -= 1
+            Metrics.increment(Metrics.PROMPT_BUDGET_ACTIONS, model=model, action='dropped_message')
+            # Tool results whose call was dropped would be rejected by the API, so they go with it.
+            while first < current_turn and roles[first] == 'tool':
+                del messages[first], sizes[first], roles[first]
+                current_turn -= 1
+        return sum(sizes)
+
+    @staticmethod
+    def _reject(total: int, limit: int, model: Optional[str]):
+        Metrics.increment(Metrics.PROMPT_BUDGET_ACTIONS, model=model, action='rejected')
+        raise PromptBudgetExceeded(f"Prompt of ~{total} tokens exceeds the {limit} token budget"
+                                   + (f" for {model}" if model else ""))
+
+    @staticmethod
+    def _replace_content(message: Any, content: str) -> Any:
+        if isinstance(message, dict):
+            field = 'output' if 'output' in message else 'content'
+            return {**message, field: content}
+        if hasattr(message, 'model_copy'):
+            return message.model_copy(update={'content': content})
+        return message
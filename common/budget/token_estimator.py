@@ -0,0 +1,55 @@
+import json
+import math
+from typing import Any, Iterable, Tuple
+
+class TokenEstimator:
+    """ Local, dependency free token estimate for prompts in any of the message shapes used across the repo:
+        OpenAI chat dicts and message objects, agents SDK input items and LangChain messages """
+
+    CHARACTERS_PER_TOKEN = 4
+    # Role markers and separators the chat template adds around every message.
+    _TOKENS_PER_MESSAGE = 4
+
+    _ROLES = {'developer': 'system',
+              'human': 'user',
+              'ai': 'assistant',
+              'function_call': 'assistant',
+              'function_call_output': 'tool'}
+
+    @classmethod
+    def estimate_text(cls, text: str) -> int:
+        return math.ceil(len(text) / cls.CHARACTERS_PER_TOKEN)
+
+    @classmethod
+    def estimate_message(cls, message: Any) -> int:
+        return cls._TOKENS_PER_MESSAGE + cls.estimate_text(cls.describe(message)[1])
+
+    @classmethod
+    def estimate_messages(cls, messages: Iterable[Any]) -> int:
+        return sum(cls.estimate_message(message) for message in messages)
+
+    @classmethod
+    def describe(cls, message: Any) -> Tuple[str, str]:
+        """ Normalised role (system, user, assistant or tool) and all the text a message contributes to the prompt """
+        if isinstance(message, str):
+            return 'user', message
+        get = message.get if isinstance(message, dict) else lambda name: getattr(message, name, None)
+        role = get('role') or get('type') or 'user'
+        parts = [cls._get_text(get('content')), cls._get_text(get('output')), cls._get_text(get('arguments'))]
+        for tool_call in get('tool_calls') or []:
+            parts.append(cls._get_text(tool_call))
+        return cls._ROLES.get(role, role), '\n'.join(part for part in parts if part)
+
+    @classmethod
+    def _get_text(cls, value: Any) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            return value
+        if isinstance(value, list):
+            return '\n'.join(cls._get_text(part) for part in value)
+        if isinstance(value, dict) and isinstance(value.get('text'), str):
+            return value['text']
+        if hasattr(value, 'model_dump'):
+            value = value.model_dump(exclude_none=True)
+        return json.dumps(value, default=str)
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+class ResponseCache:
+    """ Two tier key/value cache: an in-memory LRU in front of a SQLite file with size and TTL eviction """
+
+    DEFAULT_MAX_MEMORY_ENTRIES = 256
+    DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+    DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+    def __init__(self,
+                 path: str,
+                 max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self._path = path
+        self._max_memory_entries = max_memory_entries
+        self._max_disk_bytes = max_disk_bytes
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._connection = self._connect(path)
+        self._disk_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return entry[1]
+            if entry:
+                del self._memory[key]
+
+            row = self._connection.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                self._misses += 1
+                return None
+            self._connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self._put_in_memory(key, row[1], row[0])
+            self._disk_hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self._ttl_seconds)
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._put_in_memory(key, expires_at, value)
+            previous = self._connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._connection.execute("INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_access) "
+                                     "VALUES (?, ?, ?, ?, ?)", (key, value, size, expires_at, now))
+            self._disk_bytes += size - (previous[0] if previous else 0)
+            self._evict_from_disk(now)
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._connection.execute("DELETE FROM entries")
+            self._connection.commit()
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            return {"hits": hits,
+                    "memory_hits": self._memory_hits,
+                    "disk_hits": self._disk_hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "memory_entries": len(self._memory),
+                    "disk_bytes": self._disk_bytes}
+
+    def _put_in_memory(self, key: str, expires_at: float, value: str):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_from_disk(self, now: float):
+        expired = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires_at <= ?",
+                                           (now,)).fetchone()
+        if expired[0]:
+            self._connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            self._disk_bytes -= expired[1]
+            self._evictions += expired[0]
+
+        # Least recently used entries go first once the file grows past its budget.
+        while self._disk_bytes > self._max_disk_bytes:
+            row = self._connection.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            self._memory.pop(row[0], None)
+            self._disk_bytes -= row[1]
+            self._evictions += 1
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS entries ("
+                           "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                           "expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        connection.commit()
+        return connection
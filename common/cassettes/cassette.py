@@ -0,0 +1,179 @@
+import atexit
+import functools
+import gzip
+import inspect
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from common.constants import Constants
+from common.models.request_key import RequestKey
+
+T = TypeVar('T')
+
+class CassetteMode(str, Enum):
+    OFF = 'off'
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+class CassetteMiss(RuntimeError):
+    """ Raised in strict replay mode when a call was never recorded, or is made more times than it was, instead of
+        silently going to the network or reusing an earlier result """
+
+class Cassette:
+    """ Records LLM and tool call results to a gzipped JSON lines file and replays them for deterministic runs """
+
+    _ACTIVE: Optional['Cassette'] = None
+    _ACTIVE_LOADED = False
+    _ACTIVE_LOCK = threading.Lock()
+
+    def __init__(self, path: str, mode: CassetteMode, strict: bool = True):
+        self._path = path
+        self._mode = CassetteMode(mode)
+        self._strict = strict
+        self._lock = threading.Lock()
+        # Identical requests may legitimately get different answers, so each key keeps its results in call order.
+        self._entries: Dict[str, List[Any]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        self._hits = 0
+        self._misses = 0
+        self._recorded = 0
+        if self._mode == CassetteMode.REPLAY:
+            self._load()
+
+    @property
+    def mode(self) -> CassetteMode:
+        return self._mode
+
+    @classmethod
+    def get_active(cls) -> Optional['Cassette']:
+        """ The process-wide cassette, configured from CASSETTE_PATH and CASSETTE_MODE unless activate() was called """
+        with cls._ACTIVE_LOCK:
+            if not cls._ACTIVE_LOADED:
+                cls._ACTIVE_LOADED = True
+                path = os.getenv(Constants.CASSETTE_PATH)
+                mode = CassetteMode(os.getenv(Constants.CASSETTE_MODE, CassetteMode.REPLAY.value))
+                if path and mode != CassetteMode.OFF:
+                    cls._set_active_locked(Cassette(path, mode))
+            return cls._ACTIVE
+
+    @classmethod
+    def activate(cls, cassette: Optional['Cassette']):
+        with cls._ACTIVE_LOCK:
+            cls._ACTIVE_LOADED = True
+            cls._set_active_locked(cassette)
+
+    @classmethod
+    @contextmanager
+    def use(cls, path: str, mode: CassetteMode, strict: bool = True) -> Iterator['Cassette']:
+        previous = cls.get_active()
+        cassette = Cassette(path, mode, strict)
+        # Saved on exit from the block rather than at interpreter exit.
+        with cls._ACTIVE_LOCK:
+            cls._ACTIVE = cassette
+        try:
+            yield cassette
+        finally:
+            cassette.save()
+            with cls._ACTIVE_LOCK:
+                cls._ACTIVE = previous
+
+    @classmethod
+    def recorded(cls, kind: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+        """ Decorator that routes a sync or async function with JSON serializable results through the active cassette """
+
+        def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    cassette = cls.get_active()
+                    if cassette is None:
+                        return await fn(*args, **kwargs)
+                    return await cassette.record_or_replay_async(kind, {"args": args, "kwargs": kwargs},
+                                                                 lambda: fn(*args, **kwargs))
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                cassette = cls.get_active()
+                if cassette is None:
+                    return fn(*args, **kwargs)
+                return cassette.record_or_replay(kind, {"args": args, "kwargs": kwargs}, lambda: fn(*args, **kwargs))
+            return wrapper
+
+        return decorator
+
+    def record_or_replay(self, kind: str, request: Any, call: Callable[[], T]) -> T:
+        key = self._get_key(kind, request)
+        if self._mode == CassetteMode.RECORD:
+            return self._record(key, call())
+        found, value = self._replay(key, kind)
+        return value if found else call()
+
+    async def record_or_replay_async(self, kind: str, request: Any, call: Callable[[], Awaitable[T]]) -> T:
+        key = self._get_key(kind, request)
+        if self._mode == CassetteMode.RECORD:
+            return self._record(key, await call())
+        found, value = self._replay(key, kind)
+        return value if found else await call()
+
+    def save(self):
+        if self._mode != CassetteMode.RECORD:
+            return
+        with self._lock:
+            lines = [json.dumps({"k": key, "v": value}, separators=(',', ':'), default=str)
+                     for key, values in self._entries.items() for value in values]
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        temp_path = f'{self._path}.tmp'
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        os.replace(temp_path, self._path)
+        print(f"Cassette: recorded {len(lines)} calls to {self._path}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "recorded": self._recorded}
+
+    def _record(self, key: str, value: T) -> T:
+        with self._lock:
+            self._entries[key].append(value)
+            self._recorded += 1
+        return value
+
+    def _replay(self, key: str, kind: str):
+        with self._lock:
+            values = self._entries.get(key)
+            position = self._positions[key]
+            # Strict replay fails on a call beyond those recorded, so a change in how often a call is made shows up;
+            # otherwise the extra call reuses the last result rather than failing the run.
+            if values and (position < len(values) or not self._strict):
+                self._positions[key] = position + 1
+                self._hits += 1
+                return True, values[min(position, len(values) - 1)]
+            self._misses += 1
+        if self._strict:
+            recorded = len(values) if values else 0
+            raise CassetteMiss(f"No recorded {kind} call in {self._path} (key {key[:12]}, call {position + 1} of "
+                               f"{recorded} recorded)")
+        return False, None
+
+    def _load(self):
+        with gzip.open(self._path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["k"]].append(entry["v"])
+
+    @staticmethod
+    def _get_key(kind: str, request: Any) -> str:
+        return f'{kind}:{RequestKey.for_kwargs(request=request)}'
+
+    @classmethod
+    def _set_active_locked(cls, cassette: Optional['Cassette']):
+        cls._ACTIVE = cassette
+        if cassette is not None and cassette.mode == CassetteMode.RECORD:
+            atexit.register(cassette.save)
@@ -0,0 +1,90 @@
+import base64
+import json
+from typing import Any, Dict
+
+import httpx
+
+from common.cassettes.cassette import Cassette
+
+class _HttpExchange:
+
+    KIND = 'http'
+    # The body is stored decoded, so the encoding and length headers of the original response no longer apply.
+    _KEPT_HEADERS = ('content-type', 'retry-after')
+    # API keys may be sent as a query parameter (Gemini native API) and must neither be stored nor change the key.
+    _SECRET_PARAMS = ('key',)
+
+    @classmethod
+    def describe(cls, request: httpx.Request) -> Dict[str, Any]:
+        params = sorted((name, value) for name, value in request.url.params.multi_items()
+                        if name not in cls._SECRET_PARAMS)
+        try:
+            body = json.loads(request.content) if request.content else None
+        except ValueError:
+            body = request.content.decode('utf-8', errors='replace')
+        # The host is left out so recordings made against a local stub replay against any other port or endpoint.
+        return {"method": request.method, "path": request.url.path, "params": params, "body": body}
+
+    @classmethod
+    def encode(cls, response: httpx.Response) -> Dict[str, Any]:
+        return {"status": response.status_code,
+                "headers": {name: response.headers[name] for name in cls._KEPT_HEADERS if name in response.headers},
+                "body": base64.b64encode(response.content).decode('ascii')}
+
+    @staticmethod
+    def decode(recorded: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+        return httpx.Response(recorded["status"], headers=recorded["headers"],
+                              content=base64.b64decode(recorded["body"]), request=request)
+
+class CassetteTransport(httpx.BaseTransport):
+    """ httpx transport that records responses into, or replays them from, the active Cassette """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = Cassette.get_active()
+        if cassette is None:
+            return self._transport.handle_request(request)
+        request.read()
+        recorded = cassette.record_or_replay(_HttpExchange.KIND, _HttpExchange.describe(request),
+                                             lambda: self._send(request))
+        return _HttpExchange.decode(recorded, request)
+
+    def close(self):
+        self._transport.close()
+
+    def _send(self, request: httpx.Request) -> Dict[str, Any]:
+        # Streamed responses (e.g. SSE) are read in full, so replay hands back exactly the same bytes.
+        response = self._transport.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        return _HttpExchange.encode(response)
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """ Async twin of CassetteTransport """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = Cassette.get_active()
+        if cassette is None:
+            return await self._transport.handle_async_request(request)
+        await request.aread()
+        recorded = await cassette.record_or_replay_async(_HttpExchange.KIND, _HttpExchange.describe(request),
+                                                         lambda: self._send(request))
+        return _HttpExchange.decode(recorded, request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    async def _send(self, request: httpx.Request) -> Dict[str, Any]:
+        response = await self._transport.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        return _HttpExchange.encode(response)
@@ -0,0 +1,47 @@
+from typing import Any, List, Optional
+
+from crewai.llms.base_llm import BaseLLM
+
+from common.cassettes.cassette import Cassette
+
+class RecordedLLM(BaseLLM):
+    """ Wraps a CrewAI LLM so its calls, which go through litellm rather than our httpx clients, hit the cassette """
+
+    def __init__(self, llm: BaseLLM):
+        # Set first: BaseLLM.__init__ assigns stop, which the property below forwards to the wrapped LLM.
+        self._llm = llm
+        super().__init__(model=llm.model, temperature=llm.temperature, stop=llm.stop)
+
+    @classmethod
+    def wrap_agents(cls, agents: List[Any]):
+        """ Swap in recording LLMs, but only when a cassette is active so normal runs keep the stock LLM class """
+        if Cassette.get_active() is None:
+            return
+        for agent in agents:
+            if isinstance(agent.llm, BaseLLM) and not isinstance(agent.llm, RecordedLLM):
+                agent.llm = RecordedLLM(agent.llm)
+
+    @property
+    def stop(self) -> Optional[List[str]]:
+        return self._llm.stop
+
+    @stop.setter
+    def stop(self, value: Optional[List[str]]):
+        # The agent executor appends its stop words to llm.stop, which must reach the real LLM.
+        self._llm.stop = value
+
+    def call(self, messages: Any, *args, **kwargs) -> Any:
+        cassette = Cassette.get_active()
+        if cassette is None:
+            return self._llm.call(messages, *args, **kwargs)
+        request = {"model": self.model, "messages": messages, "tools": kwargs.get('tools')}
+        return cassette.record_or_replay('crewai.llm', request, lambda: self._llm.call(messages, *args, **kwargs))
+
+    def supports_function_calling(self) -> bool:
+        return self._llm.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self._llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self._llm.get_context_window_size()
@@ -0,0 +1,59 @@
+import json
+from typing import Any, Dict
+
+from openai import AsyncOpenAI, OpenAI
+
+from common.budget.prompt_budget import PromptBudget
+from common.budget.token_estimator import TokenEstimator
+from common.concurrency.single_flight import SingleFlight
+from common.models.request_key import RequestKey
+
+class _BudgetedChatCompletions:
+
+    def __init__(self, single_flight: SingleFlight, budget: PromptBudget):
+        self._single_flight = single_flight
+        self._budget = budget
+
+    def _fit_to_budget(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # Tool schemas are sent with every request, so they count against the budget too.
+        tools_tokens = TokenEstimator.estimate_text(json.dumps(kwargs['tools'], default=str)) if kwargs.get('tools') else 0
+        messages = self._budget.fit(kwargs['messages'], model=kwargs.get('model'), reserved_tokens=tools_tokens)
+        return {**kwargs, 'messages': messages}
+
+class CoalescingChatCompletions(_BudgetedChatCompletions):
+    """ Stands in for client.chat.completions; byte-identical concurrent requests share a single response """
+
+    def __init__(self, client: OpenAI, single_flight: SingleFlight, budget: PromptBudget):
+        super().__init__(single_flight, budget)
+        self._client = client
+
+    def create(self, **kwargs) -> Any:
+        kwargs = self._fit_to_budget(kwargs)
+        if kwargs.get('stream'):
+            return self._client.chat.completions.create(**kwargs)
+        key = RequestKey.for_kwargs(method='create', **kwargs)
+        return self._single_flight.do_sync(key, lambda: self._client.chat.completions.create(**kwargs))
+
+    def parse(self, **kwargs) -> Any:
+        kwargs = self._fit_to_budget(kwargs)
+        key = RequestKey.for_kwargs(method='parse', **kwargs)
+        return self._single_flight.do_sync(key, lambda: self._client.beta.chat.completions.parse(**kwargs))
+
+class AsyncCoalescingChatCompletions(_BudgetedChatCompletions):
+    """ Async twin of CoalescingChatCompletions """
+
+    def __init__(self, client: AsyncOpenAI, single_flight: SingleFlight, budget: PromptBudget):
+        super().__init__(single_flight, budget)
+        self._client = client
+
+    async def create(self, **kwargs) -> Any:
+        kwargs = self._fit_to_budget(kwargs)
+        if kwargs.get('stream'):
+            return await self._client.chat.completions.create(**kwargs)
+        key = RequestKey.for_kwargs(method='create', **kwargs)
+        return await self._single_flight.do(key, lambda: self._client.chat.completions.create(**kwargs))
+
+    async def parse(self, **kwargs) -> Any:
+        kwargs = self._fit_to_budget(kwargs)
+        key = RequestKey.for_kwargs(method='parse', **kwargs)
+        return await self._single_flight.do(key, lambda: self._client.beta.chat.completions.parse(**kwargs))
@@ -0,0 +1,160 @@
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from common.budget.prompt_budget import PromptBudget
+from common.cassettes.cassette_transport import AsyncCassetteTransport, CassetteTransport
+from common.clients.coalescing_chat_completions import AsyncCoalescingChatCompletions, CoalescingChatCompletions
+from common.concurrency.single_flight import SingleFlight
+from common.constants import Constants
+from common.rate_limiting.rate_limited_transport import AsyncRateLimitedTransport, RateLimitedTransport
+
+@dataclass
+class _LoopClient:
+    client: AsyncOpenAI
+    http_client: httpx.AsyncClient
+    shutdown_hook: AsyncGenerator[None, None]
+
+class _LoopBoundAsyncClient:
+    """ Stands in for an AsyncOpenAI client and forwards to the one owned by the running event loop """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(GeminiClientRegistry.get_async_client(), name)
+
+class GeminiClientRegistry:
+    """ Builds Gemini OpenAI-compatible clients lazily and shares one tuned connection pool per event loop """
+
+    _MAX_CONNECTIONS = 100
+    _MAX_KEEPALIVE_CONNECTIONS = 20
+    _KEEPALIVE_EXPIRY_SECONDS = 30.0
+    _TIMEOUT_SECONDS = 60.0
+    _CONNECT_TIMEOUT_SECONDS = 10.0
+
+    _LOCK = threading.Lock()
+    _ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient]" = weakref.WeakKeyDictionary()
+    _SYNC_CLIENT: Optional[OpenAI] = None
+    _CHAT_COMPLETIONS: Optional[CoalescingChatCompletions] = None
+    _ASYNC_CHAT_COMPLETIONS: Optional[AsyncCoalescingChatCompletions] = None
+    _SINGLE_FLIGHT = SingleFlight()
+    _LOOP_BOUND_CLIENT = _LoopBoundAsyncClient()
+
+    @classmethod
+    def get_async_client(cls) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        with cls._LOCK:
+            entry = cls._ASYNC_CLIENTS.get(loop)
+            if entry is None:
+                http_client = cls._build_async_http_client()
+                client = AsyncOpenAI(api_key=os.getenv(Constants.GOOGLE_API_KEY),
+                                     base_url=Constants.GEMINI_BASE_URL,
+                                     http_client=http_client)
+                entry = _LoopClient(client, http_client, cls._close_on_loop_shutdown(weakref.ref(loop), client))
+                cls._ASYNC_CLIENTS[loop] = entry
+                # Advancing the hook once registers it with the loop, so asyncio.run() finalizes it on shutdown.
+                asyncio.ensure_future(entry.shutdown_hook.__anext__(), loop=loop)
+        return entry.client
+
+    @classmethod
+    def get_async_http_client(cls) -> httpx.AsyncClient:
+        # For clients that build their own AsyncOpenAI (e.g. autogen) but should share this loop's pool and limits.
+        cls.get_async_client()
+        with cls._LOCK:
+            return cls._ASYNC_CLIENTS[asyncio.get_running_loop()].http_client
+
+    @classmethod
+    def get_loop_bound_async_client(cls) -> AsyncOpenAI:
+        # Safe to hand to long lived objects (e.g. the shared agents SDK model) built outside any event loop.
+        return cls._LOOP_BOUND_CLIENT
+
+    @classmethod
+    def get_client(cls) -> OpenAI:
+        with cls._LOCK:
+            return cls._get_client_locked()
+
+    @classmethod
+    def get_chat_completions(cls) -> CoalescingChatCompletions:
+        with cls._LOCK:
+            if cls._CHAT_COMPLETIONS is None:
+                cls._CHAT_COMPLETIONS = CoalescingChatCompletions(cls._get_client_locked(), cls._SINGLE_FLIGHT,
+                                                           PromptBudget.get_default())
+        return cls._CHAT_COMPLETIONS
+
+    @classmethod
+    def get_async_chat_completions(cls) -> AsyncCoalescingChatCompletions:
+        # Bound to whichever loop is running at call time, so one instance serves every loop.
+        with cls._LOCK:
+            if cls._ASYNC_CHAT_COMPLETIONS is None:
+                cls._ASYNC_CHAT_COMPLETIONS = AsyncCoalescingChatCompletions(cls._LOOP_BOUND_CLIENT, cls._SINGLE_FLIGHT,
+                                                                             PromptBudget.get_default())
+        return cls._ASYNC_CHAT_COMPLETIONS
+
+    @classmethod
+    def get_single_flight(cls) -> SingleFlight:
+        # One process-wide instance, so its coalesced counter covers both the sync and the async paths.
+        return cls._SINGLE_FLIGHT
+
+    @classmethod
+    async def aclose(cls):
+        """ Close the running loop's client early, e.g. before handing the loop to something else """
+        with cls._LOCK:
+            entry = cls._ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+        if entry:
+            await entry.client.close()
+
+    @classmethod
+    def _get_client_locked(cls) -> OpenAI:
+        if cls._SYNC_CLIENT is None:
+            cls._SYNC_CLIENT = OpenAI(api_key=os.getenv(Constants.GOOGLE_API_KEY),
+                                      base_url=Constants.GEMINI_BASE_URL,
+                                      http_client=cls._build_http_client())
+            atexit.register(cls._SYNC_CLIENT.close)
+        return cls._SYNC_CLIENT
+
+    @classmethod
+    def _build_async_http_client(cls) -> httpx.AsyncClient:
+        transport = httpx.AsyncHTTPTransport(limits=cls._get_limits(), http2=cls._is_http2_available())
+        # The cassette sits outermost so replayed calls are not throttled by the rate limiter.
+        return DefaultAsyncHttpxClient(transport=AsyncCassetteTransport(AsyncRateLimitedTransport(transport)),
+                                       timeout=cls._get_timeout())
+
+    @classmethod
+    def _build_http_client(cls) -> httpx.Client:
+        transport = httpx.HTTPTransport(limits=cls._get_limits(), http2=cls._is_http2_available())
+        return DefaultHttpxClient(transport=CassetteTransport(RateLimitedTransport(transport)),
+                                  timeout=cls._get_timeout())
+
+    @classmethod
+    def _get_limits(cls) -> httpx.Limits:
+        return httpx.Limits(max_connections=cls._MAX_CONNECTIONS,
+                            max_keepalive_connections=cls._MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=cls._KEEPALIVE_EXPIRY_SECONDS)
+
+    @classmethod
+    def _get_timeout(cls) -> httpx.Timeout:
+        return httpx.Timeout(cls._TIMEOUT_SECONDS, connect=cls._CONNECT_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _is_http2_available() -> bool:
+        # HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it.
+        return importlib.util.find_spec('h2') is not None
+
+    @classmethod
+    async def _close_on_loop_shutdown(cls,
+                                      loop_ref: "weakref.ref[asyncio.AbstractEventLoop]",
+                                      client: AsyncOpenAI) -> AsyncGenerator[None, None]:
+        try:
+            yield
+        finally:
+            loop = loop_ref()
+            with cls._LOCK:
+                if loop is not None and loop in cls._ASYNC_CLIENTS:
+                    del cls._ASYNC_CLIENTS[loop]
+            await client.close()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from common.metrics.metrics import Metrics
+
+T = TypeVar('T')
+
+class SingleFlight:
+    """ Runs at most one call per key at a time; callers arriving while it is in flight share its result """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._async_calls: Dict[str, asyncio.Task] = {}
+        # Callers still awaiting each async call; the call is cancelled once the last of them gives up.
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._sync_calls: Dict[str, Future] = {}
+        self._calls = 0
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._calls += 1
+            task = self._async_calls.get(key)
+            # Tasks can only be awaited from their own loop, so identical calls on other loops run separately.
+            coalesced = task is not None and task.get_loop() is loop
+            if coalesced:
+                self._coalesced += 1
+            else:
+                task = loop.create_task(fn())
+                self._async_calls[key] = task
+                task.add_done_callback(lambda done: self._forget(self._async_calls, key, done))
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+        Metrics.increment(Metrics.CACHE_HITS if coalesced else Metrics.CACHE_MISSES, cache='single_flight')
+        try:
+            # Shielded so that one caller giving up doesn't cancel the call for everyone attached to it.
+            return await asyncio.shield(task)
+        finally:
+            if self._release(key, task) and not task.done():
+                # Nobody is left to use the result, so stop the request rather than let it run on and spend quota.
+                task.cancel()
+
+    def do_sync(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            self._calls += 1
+            future = self._sync_calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._sync_calls[key] = future
+            else:
+                self._coalesced += 1
+        Metrics.increment(Metrics.CACHE_MISSES if leader else Metrics.CACHE_HITS, cache='single_flight')
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._forget(self._sync_calls, key, future)
+        return future.result()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self._calls, "coalesced": self._coalesced}
+
+    def _release(self, key: str, task: asyncio.Task) -> bool:
+        """ Whether the caller releasing the task was the last one waiting on it """
+        with self._lock:
+            self._waiters[task] -= 1
+            if self._waiters[task]:
+                return False
+            del self._waiters[task]
+            # A call being cancelled mustn't pick up new callers, who would only get its CancelledError.
+            if self._async_calls.get(key) is task:
+                del self._async_calls[key]
+            return True
+
+    def _forget(self, calls: dict, key: str, call):
+        with self._lock:
+            if calls.get(key) is call:
+                del calls[key]
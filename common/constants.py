@@ -1,18 +1,49 @@
 class Constants:
 
+    CASSETTE_MODE = 'CASSETTE_MODE'
+    CASSETTE_PATH = 'CASSETTE_PATH'
+    EMAIL_DELIVERY = 'EMAIL_DELIVERY'
+    EMAIL_HTML_CONVERTER = 'EMAIL_HTML_CONVERTER'
     EMAIL_ID_FROM = 'EMAIL_ID_FROM'
     EMAIL_ID_TO = 'EMAIL_ID_TO'
+    EMAIL_OUTBOX_PATH = 'EMAIL_OUTBOX_PATH'
     GEMINI_BASE_URL = 'https://generativelanguage.googleapis.com/v1beta/openai/'
     GEMINI_MODEL_LITE = 'gemini-2.5-flash-lite-preview-06-17'
     GEMINI_MODEL_MEDIUM = 'gemini-2.5-flash'
+    GEMINI_NATIVE_ENDPOINT = 'https://generativelanguage.googleapis.com'
     GOOGLE_API_KEY = 'GOOGLE_API_KEY'
+    GRADIO_CONCURRENCY_LIMIT = 'GRADIO_CONCURRENCY_LIMIT'
+    GRADIO_MAX_QUEUE_SIZE = 'GRADIO_MAX_QUEUE_SIZE'
+    GRADIO_MAX_THREADS = 'GRADIO_MAX_THREADS'
+    LLM_CACHE_PATH = 'LLM_CACHE_PATH'
+    METRICS_JSON_PATH = 'METRICS_JSON_PATH'
+    METRICS_PORT = 'METRICS_PORT'
+    OPEN_AI_ASSISTANT = 'assistant'
     OPEN_AI_CONTENT = 'content'
     OPEN_AI_ROLE = 'role'
     OPEN_AI_SYSTEM = 'system'
     OPEN_AI_TOOL_CALL = 'tool_calls'
     OPEN_AI_USER = 'user'
+    PERSONA_CONTEXT = 'PERSONA_CONTEXT'
+    PERSONA_CONTEXT_TOP_K = 'PERSONA_CONTEXT_TOP_K'
+    PROMPT_BUDGET_POLICY = 'PROMPT_BUDGET_POLICY'
+    PROMPT_MAX_TOKENS = 'PROMPT_MAX_TOKENS'
+    PUSHOVER_DEDUPE_SECONDS = 'PUSHOVER_DEDUPE_SECONDS'
+    PUSHOVER_DELIVERY = 'PUSHOVER_DELIVERY'
+    PUSHOVER_DIGEST_MAX_MESSAGES = 'PUSHOVER_DIGEST_MAX_MESSAGES'
+    PUSHOVER_DIGEST_SECONDS = 'PUSHOVER_DIGEST_SECONDS'
+    PUSHOVER_HOST = 'PUSHOVER_HOST'
+    PUSHOVER_QUOTA_PATH = 'PUSHOVER_QUOTA_PATH'
+    PUSHOVER_QUOTA_PER_MINUTE = 'PUSHOVER_QUOTA_PER_MINUTE'
+    PUSHOVER_QUOTA_PER_MONTH = 'PUSHOVER_QUOTA_PER_MONTH'
     PUSHOVER_TOKEN = 'PUSHOVER_TOKEN'
     PUSHOVER_URL = 'https://api.pushover.net/1/messages.json'
     PUSHOVER_USER = 'PUSHOVER_USER'
+    SEARCH_CACHE_PATH = 'SEARCH_CACHE_PATH'
+    SEARCH_INDEX_PATH = 'SEARCH_INDEX_PATH'
+    SEARCH_OFFLINE = 'SEARCH_OFFLINE'
     SENDGRID_API_KEY = 'SENDGRID_API_KEY'
+    SENDGRID_HOST = 'SENDGRID_HOST'
     SERPER_API_KEY = 'SERPER_API_KEY'
+    VALIDATOR_CANDIDATES = 'VALIDATOR_CANDIDATES'
+    VALIDATOR_MAX_CALLS = 'VALIDATOR_MAX_CALLS'
@@ -0,0 +1,31 @@
+from typing import Any, Callable, Dict, Optional
+
+from crewai import Crew, CrewOutput
+
+from common.metrics.metrics import Metrics
+
+class CrewMetrics:
+    """ Runs a crew kickoff as a Metrics step and records the tools and tokens the crew used """
+
+    @classmethod
+    def kickoff(cls, workflow: str, crew: Crew, inputs: Dict[str, Any]) -> CrewOutput:
+        # kickoff() hands the crew's step callback to every agent that doesn't have its own.
+        crew.step_callback = cls._get_step_callback(crew.step_callback)
+        with Metrics.step(workflow, 'crew'):
+            result = crew.kickoff(inputs=inputs)
+        usage = result.token_usage
+        if usage:
+            Metrics.increment(Metrics.LLM_TOKENS, usage.prompt_tokens, workflow=workflow, direction='input')
+            Metrics.increment(Metrics.LLM_TOKENS, usage.completion_tokens, workflow=workflow, direction='output')
+        return result
+
+    @staticmethod
+    def _get_step_callback(existing: Optional[Callable[[Any], Any]]) -> Callable[[Any], Any]:
+        def on_step(step: Any):
+            # Steps that picked a tool are AgentActions; the final answer is an AgentFinish without one.
+            tool = getattr(step, 'tool', None)
+            if tool:
+                Metrics.increment(Metrics.TOOL_CALLS, tool=tool)
+            if existing:
+                existing(step)
+        return on_step
@@ -0,0 +1,56 @@
+import bisect
+from typing import Dict, List, Sequence
+
+class Histogram:
+    """ Fixed bucket latency histogram in the Prometheus style: cumulative bucket counts plus sum and count """
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self._buckets = list(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def buckets(self) -> List[float]:
+        return self._buckets
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def cumulative_counts(self) -> List[int]:
+        """ Counts of observations <= each bucket bound, with the +Inf bucket last """
+        total = 0
+        cumulative = []
+        for count in self._counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, fraction: float) -> float:
+        """ Upper bound of the bucket holding the given quantile; good enough to see where time goes """
+        if not self._count:
+            return 0.0
+        rank = fraction * self._count
+        for bound, cumulative in zip(self._buckets, self.cumulative_counts()):
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"count": self._count,
+                "sum": self._sum,
+                "p50": self.quantile(0.50),
+                "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99)}
@@ -0,0 +1,275 @@
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from common.constants import Constants
+from common.metrics.histogram import Histogram
+
+_LabelSet = Tuple[Tuple[str, str], ...]
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = Metrics.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class Metrics:
+    """ Process-wide counters, gauges and latency histograms shared by every framework in the repo, labelled by
+        workflow, agent and model, exported as Prometheus text and as a periodic JSON dump """
+
+    LLM_REQUEST_SECONDS = 'agentic_llm_request_seconds'
+    LLM_TOKENS = 'agentic_llm_tokens_total'
+    TOOL_CALLS = 'agentic_tool_calls_total'
+    RETRIES = 'agentic_retries_total'
+    CACHE_HITS = 'agentic_cache_hits_total'
+    CACHE_MISSES = 'agentic_cache_misses_total'
+    PROMPT_TOKENS = 'agentic_prompt_tokens_estimated_total'
+    PROMPT_BUDGET_ACTIONS = 'agentic_prompt_budget_actions_total'
+    NOTIFICATION_QUEUE_DEPTH = 'agentic_notification_queue_depth'
+    NOTIFICATION_DELIVERY_SECONDS = 'agentic_notification_delivery_seconds'
+    NOTIFICATIONS = 'agentic_notifications_total'
+    STRUCTURED_OUTPUTS = 'agentic_structured_outputs_total'
+    STEP_SECONDS = 'agentic_step_seconds'
+    STEP_ERRORS = 'agentic_step_errors_total'
+    SPECULATIVE_CANDIDATES = 'agentic_speculative_candidates_total'
+    HEDGES = 'agentic_hedges_total'
+
+    _HELP = {LLM_REQUEST_SECONDS: "Latency of each LLM call attempt",
+             LLM_TOKENS: "Tokens spent on LLM calls, by direction",
+             TOOL_CALLS: "Tool calls requested by LLMs",
+             RETRIES: "LLM calls retried or failed over, by reason",
+             CACHE_HITS: "Requests answered without calling the upstream LLM or API, by cache",
+             CACHE_MISSES: "Requests that had to call the upstream LLM or API, by cache",
+             PROMPT_TOKENS: "Locally estimated prompt tokens, counted before requests are sent",
+             PROMPT_BUDGET_ACTIONS: "Prompts warned about, trimmed or rejected by the prompt budget",
+             NOTIFICATION_QUEUE_DEPTH: "Push notifications waiting for background delivery",
+             NOTIFICATION_DELIVERY_SECONDS: "Time from enqueueing a push notification to its delivery",
+             NOTIFICATIONS: "Push notifications by outcome",
+             STRUCTURED_OUTPUTS: "Structured outputs by outcome: valid as returned, repaired locally, re-prompted or failed",
+             STEP_SECONDS: "Latency of workflow steps: crew kickoffs, graph nodes and agent message handlers",
+             STEP_ERRORS: "Workflow steps that raised",
+             SPECULATIVE_CANDIDATES: "Speculative reply candidates by outcome: accepted, rejected, failed or cancelled",
+             HEDGES: "Hedged LLM requests: duplicates fired past the p95 latency, and those that finished first"}
+
+    _JSON_DUMP_INTERVAL_SECONDS = 60.0
+
+    _LOCK = threading.Lock()
+    _COUNTERS: Dict[str, Dict[_LabelSet, float]] = {}
+    _GAUGES: Dict[str, Dict[_LabelSet, float]] = {}
+    _HISTOGRAMS: Dict[str, Dict[_LabelSet, Histogram]] = {}
+    _LABELS: ContextVar[Dict[str, str]] = ContextVar('metrics_labels', default={})
+    _EXPORTERS_STARTED = False
+
+    @classmethod
+    @contextmanager
+    def scope(cls, **labels: Optional[str]) -> Iterator[None]:
+        """ Labels (e.g. workflow, agent) applied to everything recorded inside the block, including in spawned tasks """
+        token = cls._LABELS.set({**cls._LABELS.get(), **{k: v for k, v in labels.items() if v}})
+        try:
+            yield
+        finally:
+            cls._LABELS.reset(token)
+
+    @classmethod
+    @contextmanager
+    def step(cls, workflow: str, agent: str) -> Iterator[None]:
+        with cls.scope(workflow=workflow, agent=agent):
+            started = time.monotonic()
+            try:
+                yield
+            except BaseException:
+                cls.increment(cls.STEP_ERRORS)
+                raise
+            finally:
+                cls.observe(cls.STEP_SECONDS, time.monotonic() - started)
+
+    @classmethod
+    def instrumented(cls, workflow: str, agent: str) -> Callable[[Callable], Callable]:
+        """ Decorator form of step() for sync or async functions, e.g. graph nodes """
+
+        def decorator(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with cls.step(workflow, agent):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with cls.step(workflow, agent):
+                    return fn(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    @classmethod
+    def increment(cls, name: str, amount: float = 1.0, **labels: Optional[str]):
+        key = cls._get_label_set(labels)
+        with cls._LOCK:
+            series = cls._COUNTERS.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+        cls._start_exporters()
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float, **labels: Optional[str]):
+        key = cls._get_label_set(labels)
+        with cls._LOCK:
+            cls._GAUGES.setdefault(name, {})[key] = value
+        cls._start_exporters()
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels: Optional[str]):
+        key = cls._get_label_set(labels)
+        with cls._LOCK:
+            series = cls._HISTOGRAMS.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+        cls._start_exporters()
+
+    @classmethod
+    def record_llm_result(cls, model: str, result: Any):
+        """ Count tokens and requested tool calls from whichever response type a framework returned """
+        input_tokens, output_tokens = cls._get_token_usage(result)
+        if input_tokens:
+            cls.increment(cls.LLM_TOKENS, input_tokens, model=model, direction='input')
+        if output_tokens:
+            cls.increment(cls.LLM_TOKENS, output_tokens, model=model, direction='output')
+        for tool in cls._get_tool_calls(result):
+            cls.increment(cls.TOOL_CALLS, model=model, tool=tool)
+
+    @classmethod
+    def render_prometheus(cls) -> str:
+        lines = []
+        with cls._LOCK:
+            for kind, metrics in (('counter', cls._COUNTERS), ('gauge', cls._GAUGES)):
+                for name, series in sorted(metrics.items()):
+                    lines += [f'# HELP {name} {cls._HELP.get(name, name)}', f'# TYPE {name} {kind}']
+                    lines += [f'{name}{cls._format_labels(key)} {value:g}' for key, value in sorted(series.items())]
+            for name, series in sorted(cls._HISTOGRAMS.items()):
+                lines += [f'# HELP {name} {cls._HELP.get(name, name)}', f'# TYPE {name} histogram']
+                for key, histogram in sorted(series.items()):
+                    bounds = [f'{bound:g}' for bound in histogram.buckets] + ['+Inf']
+                    for bound, count in zip(bounds, histogram.cumulative_counts()):
+                        lines.append(f'{name}_bucket{cls._format_labels(key + (("le", bound),))} {count}')
+                    lines.append(f'{name}_sum{cls._format_labels(key)} {histogram.sum:g}')
+                    lines.append(f'{name}_count{cls._format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, List[Dict[str, Any]]]:
+        with cls._LOCK:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                        for name, series in {**cls._COUNTERS, **cls._GAUGES}.items()}
+            histograms = {name: [{"labels": dict(key), **histogram.snapshot()} for key, histogram in sorted(series.items())]
+                          for name, series in cls._HISTOGRAMS.items()}
+        return {**counters, **histograms}
+
+    @classmethod
+    def serve(cls, port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+        """ Serve the Prometheus text format on http://host:port/metrics from a daemon thread """
+        server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Metrics: serving Prometheus text on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    @classmethod
+    def start_json_dump(cls, path: str, interval_seconds: float = _JSON_DUMP_INTERVAL_SECONDS):
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                cls.dump_json(path)
+
+        threading.Thread(target=run, name='metrics-json', daemon=True).start()
+        atexit.register(cls.dump_json, path)
+
+    @classmethod
+    def dump_json(cls, path: str):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"timestamp": time.time(), "metrics": cls.snapshot()}, f, indent=1)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def _start_exporters(cls):
+        # Exporters come up with the first recorded metric, so no entry point has to opt in beyond the env vars.
+        if cls._EXPORTERS_STARTED:
+            return
+        with cls._LOCK:
+            if cls._EXPORTERS_STARTED:
+                return
+            cls._EXPORTERS_STARTED = True
+        try:
+            port = os.getenv(Constants.METRICS_PORT)
+            if port:
+                cls.serve(int(port))
+            json_path = os.getenv(Constants.METRICS_JSON_PATH)
+            if json_path:
+                cls.start_json_dump(json_path)
+        except (OSError, ValueError) as e:
+            # Metrics must never take down the call being measured.
+            print(f"Metrics: could not start exporters: {e}")
+
+    @classmethod
+    def _get_label_set(cls, labels: Dict[str, Optional[str]]) -> _LabelSet:
+        merged = {**cls._LABELS.get(), **{k: str(v) for k, v in labels.items() if v is not None}}
+        return tuple(sorted(merged.items()))
+
+    @staticmethod
+    def _format_labels(labels: _LabelSet) -> str:
+        if not labels:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+    @staticmethod
+    def _get_token_usage(result: Any) -> Tuple[int, int]:
+        usage = getattr(result, 'usage', None)
+        if usage is not None:
+            # agents SDK ModelResponse, or an OpenAI chat completion
+            return (getattr(usage, 'input_tokens', None) or getattr(usage, 'prompt_tokens', 0) or 0,
+                    getattr(usage, 'output_tokens', None) or getattr(usage, 'completion_tokens', 0) or 0)
+        usage = getattr(result, 'usage_metadata', None)
+        if isinstance(usage, dict):
+            # LangChain AIMessage
+            return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+        usage = getattr(result, 'models_usage', None)
+        if usage is not None:
+            # autogen chat message
+            return usage.prompt_tokens, usage.completion_tokens
+        return 0, 0
+
+    @staticmethod
+    def _get_tool_calls(result: Any) -> List[str]:
+        if isinstance(getattr(result, 'output', None), list):
+            # agents SDK ModelResponse
+            return [item.name for item in result.output if getattr(item, 'type', None) == 'function_call']
+        choices = getattr(result, 'choices', None)
+        if choices:
+            # OpenAI chat completion
+            return [call.function.name for call in choices[0].message.tool_calls or []]
+        tool_calls = getattr(result, 'tool_calls', None)
+        if isinstance(tool_calls, list):
+            # LangChain AIMessage
+            return [call['name'] for call in tool_calls]
+        return []
@@ -0,0 +1,56 @@
+import json
+from typing import AsyncIterator, List, Optional
+
+from agents import Handoff, Model, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import TResponseInputItem, TResponseStreamEvent
+
+from common.budget.prompt_budget import PromptBudget
+from common.budget.token_estimator import TokenEstimator
+
+class BudgetedModel(Model):
+    """ Fits each request's input items to a PromptBudget before it reaches the wrapped model """
+
+    def __init__(self, model: Model, budget: PromptBudget):
+        self._model = model
+        self._budget = budget
+        self.model = getattr(model, 'model', type(model).__name__)
+
+    async def get_response(self,
+                           system_instructions: Optional[str],
+                           input: str | List[TResponseInputItem],
+                           model_settings: ModelSettings,
+                           tools: List[Tool],
+                           output_schema: Optional[AgentOutputSchemaBase],
+                           handoffs: List[Handoff],
+                           tracing: ModelTracing,
+                           **kwargs) -> ModelResponse:
+        input = self._fit(system_instructions, input, tools)
+        return await self._model.get_response(system_instructions, input, model_settings, tools,
+                                              output_schema, handoffs, tracing, **kwargs)
+
+    def stream_response(self,
+                        system_instructions: Optional[str],
+                        input: str | List[TResponseInputItem],
+                        model_settings: ModelSettings,
+                        tools: List[Tool],
+                        output_schema: Optional[AgentOutputSchemaBase],
+                        handoffs: List[Handoff],
+                        tracing: ModelTracing,
+                        **kwargs) -> AsyncIterator[TResponseStreamEvent]:
+        input = self._fit(system_instructions, input, tools)
+        return self._model.stream_response(system_instructions, input, model_settings, tools,
+                                           output_schema, handoffs, tracing, **kwargs)
+
+    def _fit(self, system_instructions: Optional[str], input: str | List[TResponseInputItem],
+             tools: List[Tool]) -> str | List[TResponseInputItem]:
+        # Instructions and tool schemas can't be trimmed, but they count against the budget.
+        reserved_tokens = TokenEstimator.estimate_text(system_instructions or '')
+        for tool in tools or []:
+            reserved_tokens += TokenEstimator.estimate_text(json.dumps({"name": getattr(tool, 'name', None),
+                                                                        "description": getattr(tool, 'description', None),
+                                                                        "parameters": getattr(tool, 'params_json_schema', None)},
+                                                                       default=str))
+        if isinstance(input, str):
+            return self._budget.fit([input], model=self.model, reserved_tokens=reserved_tokens)[0]
+        return self._budget.fit(input, model=self.model, reserved_tokens=reserved_tokens)
@@ -0,0 +1,66 @@
+from typing import AsyncIterator, List, Optional
+
+from agents import Handoff, Model, ModelResponse, ModelSettings, ModelTracing, Tool, Usage
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import TResponseInputItem, TResponseOutputItem, TResponseStreamEvent
+from pydantic import TypeAdapter
+
+from common.cache.response_cache import ResponseCache
+from common.metrics.metrics import Metrics
+from common.models.request_key import RequestKey
+
+class CachingModel(Model):
+    """ Wraps a model and serves repeated identical requests from a ResponseCache """
+
+    _OUTPUT_ADAPTER = TypeAdapter(List[TResponseOutputItem])
+
+    def __init__(self, model: Model, cache: ResponseCache):
+        self._model = model
+        self._cache = cache
+        self.model = getattr(model, 'model', type(model).__name__)
+
+    @property
+    def cache(self) -> ResponseCache:
+        return self._cache
+
+    async def get_response(self,
+                           system_instructions: Optional[str],
+                           input: str | List[TResponseInputItem],
+                           model_settings: ModelSettings,
+                           tools: List[Tool],
+                           output_schema: Optional[AgentOutputSchemaBase],
+                           handoffs: List[Handoff],
+                           tracing: ModelTracing,
+                           **kwargs) -> ModelResponse:
+        key = RequestKey.for_model_call(self.model,
+                                        system_instructions,
+                                        input,
+                                        model_settings,
+                                        tools,
+                                        output_schema,
+                                        handoffs,
+                                        kwargs.get('previous_response_id'))
+        cached = self._cache.get(key)
+        if cached is not None:
+            Metrics.increment(Metrics.CACHE_HITS, cache='llm_response')
+            # A cache hit spends no tokens, so usage is reported as zero.
+            return ModelResponse(self._OUTPUT_ADAPTER.validate_json(cached), Usage(), None)
+
+        Metrics.increment(Metrics.CACHE_MISSES, cache='llm_response')
+        response = await self._model.get_response(system_instructions, input, model_settings, tools,
+                                                  output_schema, handoffs, tracing, **kwargs)
+        self._cache.set(key, self._OUTPUT_ADAPTER.dump_json(response.output).decode('utf-8'))
+        return response
+
+    def stream_response(self,
+                        system_instructions: Optional[str],
+                        input: str | List[TResponseInputItem],
+                        model_settings: ModelSettings,
+                        tools: List[Tool],
+                        output_schema: Optional[AgentOutputSchemaBase],
+                        handoffs: List[Handoff],
+                        tracing: ModelTracing,
+                        **kwargs) -> AsyncIterator[TResponseStreamEvent]:
+        # Streams are passed through untouched; only complete responses are cached.
+        return self._model.stream_response(system_instructions, input, model_settings, tools,
+                                           output_schema, handoffs, tracing, **kwargs)
@@ -0,0 +1,43 @@
+from typing import AsyncIterator, Dict, List, Optional
+
+from agents import Handoff, Model, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import TResponseInputItem, TResponseStreamEvent
+
+from common.resilience.model_failover import ModelFailover
+
+class FailoverModel(Model):
+    """ Sends each request to the first model whose circuit breaker is closed, in the given order of preference """
+
+    def __init__(self, models: Dict[str, Model]):
+        self._models = models
+        # Keeps the primary name visible to wrappers that key on it, e.g. the response cache.
+        self.model = next(iter(models))
+
+    async def get_response(self,
+                           system_instructions: Optional[str],
+                           input: str | List[TResponseInputItem],
+                           model_settings: ModelSettings,
+                           tools: List[Tool],
+                           output_schema: Optional[AgentOutputSchemaBase],
+                           handoffs: List[Handoff],
+                           tracing: ModelTracing,
+                           **kwargs) -> ModelResponse:
+        return await ModelFailover.call_async(
+            lambda name: self._models[name].get_response(system_instructions, input, model_settings, tools,
+                                                         output_schema, handoffs, tracing, **kwargs),
+            list(self._models))
+
+    def stream_response(self,
+                        system_instructions: Optional[str],
+                        input: str | List[TResponseInputItem],
+                        model_settings: ModelSettings,
+                        tools: List[Tool],
+                        output_schema: Optional[AgentOutputSchemaBase],
+                        handoffs: List[Handoff],
+                        tracing: ModelTracing,
+                        **kwargs) -> AsyncIterator[TResponseStreamEvent]:
+        # A stream can't be retried on another model once events have been yielded, so it only avoids open circuits.
+        model = self._models[ModelFailover.select(list(self._models))]
+        return model.stream_response(system_instructions, input, model_settings, tools,
+                                     output_schema, handoffs, tracing, **kwargs)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import AsyncIterator, List, Optional
+
+from agents import Handoff, Model, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import TResponseInputItem, TResponseStreamEvent
+
+from common.metrics.metrics import Metrics
+from common.models.latency_window import LatencyWindow
+
+class HedgingModel(Model):
+    """ Sends a duplicate request when a call runs past the rolling p95 latency and keeps whichever finishes first """
+
+    DEFAULT_HEDGE_BUDGET = 0.05
+    _WINDOW_SIZE = 200
+    _MIN_SAMPLES = 20
+    _HEDGE_PERCENTILE = 0.95
+
+    def __init__(self, model: Model, hedge_budget: float = DEFAULT_HEDGE_BUDGET):
+        self._model = model
+        self._hedge_budget = hedge_budget
+        self._latencies = LatencyWindow(self._WINDOW_SIZE)
+        self._requests = 0
+        self._hedges_fired = 0
+
+    async def get_response(self,
+                           system_instructions: Optional[str],
+                           input: str | List[TResponseInputItem],
+                           model_settings: ModelSettings,
+                           tools: List[Tool],
+                           output_schema: Optional[AgentOutputSchemaBase],
+                           handoffs: List[Handoff],
+                           tracing: ModelTracing,
+                           **kwargs) -> ModelResponse:
+        self._requests += 1
+
+        def start() -> asyncio.Task:
+            return asyncio.ensure_future(self._timed(self._model.get_response(system_instructions, input, model_settings,
+                                                                              tools, output_schema, handoffs, tracing,
+                                                                              **kwargs)))
+
+        primary = start()
+        tasks = {primary}
+        try:
+            hedge_delay = self._get_hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self._has_hedge_budget():
+                    self._hedges_fired += 1
+                    Metrics.increment(Metrics.HEDGES, model=self._get_model_name(), outcome='fired')
+                    tasks.add(start())
+
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                # An attempt cancelled from outside has no exception to ask for; asking would raise CancelledError.
+                succeeded = [task for task in done if not task.cancelled() and task.exception() is None]
+                if succeeded:
+                    winner = primary if primary in succeeded else succeeded[0]
+                    break
+                # A failed attempt only counts if there is nothing else left that could still succeed.
+                if not pending:
+                    winner = primary if primary in done else done.pop()
+                    break
+                tasks = pending
+
+            if winner is not primary:
+                Metrics.increment(Metrics.HEDGES, model=self._get_model_name(), outcome='won')
+            return winner.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stream_response(self,
+                        system_instructions: Optional[str],
+                        input: str | List[TResponseInputItem],
+                        model_settings: ModelSettings,
+                        tools: List[Tool],
+                        output_schema: Optional[AgentOutputSchemaBase],
+                        handoffs: List[Handoff],
+                        tracing: ModelTracing,
+                        **kwargs) -> AsyncIterator[TResponseStreamEvent]:
+        # A stream has already delivered its first events to the caller, so it cannot be swapped for a hedge.
+        return self._model.stream_response(system_instructions, input, model_settings, tools,
+                                           output_schema, handoffs, tracing, **kwargs)
+
+    async def _timed(self, call) -> ModelResponse:
+        started = time.monotonic()
+        try:
+            response = await call
+        except asyncio.CancelledError:
+            # A slow loser cut off by the winner took at least this long; leaving it out would drag the p95 down.
+            self._latencies.record(time.monotonic() - started)
+            raise
+        self._latencies.record(time.monotonic() - started)
+        return response
+
+    def _get_model_name(self) -> str:
+        return getattr(self._model, 'model', type(self._model).__name__)
+
+    def _get_hedge_delay(self) -> Optional[float]:
+        if len(self._latencies) < self._MIN_SAMPLES:
+            return None
+        return self._latencies.percentile(self._HEDGE_PERCENTILE)
+
+    def _has_hedge_budget(self) -> bool:
+        return self._hedges_fired < self._hedge_budget * self._requests
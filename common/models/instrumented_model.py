@@ -0,0 +1,49 @@
+from typing import AsyncIterator, List, Optional
+
+from agents import Handoff, Model, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import TResponseInputItem, TResponseStreamEvent
+from agents.tracing import get_current_span
+
+from common.metrics.metrics import Metrics
+
+class InstrumentedModel(Model):
+    """ Labels the metrics recorded by the wrapped model stack with the name of the agent making the call """
+
+    def __init__(self, model: Model):
+        self._model = model
+        self.model = getattr(model, 'model', type(model).__name__)
+
+    async def get_response(self,
+                           system_instructions: Optional[str],
+                           input: str | List[TResponseInputItem],
+                           model_settings: ModelSettings,
+                           tools: List[Tool],
+                           output_schema: Optional[AgentOutputSchemaBase],
+                           handoffs: List[Handoff],
+                           tracing: ModelTracing,
+                           **kwargs) -> ModelResponse:
+        with Metrics.scope(agent=self._get_agent_name()):
+            return await self._model.get_response(system_instructions, input, model_settings, tools,
+                                                  output_schema, handoffs, tracing, **kwargs)
+
+    def stream_response(self,
+                        system_instructions: Optional[str],
+                        input: str | List[TResponseInputItem],
+                        model_settings: ModelSettings,
+                        tools: List[Tool],
+                        output_schema: Optional[AgentOutputSchemaBase],
+                        handoffs: List[Handoff],
+                        tracing: ModelTracing,
+                        **kwargs) -> AsyncIterator[TResponseStreamEvent]:
+        return self._model.stream_response(system_instructions, input, model_settings, tools,
+                                           output_schema, handoffs, tracing, **kwargs)
+
+    @staticmethod
+    def _get_agent_name() -> Optional[str]:
+        # The Runner marks the agent's span as current for the duration of its turn, even with tracing disabled.
+        span = get_current_span()
+        span_data = getattr(span, 'span_data', None)
+        if getattr(span_data, 'type', None) == 'agent':
+            return span_data.name
+        return None
@@ -0,0 +1,24 @@
+import threading
+from collections import deque
+from typing import Optional
+
+class LatencyWindow:
+    """ Rolling window of the most recent call latencies, in seconds """
+
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
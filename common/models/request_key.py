@@ -0,0 +1,67 @@
+import dataclasses
+import hashlib
+import json
+from typing import Any, List, Optional
+
+class RequestKey:
+    """ Stable content hash of an LLM request, used to address cached or in-flight responses """
+
+    @classmethod
+    def for_model_call(cls,
+                       model_name: str,
+                       system_instructions: Optional[str],
+                       input: Any,
+                       model_settings: Any,
+                       tools: List[Any],
+                       output_schema: Any,
+                       handoffs: List[Any],
+                       previous_response_id: Optional[str] = None) -> str:
+        payload = {"model": model_name,
+                   "system_instructions": system_instructions,
+                   "input": input,
+                   "model_settings": model_settings,
+                   "tools": [cls._describe_tool(tool) for tool in tools or []],
+                   "output_schema": cls._describe_output_schema(output_schema),
+                   "handoffs": [cls._describe_handoff(handoff) for handoff in handoffs or []],
+                   "previous_response_id": previous_response_id}
+        return cls._hash(payload)
+
+    @classmethod
+    def for_kwargs(cls, **kwargs) -> str:
+        return cls._hash(kwargs)
+
+    @classmethod
+    def _hash(cls, payload: Any) -> str:
+        serialized = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=cls._to_jsonable)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _to_jsonable(value: Any) -> Any:
+        if hasattr(value, 'model_dump'):
+            return value.model_dump(mode='json', exclude_unset=True)
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return dataclasses.asdict(value)
+        if isinstance(value, type):
+            return f'{value.__module__}.{value.__qualname__}'
+        return repr(value)
+
+    @staticmethod
+    def _describe_tool(tool: Any) -> dict:
+        return {"type": type(tool).__name__,
+                "name": getattr(tool, 'name', None),
+                "description": getattr(tool, 'description', None),
+                "parameters": getattr(tool, 'params_json_schema', None)}
+
+    @staticmethod
+    def _describe_handoff(handoff: Any) -> dict:
+        return {"name": getattr(handoff, 'tool_name', None),
+                "description": getattr(handoff, 'tool_description', None),
+                "parameters": getattr(handoff, 'input_json_schema', None)}
+
+    @staticmethod
+    def _describe_output_schema(output_schema: Any) -> Optional[dict]:
+        if output_schema is None or output_schema.is_plain_text():
+            return None
+        return {"name": output_schema.name(),
+                "strict": output_schema.is_strict_json_schema(),
+                "schema": output_schema.json_schema()}
@@ -0,0 +1,50 @@
+from typing import AsyncIterator, List, Optional
+
+from agents import Handoff, Model, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import TResponseInputItem, TResponseStreamEvent
+
+from common.concurrency.single_flight import SingleFlight
+from common.models.request_key import RequestKey
+
+class SingleFlightModel(Model):
+    """ Attaches identical concurrent requests to the one already in flight instead of sending them again """
+
+    def __init__(self, model: Model, single_flight: SingleFlight):
+        self._model = model
+        self._single_flight = single_flight
+        self.model = getattr(model, 'model', type(model).__name__)
+
+    async def get_response(self,
+                           system_instructions: Optional[str],
+                           input: str | List[TResponseInputItem],
+                           model_settings: ModelSettings,
+                           tools: List[Tool],
+                           output_schema: Optional[AgentOutputSchemaBase],
+                           handoffs: List[Handoff],
+                           tracing: ModelTracing,
+                           **kwargs) -> ModelResponse:
+        key = RequestKey.for_model_call(self.model,
+                                        system_instructions,
+                                        input,
+                                        model_settings,
+                                        tools,
+                                        output_schema,
+                                        handoffs,
+                                        kwargs.get('previous_response_id'))
+        return await self._single_flight.do(key, lambda: self._model.get_response(system_instructions, input,
+                                                                                  model_settings, tools, output_schema,
+                                                                                  handoffs, tracing, **kwargs))
+
+    def stream_response(self,
+                        system_instructions: Optional[str],
+                        input: str | List[TResponseInputItem],
+                        model_settings: ModelSettings,
+                        tools: List[Tool],
+                        output_schema: Optional[AgentOutputSchemaBase],
+                        handoffs: List[Handoff],
+                        tracing: ModelTracing,
+                        **kwargs) -> AsyncIterator[TResponseStreamEvent]:
+        # Each stream is consumed by exactly one caller, so streams are never shared.
+        return self._model.stream_response(system_instructions, input, model_settings, tools,
+                                           output_schema, handoffs, tracing, **kwargs)
@@ -1,19 +1,75 @@
 import os
 from dotenv import load_dotenv
+from typing import Dict
 
-from agents import AsyncOpenAI, OpenAIChatCompletionsModel
+from agents import Model, OpenAIChatCompletionsModel
 
+from common.budget.prompt_budget import PromptBudget
+from common.cache.response_cache import ResponseCache
+from common.clients.gemini_client_registry import GeminiClientRegistry
 from common.constants import Constants
+from common.models.budgeted_model import BudgetedModel
+from common.models.caching_model import CachingModel
+from common.models.failover_model import FailoverModel
+from common.models.hedging_model import HedgingModel
+from common.models.instrumented_model import InstrumentedModel
+from common.models.single_flight_model import SingleFlightModel
 
 load_dotenv(override=True)
 
 class OpenAIGeminiClient:
 
-    _EXTERNAL_CLIENT = AsyncOpenAI(api_key=os.getenv(Constants.GOOGLE_API_KEY),
-                                   base_url=Constants.GEMINI_BASE_URL)
+    # Models are built on first use and talk to whichever AsyncOpenAI client the running event loop owns,
+    # so repeated asyncio.run() calls each get a live, pooled client instead of one bound to a dead loop.
+    # The shared model prefers GEMINI_MODEL_LITE and fails over to GEMINI_MODEL_MEDIUM when its circuit trips.
+    # Identical requests that are already in flight are coalesced into one.
+    _MODEL = None
+    _FAILOVER_MODEL = None
+    _ENTRY_MODELS: Dict[bool, Model] = {}
 
-    _MODEL = OpenAIChatCompletionsModel(model=Constants.GEMINI_MODEL_LITE, openai_client=_EXTERNAL_CLIENT)
+    _DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'agentic-ai', 'llm_responses.sqlite')
+    _CACHING_MODEL = None
+    _HEDGING_MODEL = None
 
     @classmethod
-    def get_model(cls) -> OpenAIChatCompletionsModel:
+    def get_model(cls) -> Model:
+        # Setting LLM_CACHE_PATH turns on the response cache for every agent that uses the shared model.
+        # The prompt budget and instrumentation sit in front of the cache, so trimmed prompts are what get cached
+        # and cache hits are still attributed to the calling agent in Metrics.
+        use_cache = bool(os.getenv(Constants.LLM_CACHE_PATH))
+        if use_cache not in cls._ENTRY_MODELS:
+            model = cls.get_caching_model() if use_cache else cls._get_shared_model()
+            cls._ENTRY_MODELS[use_cache] = InstrumentedModel(BudgetedModel(model, PromptBudget.get_default()))
+        return cls._ENTRY_MODELS[use_cache]
+
+    @classmethod
+    def get_caching_model(cls) -> CachingModel:
+        if cls._CACHING_MODEL is None:
+            cache = ResponseCache(os.getenv(Constants.LLM_CACHE_PATH) or cls._DEFAULT_CACHE_PATH)
+            cls._CACHING_MODEL = CachingModel(cls._get_shared_model(), cache)
+        return cls._CACHING_MODEL
+
+    @classmethod
+    def get_hedging_model(cls) -> Model:
+        # Opt-in for latency critical calls that block a whole run, such as input guardrails. Hedging sits below
+        # single-flight: above it, the duplicate would have the same key and just attach to the primary's call.
+        if cls._HEDGING_MODEL is None:
+            single_flight_model = SingleFlightModel(HedgingModel(cls._get_failover_model()),
+                                                    GeminiClientRegistry.get_single_flight())
+            cls._HEDGING_MODEL = InstrumentedModel(BudgetedModel(single_flight_model, PromptBudget.get_default()))
+        return cls._HEDGING_MODEL
+
+    @classmethod
+    def _get_shared_model(cls) -> SingleFlightModel:
+        if cls._MODEL is None:
+            cls._MODEL = SingleFlightModel(cls._get_failover_model(), GeminiClientRegistry.get_single_flight())
         return cls._MODEL
+
+    @classmethod
+    def _get_failover_model(cls) -> FailoverModel:
+        if cls._FAILOVER_MODEL is None:
+            client = GeminiClientRegistry.get_loop_bound_async_client()
+            cls._FAILOVER_MODEL = FailoverModel({model: OpenAIChatCompletionsModel(model=model, openai_client=client)
+                                                 for model in (Constants.GEMINI_MODEL_LITE,
+                                                               Constants.GEMINI_MODEL_MEDIUM)})
+        return cls._FAILOVER_MODEL
@@ -0,0 +1,15 @@
+from crewai.utilities.converter import Converter
+from pydantic import BaseModel
+
+from common.parsing.structured_output_repair import StructuredOutputRepair
+
+class RepairingConverter(Converter):
+    """ Task converter_cls for output_pydantic that repairs a malformed output locally, leaving CrewAI's LLM
+        conversion round trip for outputs that can't be repaired """
+
+    def to_pydantic(self, current_attempt: int = 1) -> BaseModel:
+        try:
+            return StructuredOutputRepair.parse(self.text, self.model)
+        except ValueError:
+            StructuredOutputRepair.record_reprompt(self.model)
+            return super().to_pydantic(current_attempt)
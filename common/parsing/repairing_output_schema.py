@@ -0,0 +1,20 @@
+from typing import Any, Type
+
+from agents import AgentOutputSchema
+from agents.exceptions import ModelBehaviorError
+from pydantic import BaseModel
+
+from common.parsing.structured_output_repair import StructuredOutputRepair
+
+class RepairingOutputSchema(AgentOutputSchema):
+    """ Agent output_type that repairs malformed JSON locally before the run fails with a ModelBehaviorError """
+
+    def __init__(self, model: Type[BaseModel]):
+        super().__init__(model)
+        self._model = model
+
+    def validate_json(self, json_str: str) -> Any:
+        try:
+            return StructuredOutputRepair.parse(json_str, self._model)
+        except ValueError as e:
+            raise ModelBehaviorError(f"Invalid JSON for {self._model.__name__}: {e}") from e
@@ -0,0 +1,165 @@
+import json
+import re
+import threading
+import typing
+from typing import Any, AsyncIterator, Dict, Generic, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+T = TypeVar('T')
+
+class StreamingListParser(Generic[T]):
+    """ Incremental parser for structured outputs shaped like {"field": [item, item, ...], ...}. Fed the model's
+        streamed text, it returns each item of the list as soon as the item is complete, so work on the first items
+        can start while the model is still writing the rest """
+
+    # Anything before the opening brace of the object, such as a ```json fence, is skipped.
+    _STRING_SPECIAL = re.compile(r'["\\]')
+    _WHITESPACE = ' \t\r\n'
+
+    # Building an adapter compiles a validator, so it is done once per type rather than once per item.
+    _ADAPTERS: Dict[Any, TypeAdapter] = {}
+    _ADAPTERS_LOCK = threading.Lock()
+
+    def __init__(self, model: Type[BaseModel], field: Optional[str] = None):
+        self._model = model
+        self._field = field or self._get_list_field(model)
+        self._item_adapter: TypeAdapter = self.get_adapter(self._get_item_type(model, self._field))
+        self._chunks: List[str] = []
+        self._stack: List[str] = []
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key: Optional[List[str]] = None
+        self._current_key: Optional[str] = None
+        self._element: Optional[List[str]] = None
+        self._element_kind = ''
+        self.invalid_items = 0
+
+    @classmethod
+    def get_adapter(cls, type_: Any) -> TypeAdapter:
+        with cls._ADAPTERS_LOCK:
+            if type_ not in cls._ADAPTERS:
+                cls._ADAPTERS[type_] = TypeAdapter(type_)
+            return cls._ADAPTERS[type_]
+
+    def feed(self, chunk: str) -> List[T]:
+        """ Consume the next piece of streamed text and return the items it completed """
+        self._chunks.append(chunk)
+        items: List[T] = []
+        # Start of the current element within this chunk, while one is being captured.
+        start = 0 if self._element is not None else None
+        i = 0
+        while i < len(chunk) and not self._done:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                match = self._STRING_SPECIAL.search(chunk, i)
+                end = match.start() if match else len(chunk)
+                if self._key is not None:
+                    self._key.append(chunk[i:end])
+                if not match:
+                    break
+                if match.group() == '\\':
+                    if self._key is not None:
+                        self._key.append('\\')
+                    self._escape = True
+                    i = end + 1
+                    continue
+                self._in_string = False
+                if self._key is not None:
+                    self._current_key = self._decode_key(''.join(self._key))
+                    self._key = None
+                elif self._element_kind == '"' and len(self._stack) == 2:
+                    self._complete(chunk[start:end + 1], items)
+                    start = None
+                i = end + 1
+                continue
+
+            ch = chunk[i]
+            if not self._stack:
+                if ch == '{':
+                    self._stack.append(ch)
+                    self._expect_key = True
+                i += 1
+                continue
+
+            in_list = len(self._stack) == 2 and self._stack[1] == '[' and self._current_key == self._field
+            if in_list and self._element is None and ch not in self._WHITESPACE and ch not in ',]':
+                self._element = []
+                self._element_kind = ch if ch in '{["' else 'scalar'
+                start = i
+
+            if ch == '"':
+                self._in_string = True
+                if len(self._stack) == 1 and self._expect_key:
+                    self._key = []
+            elif ch in '{[':
+                self._stack.append(ch)
+            elif ch in '}]':
+                if in_list and self._element_kind == 'scalar':
+                    self._complete(chunk[start:i], items)
+                    start = None
+                self._stack.pop()
+                if not self._stack:
+                    self._done = True
+                elif len(self._stack) == 2 and self._element_kind in ('{', '['):
+                    self._complete(chunk[start:i + 1], items)
+                    start = None
+            elif ch == ',':
+                if len(self._stack) == 1:
+                    self._expect_key = True
+                elif in_list and self._element_kind == 'scalar':
+                    self._complete(chunk[start:i], items)
+                    start = None
+            elif ch == ':' and len(self._stack) == 1:
+                self._expect_key = False
+            i += 1
+
+        if self._element is not None and start is not None:
+            self._element.append(chunk[start:])
+        return items
+
+    def finish(self) -> BaseModel:
+        """ Validate the whole output once the stream has ended """
+        text = ''.join(self._chunks)
+        return self.get_adapter(self._model).validate_json(text[text.find('{'):text.rfind('}') + 1])
+
+    async def aiter_items(self, chunks: AsyncIterator[str]) -> AsyncIterator[T]:
+        async for chunk in chunks:
+            for item in self.feed(chunk):
+                yield item
+
+    def _complete(self, tail: str, items: List[T]):
+        text = ''.join(self._element) + tail
+        self._element = None
+        self._element_kind = ''
+        try:
+            items.append(self._item_adapter.validate_json(text))
+        except ValidationError as e:
+            # finish() reports the problem for the output as a whole; the items that are valid still go ahead.
+            self.invalid_items += 1
+            print(f"{self._model.__name__}: skipping invalid {self._field} item: {e}")
+
+    @staticmethod
+    def _decode_key(raw: str) -> str:
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return raw
+
+    @staticmethod
+    def _get_list_field(model: Type[BaseModel]) -> str:
+        fields = [name for name, info in model.model_fields.items()
+                  if typing.get_origin(info.annotation) in (list, List)]
+        if len(fields) != 1:
+            raise ValueError(f"{model.__name__} has {len(fields)} list fields, say which one to stream")
+        return fields[0]
+
+    @staticmethod
+    def _get_item_type(model: Type[BaseModel], field: str) -> Any:
+        args = typing.get_args(model.model_fields[field].annotation)
+        return args[0] if args else Any
@@ -0,0 +1,223 @@
+import json
+import re
+import typing
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from common.metrics.metrics import Metrics
+
+M = TypeVar('M', bound=BaseModel)
+
+class StructuredOutputRepair:
+    """ Fixes the usual ways an LLM's JSON goes wrong (code fences, trailing commas, single quotes, Python literals,
+        truncated strings, unbalanced brackets, loosely written booleans and enums) so that a malformed structured
+        output can be validated locally instead of costing another round trip to the model """
+
+    _FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+    _NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+    _LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+    _TRUE = frozenset(('true', 'yes', 'y', 't', '1', 'on', 'pass', 'passed', 'acceptable', 'correct'))
+    _FALSE = frozenset(('false', 'no', 'n', 'f', '0', 'off', 'fail', 'failed', 'unacceptable', 'incorrect'))
+    _REPROMPT = ("Your previous reply could not be parsed as {name}: {error}\n"
+                 "Reply again with only a JSON object that matches the schema, and nothing else.")
+
+    @classmethod
+    def parse(cls, text: str, model: Type[M]) -> M:
+        """ Validate the text as the model, repairing it first if it doesn't validate as it is. Raises ValueError
+            (ValidationError is one) when it can't be repaired """
+        try:
+            result = model.model_validate_json(text)
+            cls._record(model, 'valid')
+            return result
+        except ValidationError:
+            pass
+        data = json.loads(cls.repair(text))
+        result = model.model_validate(cls._coerce(data, model))
+        cls._record(model, 'repaired')
+        return result
+
+    @classmethod
+    def parse_or_reprompt(cls, text: str, model: Type[M], reprompt: Callable[[str], str], attempts: int = 1) -> M:
+        """ parse(), asking the model again through reprompt, which gets the correction message and returns the new
+            reply, only when local repair fails """
+        for attempt in range(attempts + 1):
+            try:
+                return cls.parse(text, model)
+            except ValueError as e:
+                if attempt == attempts:
+                    cls._record(model, 'failed')
+                    raise
+                cls._record(model, 'reprompted')
+                text = reprompt(cls.get_reprompt(model, e))
+
+    @classmethod
+    async def aparse_or_reprompt(cls, text: str, model: Type[M], reprompt: Callable[[str], Awaitable[str]],
+                                 attempts: int = 1) -> M:
+        """ Async twin of parse_or_reprompt """
+        for attempt in range(attempts + 1):
+            try:
+                return cls.parse(text, model)
+            except ValueError as e:
+                if attempt == attempts:
+                    cls._record(model, 'failed')
+                    raise
+                cls._record(model, 'reprompted')
+                text = await reprompt(cls.get_reprompt(model, e))
+
+    @classmethod
+    def get_reprompt(cls, model: Type[BaseModel], error: Exception) -> str:
+        return cls._REPROMPT.format(name=model.__name__, error=str(error)[:500])
+
+    @staticmethod
+    def get_response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+        """ Chat completions response_format asking for JSON matching the model, without the client validating it """
+        return {"type": "json_schema", "json_schema": {"name": model.__name__, "schema": model.model_json_schema()}}
+
+    @staticmethod
+    def record_reprompt(model: Type[BaseModel]):
+        """ For callers whose framework re-prompts by itself """
+        StructuredOutputRepair._record(model, 'reprompted')
+
+    @classmethod
+    def repair(cls, text: str) -> str:
+        """ Best effort rewrite of almost-JSON into JSON """
+        fenced = cls._FENCE.search(text)
+        # Only a fence around the JSON; one inside a string value, e.g. in a markdown report, is content.
+        if fenced and not re.search(r"[\[{]", text[:fenced.start()]):
+            text = fenced.group(1)
+        starts = [index for index in (text.find('{'), text.find('[')) if index >= 0]
+        if not starts:
+            return text.strip()
+        text = text[min(starts):]
+
+        out: List[str] = []
+        stack: List[str] = []
+        # Where the output was last a complete value followed by nothing dangling, with the brackets open there.
+        safe: Tuple[int, List[str]] = (0, [])
+        quote = ''
+        in_key = False
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            if quote:
+                if ch == '\\' and i + 1 < len(text):
+                    escaped = text[i + 1]
+                    # \' is valid inside a single quoted string but not in JSON.
+                    out.append(escaped if escaped == "'" else ch + escaped)
+                    i += 2
+                    continue
+                if ch == quote:
+                    out.append('"')
+                    quote = ''
+                    if not in_key:
+                        safe = (len(out), list(stack))
+                elif ch == '"':
+                    out.append('\\"')
+                elif ch == '\n':
+                    out.append('\\n')
+                else:
+                    out.append(ch)
+                i += 1
+                continue
+
+            if ch in '"\'':
+                quote = ch
+                in_key = cls._is_key_position(out, stack)
+                out.append('"')
+            elif ch in '{[':
+                stack.append('}' if ch == '{' else ']')
+                out.append(ch)
+            elif ch in '}]':
+                cls._drop_trailing_comma(out)
+                if stack:
+                    out.append(stack.pop())
+                    safe = (len(out), list(stack))
+                if not stack:
+                    break
+            elif ch.isalpha():
+                word = re.match(r"[A-Za-z_][A-Za-z0-9_]*", text[i:]).group()
+                if cls._is_key_position(out, stack):
+                    out.append(f'"{word}"')
+                else:
+                    # Bare words other than JSON's own literals become strings, for _coerce to make sense of.
+                    out.append(cls._LITERALS.get(word, word if word in ('true', 'false', 'null') else f'"{word}"'))
+                    safe = (len(out), list(stack))
+                i += len(word)
+                continue
+            elif number := cls._NUMBER.match(text, i):
+                out.append(number.group())
+                safe = (len(out), list(stack))
+                i = number.end()
+                continue
+            else:
+                out.append(ch)
+            i += 1
+
+        if quote:
+            if out and out[-1].endswith('\\') and not out[-1].endswith('\\\\'):
+                out[-1] = out[-1][:-1]
+            out.append('"')
+        cls._drop_trailing_comma(out)
+        candidate = ''.join(out) + ''.join(reversed(stack))
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            # Cut off mid key or mid value: fall back to the last point where a value was complete.
+            position, open_brackets = safe
+            kept = out[:position]
+            cls._drop_trailing_comma(kept)
+            return ''.join(kept) + ''.join(reversed(open_brackets))
+
+    @staticmethod
+    def _is_key_position(out: List[str], stack: List[str]) -> bool:
+        previous = next((piece for piece in reversed(out) if not piece.isspace()), '')
+        return bool(stack) and stack[-1] == '}' and previous in ('{', ',')
+
+    @staticmethod
+    def _drop_trailing_comma(out: List[str]):
+        while out and (out[-1].isspace() or out[-1] in (',', ':')):
+            out.pop()
+
+    @classmethod
+    def _coerce(cls, value: Any, annotation: Any) -> Any:
+        """ Loosen the data towards the annotation where pydantic's own lax mode wouldn't """
+        origin = typing.get_origin(annotation)
+        args = typing.get_args(annotation)
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            fields = annotation.model_fields
+            if isinstance(value, list):
+                list_fields = [name for name, info in fields.items()
+                               if typing.get_origin(info.annotation) in (list, List)]
+                # A bare list where the model has just one list field to put it in.
+                if len(list_fields) == 1:
+                    value = {list_fields[0]: value}
+            if not isinstance(value, dict):
+                return value
+            names = {name.lower(): name for name in fields}
+            coerced = {}
+            for key, item in value.items():
+                name = key if key in fields else names.get(str(key).lower().replace(' ', '_').replace('-', '_'), key)
+                coerced[name] = cls._coerce(item, fields[name].annotation) if name in fields else item
+            return coerced
+        if origin in (list, List) and isinstance(value, list) and args:
+            return [cls._coerce(item, args[0]) for item in value]
+        if origin is typing.Union:
+            return next((cls._coerce(value, arg) for arg in args if arg is not type(None)), value)
+        if annotation is bool and isinstance(value, str):
+            word = re.sub(r"[^a-z0-9]", '', value.strip().lower().split(' ')[0]) if value.strip() else ''
+            return True if word in cls._TRUE else False if word in cls._FALSE else value
+        if isinstance(annotation, type) and issubclass(annotation, Enum) and isinstance(value, str):
+            choices = {str(member.value).lower(): member.value for member in annotation}
+            choices.update({member.name.lower(): member.value for member in annotation})
+            return choices.get(value.strip().lower(), value)
+        if origin is typing.Literal and isinstance(value, str):
+            choices = {choice.lower(): choice for choice in args if isinstance(choice, str)}
+            return choices.get(value.strip().lower(), value)
+        return value
+
+    @staticmethod
+    def _record(model: Type[BaseModel], outcome: str):
+        Metrics.increment(Metrics.STRUCTURED_OUTPUTS, output=model.__name__, outcome=outcome)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+class AdaptiveConcurrencyLimit:
+    """ AIMD concurrency limit: grows additively on success and halves when the server signals overload """
+
+    def __init__(self,
+                 maximum: int,
+                 minimum: int = 1,
+                 decrease_factor: float = 0.5,
+                 decrease_cooldown_seconds: float = 1.0):
+        self._maximum = maximum
+        self._minimum = minimum
+        self._decrease_factor = decrease_factor
+        self._decrease_cooldown_seconds = decrease_cooldown_seconds
+        self._limit = float(maximum)
+        self._in_flight = 0
+        self._last_decrease_at = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self._minimum, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def acquire(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            # Roughly one extra slot per "window" of successful calls at the current limit.
+            self._limit = min(float(self._maximum), self._limit + 1.0 / max(self._limit, 1.0))
+            self._condition.notify()
+
+    def on_overload(self):
+        with self._condition:
+            now = time.monotonic()
+            # A burst of 429s from one overload event should only halve the limit once.
+            if now - self._last_decrease_at < self._decrease_cooldown_seconds:
+                return
+            self._last_decrease_at = now
+            self._limit = max(float(self._minimum), self._limit * self._decrease_factor)
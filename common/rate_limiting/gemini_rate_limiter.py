@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from common.constants import Constants
+from common.rate_limiting.adaptive_concurrency_limit import AdaptiveConcurrencyLimit
+from common.rate_limiting.queue_clock import QueueClock
+from common.rate_limiting.token_bucket import TokenBucket
+
+@dataclass(frozen=True)
+class ModelBudget:
+    requests_per_minute: int
+    tokens_per_minute: int
+    max_concurrency: int
+
+class _Permit:
+
+    def __init__(self, limiter: '_ModelLimiter'):
+        self._limiter = limiter
+
+    def record(self, status_code: int, retry_after_seconds: Optional[float] = None):
+        if status_code == 429 or status_code >= 500:
+            self._limiter.on_overload(retry_after_seconds if status_code == 429 else None)
+        elif status_code < 400:
+            self._limiter.concurrency.on_success()
+
+    def record_timeout(self):
+        self._limiter.on_overload(None)
+
+class _ModelLimiter:
+
+    def __init__(self, budget: ModelBudget):
+        self.requests = TokenBucket.per_minute(budget.requests_per_minute)
+        self.tokens = TokenBucket.per_minute(budget.tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimit(maximum=budget.max_concurrency)
+        self.throttled = 0
+        self.overloads = 0
+
+    def reserve(self, estimated_tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def on_overload(self, retry_after_seconds: Optional[float]):
+        self.overloads += 1
+        self.concurrency.on_overload()
+        if retry_after_seconds:
+            self.requests.block_for(retry_after_seconds)
+
+class GeminiRateLimiter:
+    """ Process-wide requests/tokens per minute budgets and adaptive concurrency for each Gemini model """
+
+    # Gemini free tier limits; paid tiers can raise them through configure().
+    _BUDGETS: Dict[str, ModelBudget] = {Constants.GEMINI_MODEL_LITE: ModelBudget(requests_per_minute=15,
+                                                                                 tokens_per_minute=250_000,
+                                                                                 max_concurrency=8),
+                                        Constants.GEMINI_MODEL_MEDIUM: ModelBudget(requests_per_minute=10,
+                                                                                   tokens_per_minute=250_000,
+                                                                                   max_concurrency=4)}
+    _DEFAULT_BUDGET = ModelBudget(requests_per_minute=60, tokens_per_minute=1_000_000, max_concurrency=8)
+    _ASYNC_POLL_SECONDS = 0.02
+
+    _LOCK = threading.Lock()
+    _LIMITERS: Dict[str, _ModelLimiter] = {}
+
+    @classmethod
+    def configure(cls, model: str, budget: ModelBudget):
+        with cls._LOCK:
+            cls._BUDGETS[model] = budget
+            cls._LIMITERS.pop(model, None)
+
+    @classmethod
+    @contextmanager
+    def acquire(cls, model: str, estimated_tokens: int) -> Iterator[_Permit]:
+        limiter = cls._get_limiter(model)
+        with QueueClock.waiting():
+            wait_seconds = limiter.reserve(estimated_tokens)
+            if wait_seconds:
+                limiter.throttled += 1
+                time.sleep(wait_seconds)
+            limiter.concurrency.acquire()
+        try:
+            yield _Permit(limiter)
+        finally:
+            limiter.concurrency.release()
+
+    @classmethod
+    @asynccontextmanager
+    async def acquire_async(cls, model: str, estimated_tokens: int) -> AsyncIterator[_Permit]:
+        limiter = cls._get_limiter(model)
+        with QueueClock.waiting():
+            wait_seconds = limiter.reserve(estimated_tokens)
+            if wait_seconds:
+                limiter.throttled += 1
+                await asyncio.sleep(wait_seconds)
+            # The limit is shared across threads and event loops, so async callers poll rather than block a loop.
+            while not limiter.concurrency.try_acquire():
+                await asyncio.sleep(cls._ASYNC_POLL_SECONDS)
+        try:
+            yield _Permit(limiter)
+        finally:
+            limiter.concurrency.release()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, float]]:
+        with cls._LOCK:
+            return {model: {"concurrency_limit": limiter.concurrency.limit,
+                            "in_flight": limiter.concurrency.in_flight,
+                            "throttled": limiter.throttled,
+                            "overloads": limiter.overloads}
+                    for model, limiter in cls._LIMITERS.items()}
+
+    @classmethod
+    def _get_limiter(cls, model: str) -> _ModelLimiter:
+        # Callers may use the "models/" prefixed name that the native Gemini API returns.
+        model = model.removeprefix('models/')
+        with cls._LOCK:
+            limiter = cls._LIMITERS.get(model)
+            if limiter is None:
+                limiter = _ModelLimiter(cls._BUDGETS.get(model, cls._DEFAULT_BUDGET))
+                cls._LIMITERS[model] = limiter
+            return limiter
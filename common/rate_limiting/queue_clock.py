@@ -0,0 +1,60 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+class QueueClock:
+    """ Time a call has spent queued in GeminiRateLimiter, so that whoever times the call can tell throttling apart
+        from a slow model. The clock follows the call through the context, into the tasks and transports below it """
+
+    _CURRENT: ContextVar[Optional['QueueClock']] = ContextVar('queue_clock', default=None)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queued_seconds = 0.0
+        self._waiting = 0
+        self._waiting_since = 0.0
+
+    @classmethod
+    @contextmanager
+    def measure(cls) -> Iterator['QueueClock']:
+        clock = QueueClock()
+        token = cls._CURRENT.set(clock)
+        try:
+            yield clock
+        finally:
+            cls._CURRENT.reset(token)
+
+    @classmethod
+    @contextmanager
+    def waiting(cls) -> Iterator[None]:
+        """ Marks the time spent in the block as queued on the current call's clock, if it has one """
+        clock = cls._CURRENT.get()
+        if clock is None:
+            yield
+            return
+        clock._start()
+        try:
+            yield
+        finally:
+            clock._stop()
+
+    def get_queued_seconds(self) -> float:
+        """ Queued so far, including a wait that is still going on """
+        with self._lock:
+            ongoing = time.monotonic() - self._waiting_since if self._waiting else 0.0
+            return self._queued_seconds + ongoing
+
+    def _start(self):
+        with self._lock:
+            # Hedges and SDK retries can queue at the same time; overlapping waits only count once.
+            if self._waiting == 0:
+                self._waiting_since = time.monotonic()
+            self._waiting += 1
+
+    def _stop(self):
+        with self._lock:
+            self._waiting -= 1
+            if self._waiting == 0:
+                self._queued_seconds += time.monotonic() - self._waiting_since
@@ -0,0 +1,84 @@
+import json
+from typing import Optional, Tuple
+
+import httpx
+
+from common.budget.token_estimator import TokenEstimator
+from common.metrics.metrics import Metrics
+from common.rate_limiting.gemini_rate_limiter import GeminiRateLimiter
+
+class _RequestBudget:
+
+    @classmethod
+    def describe(cls, request: httpx.Request) -> Tuple[Optional[str], int]:
+        """ Return the model a chat/completions style request targets and a rough token cost for it """
+        if request.method != 'POST':
+            return None, 0
+        try:
+            body = json.loads(request.content or b'{}')
+        except (httpx.RequestNotRead, ValueError):
+            return None, 0
+        if not isinstance(body, dict) or 'model' not in body:
+            return None, 0
+        completion_tokens = body.get('max_completion_tokens') or body.get('max_tokens') or 0
+        # The whole body, not just the messages, so tool and response schemas are charged as well.
+        prompt_tokens = TokenEstimator.estimate_text(request.content.decode('utf-8', errors='replace'))
+        return body['model'], prompt_tokens + completion_tokens
+
+    @staticmethod
+    def record(permit, model: str, response: httpx.Response):
+        permit.record(response.status_code, _RequestBudget.retry_after(response))
+        # The OpenAI client retries these itself, so this is the only place they are visible.
+        if response.status_code == 429 or response.status_code >= 500:
+            Metrics.increment(Metrics.RETRIES, model=model, reason=f'http_{response.status_code}')
+
+    @staticmethod
+    def retry_after(response: httpx.Response) -> Optional[float]:
+        try:
+            return float(response.headers.get('retry-after', ''))
+        except ValueError:
+            return None
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """ httpx transport that admits model requests through the process-wide GeminiRateLimiter """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model, estimated_tokens = _RequestBudget.describe(request)
+        if model is None:
+            return self._transport.handle_request(request)
+        with GeminiRateLimiter.acquire(model, estimated_tokens) as permit:
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TimeoutException:
+                permit.record_timeout()
+                raise
+            _RequestBudget.record(permit, model, response)
+            return response
+
+    def close(self):
+        self._transport.close()
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """ Async twin of RateLimitedTransport, sharing the same budgets """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model, estimated_tokens = _RequestBudget.describe(request)
+        if model is None:
+            return await self._transport.handle_async_request(request)
+        async with GeminiRateLimiter.acquire_async(model, estimated_tokens) as permit:
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TimeoutException:
+                permit.record_timeout()
+                raise
+            _RequestBudget.record(permit, model, response)
+            return response
+
+    async def aclose(self):
+        await self._transport.aclose()
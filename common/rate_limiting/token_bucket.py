@@ -0,0 +1,40 @@
+import threading
+import time
+
+class TokenBucket:
+    """ Thread-safe token bucket. Reservations may go into debt and return how long the caller should wait """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self._capacity = capacity
+        self._refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount: float) -> 'TokenBucket':
+        return cls(capacity=amount, refill_per_second=amount / 60.0)
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._refill_per_second
+
+    def block_for(self, seconds: float):
+        """ Empty the bucket so that nothing new is admitted for the given number of seconds """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self._refill_per_second)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._refill_per_second)
+        self._updated_at = now
@@ -0,0 +1,44 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+class CallBudgetExceeded(RuntimeError):
+    pass
+
+class CallBudget:
+    """ A cap on the model calls made for one unit of work, e.g. one chat message. Every attempt ModelFailover makes
+        is counted, failovers and re-prompts included, across all the tasks started inside the block """
+
+    _CURRENT: ContextVar[Optional['CallBudget']] = ContextVar('call_budget', default=None)
+
+    def __init__(self, max_calls: int):
+        self._lock = threading.Lock()
+        self._max_calls = max_calls
+        self._spent = 0
+
+    @classmethod
+    @contextmanager
+    def limit(cls, max_calls: int) -> Iterator['CallBudget']:
+        budget = CallBudget(max_calls)
+        token = cls._CURRENT.set(budget)
+        try:
+            yield budget
+        finally:
+            cls._CURRENT.reset(token)
+
+    @classmethod
+    def try_spend(cls) -> bool:
+        """ Count one call against the current budget; False, without counting it, once the budget is spent """
+        budget = cls._CURRENT.get()
+        if budget is None:
+            return True
+        with budget._lock:
+            if budget._spent >= budget._max_calls:
+                return False
+            budget._spent += 1
+            return True
+
+    def get_remaining(self) -> int:
+        with self._lock:
+            return self._max_calls - self._spent
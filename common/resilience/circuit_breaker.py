@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable, List
+
+from common.models.latency_window import LatencyWindow
+
+class CircuitState(str, Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    """ Trips open when the rolling error rate or p95 latency breaches its SLO, and probes half-open to recover """
+
+    def __init__(self,
+                 name: str,
+                 max_error_rate: float = 0.5,
+                 max_p95_latency_seconds: float = 20.0,
+                 window_size: int = 20,
+                 min_calls: int = 5,
+                 open_seconds: float = 30.0):
+        self._name = name
+        self._max_error_rate = max_error_rate
+        self._max_p95_latency_seconds = max_p95_latency_seconds
+        self._window_size = window_size
+        self._min_calls = min_calls
+        self._open_seconds = open_seconds
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._errors = deque(maxlen=window_size)
+        self._latencies = LatencyWindow(window_size)
+        self._listeners: List[Callable[[str, CircuitState, CircuitState], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._state
+
+    def add_listener(self, listener: Callable[[str, CircuitState, CircuitState], None]):
+        self._listeners.append(listener)
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self._open_seconds:
+                self._transition(CircuitState.HALF_OPEN)
+            if self._state == CircuitState.CLOSED:
+                return True
+            # Half-open lets exactly one probe through; everyone else keeps using the alternative.
+            if self._state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """ For an admitted call that ended without an outcome, e.g. cancelled: a half-open breaker would otherwise
+            wait forever for its probe's result and never admit another request """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self, latency_seconds: float):
+        self._record(False, latency_seconds)
+
+    def record_failure(self, latency_seconds: float):
+        self._record(True, latency_seconds)
+
+    def _record(self, failed: bool, latency_seconds: float):
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(CircuitState.OPEN if failed else CircuitState.CLOSED)
+                return
+            self._errors.append(failed)
+            self._latencies.record(latency_seconds)
+            if self._state == CircuitState.CLOSED and self._is_slo_breached():
+                self._transition(CircuitState.OPEN)
+
+    def _is_slo_breached(self) -> bool:
+        if len(self._errors) < self._min_calls:
+            return False
+        error_rate = sum(self._errors) / len(self._errors)
+        return (error_rate > self._max_error_rate
+                or self._latencies.percentile(0.95) > self._max_p95_latency_seconds)
+
+    def _transition(self, state: CircuitState):
+        previous, self._state = self._state, state
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+        if state == CircuitState.CLOSED:
+            # Start the SLO window afresh so old failures don't immediately trip it again.
+            self._errors.clear()
+            self._latencies = LatencyWindow(self._window_size)
+        print(f"Circuit breaker {self._name}: {previous.value} -> {state.value}", flush=True)
+        for listener in self._listeners:
+            listener(self._name, previous, state)
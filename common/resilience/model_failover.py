@@ -0,0 +1,149 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from common.constants import Constants
+from common.metrics.metrics import Metrics
+from common.rate_limiting.queue_clock import QueueClock
+from common.resilience.call_budget import CallBudget, CallBudgetExceeded
+from common.resilience.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+T = TypeVar('T')
+
+class ModelFailover:
+    """ Routes each call to the first Gemini model whose circuit breaker admits it, falling back on failure """
+
+    ATTEMPT_TIMEOUT_SECONDS = 30.0
+
+    # Set by attempt_timeout() for calls made through layers that can't pass a timeout, such as the agents SDK.
+    _ATTEMPT_TIMEOUT: ContextVar[Optional[float]] = ContextVar('attempt_timeout', default=None)
+    _MODELS = [Constants.GEMINI_MODEL_LITE, Constants.GEMINI_MODEL_MEDIUM]
+    _BREAKERS: Dict[str, CircuitBreaker] = {model: CircuitBreaker(model) for model in _MODELS}
+
+    @classmethod
+    def get_breaker(cls, model: str) -> CircuitBreaker:
+        return cls._BREAKERS[model]
+
+    @classmethod
+    def select(cls, models: Optional[List[str]] = None) -> str:
+        """ Pick a model without taking part in probing; used for calls whose outcome isn't reported back """
+        models = models or cls._MODELS
+        for model in models:
+            if cls._BREAKERS[model].state != CircuitState.OPEN:
+                return model
+        return models[0]
+
+    @classmethod
+    @contextmanager
+    def attempt_timeout(cls, seconds: float) -> Iterator[None]:
+        """ Per-attempt timeout for the async calls made inside the block, e.g. around a long running agent """
+        token = cls._ATTEMPT_TIMEOUT.set(seconds)
+        try:
+            yield
+        finally:
+            cls._ATTEMPT_TIMEOUT.reset(token)
+
+    @classmethod
+    def call(cls, fn: Callable[[str], T], models: Optional[List[str]] = None) -> T:
+        """ fn receives the model name and should bound its own latency, e.g. via the client's timeout argument """
+        last_error = None
+        for model in models or cls._MODELS:
+            breaker = cls._BREAKERS[model]
+            if not breaker.allow_request():
+                continue
+            cls._spend_call(breaker)
+            started = time.monotonic()
+            with QueueClock.measure() as clock:
+                try:
+                    result = fn(model)
+                except Exception as e:
+                    if not cls._is_model_fault(e):
+                        cls._record_attempt(breaker, model, started, clock, 'client_error')
+                        raise
+                    cls._record_attempt(breaker, model, started, clock, 'error')
+                    last_error = e
+                    continue
+                except BaseException:
+                    # Cancelled or interrupted: there is no outcome to record, but the probe slot must be given back.
+                    breaker.release_probe()
+                    raise
+            cls._record_attempt(breaker, model, started, clock, 'ok')
+            Metrics.record_llm_result(model, result)
+            return result
+        raise last_error or CircuitOpenError("All Gemini models are currently unavailable")
+
+    @classmethod
+    async def call_async(cls, fn: Callable[[str], Awaitable[T]], models: Optional[List[str]] = None,
+                         timeout: Optional[float] = None) -> T:
+        """ Each attempt is cut off after timeout seconds, not counting time queued in the rate limiter. Without one,
+            the attempt_timeout() in effect applies, or ATTEMPT_TIMEOUT_SECONDS """
+        timeout = timeout or cls._ATTEMPT_TIMEOUT.get() or cls.ATTEMPT_TIMEOUT_SECONDS
+        last_error = None
+        for model in models or cls._MODELS:
+            breaker = cls._BREAKERS[model]
+            if not breaker.allow_request():
+                continue
+            cls._spend_call(breaker)
+            started = time.monotonic()
+            with QueueClock.measure() as clock:
+                try:
+                    result = await cls._wait_for(fn(model), timeout, clock)
+                except Exception as e:
+                    if not cls._is_model_fault(e):
+                        cls._record_attempt(breaker, model, started, clock, 'client_error')
+                        raise
+                    cls._record_attempt(breaker, model, started, clock, 'error')
+                    last_error = e
+                    continue
+                except BaseException:
+                    # Cancelled or interrupted: there is no outcome to record, but the probe slot must be given back.
+                    breaker.release_probe()
+                    raise
+            cls._record_attempt(breaker, model, started, clock, 'ok')
+            Metrics.record_llm_result(model, result)
+            return result
+        raise last_error or CircuitOpenError("All Gemini models are currently unavailable")
+
+    @staticmethod
+    def _spend_call(breaker: CircuitBreaker):
+        if not CallBudget.try_spend():
+            # Admitted but never made, so a half-open breaker's probe slot goes back unused.
+            breaker.release_probe()
+            raise CallBudgetExceeded("The model call budget for this work is spent")
+
+    @staticmethod
+    async def _wait_for(call: Awaitable[T], timeout: float, clock: QueueClock) -> T:
+        """ asyncio.wait_for, except that the deadline moves back by however long the call waits for the rate
+            limiter: being throttled to the budget isn't the model being slow """
+        # Created inside the clock's context, so the transport below reports its queueing to this clock.
+        task = asyncio.ensure_future(call)
+        started = time.monotonic()
+        try:
+            while True:
+                remaining = started + timeout + clock.get_queued_seconds() - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"Model call took longer than {timeout:g}s")
+                done, _ = await asyncio.wait({task}, timeout=remaining)
+                if done:
+                    return task.result()
+        finally:
+            task.cancel()
+
+    @staticmethod
+    def _record_attempt(breaker: CircuitBreaker, model: str, started: float, clock: QueueClock, outcome: str):
+        # The breaker judges the model, so time spent queued for the rate limiter is left out of its latency.
+        latency = max(0.0, time.monotonic() - started - clock.get_queued_seconds())
+        if outcome == 'error':
+            breaker.record_failure(latency)
+            Metrics.increment(Metrics.RETRIES, model=model, reason='failover')
+        else:
+            breaker.record_success(latency)
+        Metrics.observe(Metrics.LLM_REQUEST_SECONDS, latency, model=model, outcome=outcome)
+
+    @staticmethod
+    def _is_model_fault(error: Exception) -> bool:
+        # Client errors (bad request, auth) would fail the same way on any model, so they don't count against it.
+        status_code = getattr(error, 'status_code', None)
+        return not (status_code and 400 <= status_code < 500 and status_code not in (408, 429))
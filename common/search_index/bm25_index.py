@@ -0,0 +1,181 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from common.constants import Constants
+
+@dataclass
+class SearchHit:
+    link: str
+    title: str
+    snippet: str
+    score: float
+    # Fraction of the distinct query terms the document contains.
+    coverage: float
+
+class Bm25Index:
+    """ On-disk inverted index of search results (title, snippet and link, plus any text a caller adds), scored with
+        BM25 and updated incrementally as results come in """
+
+    K1 = 1.2
+    B = 0.75
+    # Title terms are counted twice, a cheap stand-in for field weighting.
+    _TITLE_WEIGHT = 2
+    _DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'agentic-ai', 'search_index.sqlite')
+    _STOPWORDS = frozenset(("a about after all also an and any are as at be been but by can could did do does for "
+                            "from had has have how i if in into is it its more most not of on or other our out so "
+                            "than that the their them then there these they this to up was we were what when where "
+                            "which who why will with would you your").split())
+    _WORD = re.compile(r"[a-z0-9][a-z0-9&+'.-]*")
+    # SQLite limits the number of parameters in one statement.
+    _MAX_PARAMETERS = 500
+
+    _DEFAULT: Optional['Bm25Index'] = None
+    _DEFAULT_LOCK = threading.Lock()
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection = self._connect(path)
+
+    @classmethod
+    def get_default(cls) -> 'Bm25Index':
+        """ Process-wide index of every search result fetched, stored at SEARCH_INDEX_PATH if set """
+        with cls._DEFAULT_LOCK:
+            if cls._DEFAULT is None:
+                cls._DEFAULT = Bm25Index(os.getenv(Constants.SEARCH_INDEX_PATH) or cls._DEFAULT_PATH)
+            return cls._DEFAULT
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        words = (word.strip(".'-") for word in cls._WORD.findall(text.lower()))
+        return [word for word in words if word and word not in cls._STOPWORDS]
+
+    def add(self, link: str, title: str = '', snippet: str = '', text: str = ''):
+        """ Add or update a document; fields left empty keep what was indexed for the link before """
+        with self._lock:
+            row = self._connection.execute("SELECT id, title, snippet, text, length FROM documents WHERE link = ?",
+                                           (link,)).fetchone()
+            if row:
+                title, snippet, text = title or row[1], snippet or row[2], text or row[3]
+            terms = Counter(self.tokenize(title) * self._TITLE_WEIGHT + self.tokenize(snippet) + self.tokenize(text))
+            length = sum(terms.values())
+            if row:
+                document_id = row[0]
+                self._connection.execute("DELETE FROM postings WHERE document_id = ?", (document_id,))
+                self._connection.execute("UPDATE documents SET title = ?, snippet = ?, text = ?, length = ?, "
+                                         "updated_at = ? WHERE id = ?",
+                                         (title, snippet, text, length, time.time(), document_id))
+                self._update_totals(0, length - row[4])
+            else:
+                document_id = self._connection.execute("INSERT INTO documents (link, title, snippet, text, length, "
+                                                       "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                                       (link, title, snippet, text, length, time.time())).lastrowid
+                self._update_totals(1, length)
+            self._connection.executemany("INSERT INTO postings (term, document_id, frequency) VALUES (?, ?, ?)",
+                                         [(term, document_id, frequency) for term, frequency in terms.items()])
+            self._connection.commit()
+
+    def add_serper_results(self, results: Dict[str, Any]):
+        """ Index the organic, news and knowledge graph entries of a raw Serper response """
+        # Best effort: a search that succeeded shouldn't fail because its results couldn't be indexed.
+        try:
+            for item in results.get('organic', []) + results.get('news', []):
+                if item.get('link'):
+                    self.add(item['link'], item.get('title', ''), item.get('snippet', ''))
+            knowledge_graph = results.get('knowledgeGraph') or {}
+            link = knowledge_graph.get('descriptionLink') or knowledge_graph.get('website')
+            if link:
+                self.add(link, knowledge_graph.get('title', ''), knowledge_graph.get('description', ''))
+        except (sqlite3.Error, AttributeError, TypeError) as e:
+            print(f"Search index: could not index results: {e}")
+
+    def search(self, query: str, limit: int = 10, max_age_seconds: Optional[float] = None) -> List[SearchHit]:
+        """ Best matches for the query; with max_age_seconds, only documents indexed or updated that recently """
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            document_count, total_length = self._get_totals()
+            if not document_count:
+                return []
+            average_length = total_length / document_count or 1.0
+            postings = {term: self._connection.execute("SELECT document_id, frequency FROM postings WHERE term = ?",
+                                                       (term,)).fetchall()
+                        for term in terms}
+            updated_since = time.time() - max_age_seconds if max_age_seconds is not None else None
+            lengths = self._get_lengths({document_id for rows in postings.values() for document_id, _ in rows},
+                                        updated_since)
+
+            scores: Dict[int, float] = defaultdict(float)
+            matched: Dict[int, int] = defaultdict(int)
+            for rows in postings.values():
+                idf = math.log(1 + (document_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for document_id, frequency in rows:
+                    # Too old to be returned, though still part of the collection statistics.
+                    if document_id not in lengths:
+                        continue
+                    normalization = self.K1 * (1 - self.B + self.B * lengths[document_id] / average_length)
+                    scores[document_id] += idf * frequency * (self.K1 + 1) / (frequency + normalization)
+                    matched[document_id] += 1
+
+            best = sorted(scores, key=lambda document_id: (-scores[document_id], document_id))[:limit]
+            hits = []
+            for document_id in best:
+                link, title, snippet = self._connection.execute("SELECT link, title, snippet FROM documents "
+                                                                "WHERE id = ?", (document_id,)).fetchone()
+                hits.append(SearchHit(link, title, snippet, scores[document_id], matched[document_id] / len(terms)))
+            return hits
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            document_count, total_length = self._get_totals()
+            terms = self._connection.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+            return {"documents": document_count, "terms": terms, "tokens": total_length}
+
+    def _get_lengths(self, document_ids: set, updated_since: Optional[float] = None) -> Dict[int, int]:
+        ids = list(document_ids)
+        lengths = {}
+        for start in range(0, len(ids), self._MAX_PARAMETERS):
+            chunk = ids[start:start + self._MAX_PARAMETERS]
+            query = f"SELECT id, length FROM documents WHERE id IN ({', '.join('?' * len(chunk))})"
+            if updated_since is not None:
+                query += " AND updated_at >= ?"
+                chunk = chunk + [updated_since]
+            lengths.update(self._connection.execute(query, chunk).fetchall())
+        return lengths
+
+    def _get_totals(self) -> Tuple[int, int]:
+        return self._connection.execute("SELECT document_count, total_length FROM totals").fetchone()
+
+    def _update_totals(self, documents: int, length: int):
+        self._connection.execute("UPDATE totals SET document_count = document_count + ?, "
+                                 "total_length = total_length + ?", (documents, length))
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS documents ("
+                           "id INTEGER PRIMARY KEY, link TEXT NOT NULL UNIQUE, title TEXT NOT NULL, "
+                           "snippet TEXT NOT NULL, text TEXT NOT NULL, length INTEGER NOT NULL, updated_at REAL NOT NULL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS postings ("
+                           "term TEXT NOT NULL, document_id INTEGER NOT NULL, frequency INTEGER NOT NULL, "
+                           "PRIMARY KEY (term, document_id)) WITHOUT ROWID")
+        connection.execute("CREATE INDEX IF NOT EXISTS postings_document ON postings (document_id)")
+        # Kept alongside the index so BM25's collection statistics don't need a full scan per query.
+        connection.execute("CREATE TABLE IF NOT EXISTS totals (document_count INTEGER NOT NULL, "
+                           "total_length INTEGER NOT NULL)")
+        if connection.execute("SELECT COUNT(*) FROM totals").fetchone()[0] == 0:
+            connection.execute("INSERT INTO totals VALUES (0, 0)")
+        connection.commit()
+        return connection
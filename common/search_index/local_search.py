@@ -0,0 +1,67 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from common.constants import Constants
+from common.metrics.metrics import Metrics
+from common.search_index.bm25_index import Bm25Index, SearchHit
+from common.tools.search_cache import SearchCache
+from common.tools.serper import Serper
+
+class LocalSearch:
+    """ Serper compatible search that answers from the local index of past results when it holds enough recent ones
+        on the query, and goes to Serper when local recall is weak or the query is about what is happening now. With
+        SEARCH_OFFLINE set it never leaves the index """
+
+    # Local results are good enough when at least this many documents contain most of the query's terms.
+    MIN_RESULTS = 3
+    MIN_COVERAGE = 0.75
+    # Older results are only used offline; Serper and its cache answer instead.
+    MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+    _RESULTS = 8
+    _NO_RESULTS = "No good search result was found in the local index"
+
+    @classmethod
+    def run(cls, query: str) -> str:
+        """ Drop-in for Serper.run """
+        hits = cls.get_local_answer(query)
+        return cls.format(hits) if hits is not None else Serper.run(query)
+
+    @classmethod
+    def get_local_answer(cls, query: str, limit: int = _RESULTS) -> Optional[List[SearchHit]]:
+        """ Local hits good enough to answer the query with, or None when it should go to Serper """
+        if cls.is_offline():
+            return cls.search(query, limit)
+        if SearchCache.is_time_sensitive(query):
+            # Past results can't say what is happening now; Serper's cache keeps these for an hour only.
+            Metrics.increment(Metrics.CACHE_MISSES, cache='search_index')
+            return None
+        hits = cls.search(query, limit, cls.MAX_AGE_SECONDS)
+        return hits if cls.has_good_recall(hits) else None
+
+    @classmethod
+    def search(cls, query: str, limit: int = _RESULTS, max_age_seconds: Optional[float] = None) -> List[SearchHit]:
+        hits = Bm25Index.get_default().search(query, limit, max_age_seconds)
+        Metrics.increment(Metrics.CACHE_HITS if cls.has_good_recall(hits) else Metrics.CACHE_MISSES,
+                          cache='search_index')
+        return hits
+
+    @classmethod
+    def has_good_recall(cls, hits: List[SearchHit]) -> bool:
+        return sum(1 for hit in hits if hit.coverage >= cls.MIN_COVERAGE) >= cls.MIN_RESULTS
+
+    @staticmethod
+    def is_offline() -> bool:
+        return os.getenv(Constants.SEARCH_OFFLINE, '').lower() in ('1', 'true', 'yes')
+
+    @classmethod
+    def format(cls, hits: List[SearchHit]) -> str:
+        if not hits:
+            return cls._NO_RESULTS
+        return '\n'.join(f"{hit.title}: {hit.snippet} ({hit.link})" for hit in hits)
+
+    @staticmethod
+    def to_serper_results(query: str, hits: List[SearchHit]) -> Dict[str, Any]:
+        """ The hits in the shape of a Serper response, for callers that expect one """
+        return {"searchParameters": {"q": query, "engine": "local_index"},
+                "organic": [{"title": hit.title, "link": hit.link, "snippet": hit.snippet, "position": position}
+                            for position, hit in enumerate(hits, start=1)]}
@@ -0,0 +1,29 @@
+import json
+from typing import Any
+
+from common.search_index.bm25_index import Bm25Index
+from common.tools.recorded_serper_dev_tool import RecordedSerperDevTool
+from common.tools.search_cache import SearchCache
+
+class CachedSerperDevTool(RecordedSerperDevTool):
+    """ Drop-in SerperDevTool whose searches are answered from the shared search cache when possible """
+
+    _OPTIONS = ('search_type', 'n_results', 'country', 'location', 'locale')
+
+    def _run(self, **kwargs: Any) -> Any:
+        query = kwargs.get('search_query') or kwargs.get('query')
+        run = super()._run
+        if not query:
+            return run(**kwargs)
+        # Results depend on how the tool is configured as well as on the query.
+        options = {name: getattr(self, name, None) for name in self._OPTIONS}
+        options.update({name: value for name, value in kwargs.items() if name not in ('search_query', 'query')})
+        variant = 'serper_dev:' + json.dumps(options, sort_keys=True, default=str)
+
+        def fetch() -> Any:
+            results = run(**kwargs)
+            if isinstance(results, dict):
+                Bm25Index.get_default().add_serper_results(results)
+            return results
+
+        return SearchCache.get_default().get_or_fetch(query, fetch, variant)
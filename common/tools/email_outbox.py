@@ -0,0 +1,199 @@
+import atexit
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from common.metrics.metrics import Metrics
+
+class EmailOutbox:
+    """ Durable outbox for outgoing mail. enqueue() returns once the message is committed to a SQLite spool, and a
+        background worker delivers it with bounded concurrency, retrying with backoff across restarts """
+
+    DEFAULT_MAX_CONCURRENCY = 4
+    DEFAULT_FLUSH_TIMEOUT_SECONDS = 30.0
+    _MAX_ATTEMPTS = 8
+    _BASE_BACKOFF_SECONDS = 2.0
+    _MAX_BACKOFF_SECONDS = 15 * 60.0
+    _SENT_RETENTION_SECONDS = 7 * 24 * 60 * 60
+    _POLL_SECONDS = 5.0
+    # Several processes can share one spool, so a claimed row is only taken back once its claim is this old and
+    # the process holding it is presumed dead; far longer than any single SendGrid request takes.
+    _CLAIM_LEASE_SECONDS = 10 * 60.0
+
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    def __init__(self, path: str, deliver: Callable[[Dict[str, Any]], int],
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self._path = path
+        self._deliver = deliver
+        self._max_concurrency = max_concurrency
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._worker: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connection = self._connect(path)
+        with self._condition:
+            self._recover_expired_claims(time.time())
+            self._connection.commit()
+
+    def enqueue(self, mail: Dict[str, Any]) -> int:
+        """ Durably queue a mail request body for delivery and return its outbox id """
+        now = time.time()
+        with self._condition:
+            cursor = self._connection.execute("INSERT INTO messages (payload, status, attempts, created_at, "
+                                              "next_attempt_at) VALUES (?, ?, 0, ?, ?)",
+                                              (json.dumps(mail), self.QUEUED, now, now))
+            self._connection.commit()
+            self._ensure_worker()
+            self._condition.notify_all()
+            self._set_depth_gauge()
+            return cursor.lastrowid
+
+    def flush(self, timeout: Optional[float] = DEFAULT_FLUSH_TIMEOUT_SECONDS) -> bool:
+        """ Wait until nothing is due for delivery; False if messages were still waiting at the timeout """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._in_flight or self._get_due(time.time(), limit=1):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    print(f"Email outbox: {self.stats()[self.QUEUED]} emails still queued, they will be sent on the "
+                          f"next start")
+                    return False
+                self._condition.wait(remaining if remaining is not None else self._POLL_SECONDS)
+        return True
+
+    def start(self):
+        """ Deliver anything already in the spool, e.g. left over from a previous run """
+        with self._condition:
+            if self._connection.execute("SELECT 1 FROM messages WHERE status = ? LIMIT 1", (self.QUEUED,)).fetchone():
+                self._ensure_worker()
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            counts = dict(self._connection.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall())
+            return {status: counts.get(status, 0) for status in (self.QUEUED, self.SENDING, self.SENT, self.FAILED)}
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='email-outbox')
+            self._worker = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+            self._worker.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.time()
+                self._recover_expired_claims(now)
+                free_slots = self._max_concurrency - self._in_flight
+                due = self._claim(self._get_due(now, free_slots), now) if free_slots > 0 else []
+                self._connection.commit()
+                if not due:
+                    # Woken by new mail or a finished delivery, otherwise by the next retry coming due.
+                    self._condition.wait(self._get_seconds_until_next_attempt(now))
+                    continue
+                self._in_flight += len(due)
+            for message in due:
+                self._executor.submit(self._send, *message)
+
+    def _send(self, message_id: int, payload: str, attempts: int, created_at: float):
+        mail = json.loads(payload)
+        recipients = sum(len(personalization.get('to', [])) for personalization in mail.get('personalizations', []))
+        status_code, error = None, None
+        try:
+            status_code = self._deliver(mail)
+        except Exception as e:
+            error = str(e)
+        now = time.time()
+        with self._condition:
+            if status_code is not None and status_code < 400:
+                self._connection.execute("UPDATE messages SET status = ?, attempts = ?, sent_at = ?, last_error = NULL "
+                                         "WHERE id = ?", (self.SENT, attempts + 1, now, message_id))
+                Metrics.increment(Metrics.NOTIFICATIONS, recipients, channel='email', outcome='delivered')
+                Metrics.observe(Metrics.NOTIFICATION_DELIVERY_SECONDS, now - created_at, channel='email')
+            else:
+                error = error or f"status {status_code}"
+                # Client errors other than rate limiting won't succeed on a retry.
+                retryable = status_code is None or status_code == 429 or status_code >= 500
+                if retryable and attempts + 1 < self._MAX_ATTEMPTS:
+                    self._connection.execute("UPDATE messages SET status = ?, attempts = ?, next_attempt_at = ?, "
+                                             "last_error = ? WHERE id = ?",
+                                             (self.QUEUED, attempts + 1, now + self._get_backoff(attempts), error,
+                                              message_id))
+                    Metrics.increment(Metrics.RETRIES, reason='email_outbox')
+                else:
+                    self._connection.execute("UPDATE messages SET status = ?, attempts = ?, last_error = ? "
+                                             "WHERE id = ?", (self.FAILED, attempts + 1, error, message_id))
+                    Metrics.increment(Metrics.NOTIFICATIONS, recipients, channel='email', outcome='failed')
+                    print(f"Email outbox: giving up on email {message_id} after {attempts + 1} attempts: {error}")
+            self._connection.execute("DELETE FROM messages WHERE status = ? AND sent_at < ?",
+                                     (self.SENT, now - self._SENT_RETENTION_SECONDS))
+            self._connection.commit()
+            self._in_flight -= 1
+            self._set_depth_gauge()
+            self._condition.notify_all()
+
+    def _claim(self, due: List[Tuple[int, str, int, float]], now: float) -> List[Tuple[int, str, int, float]]:
+        """ The due rows this process won; another process sharing the spool may have claimed some of them first """
+        claimed = []
+        for message in due:
+            cursor = self._connection.execute("UPDATE messages SET status = ?, claimed_at = ? WHERE id = ? "
+                                              "AND status = ?", (self.SENDING, now, message[0], self.QUEUED))
+            if cursor.rowcount == 1:
+                claimed.append(message)
+        return claimed
+
+    def _recover_expired_claims(self, now: float):
+        # Left mid-delivery by a process that died, so delivered again; SendGrid sends are not idempotent, but a
+        # rare duplicate beats a lost email. Rows claimed before claims were timed have no claimed_at.
+        self._connection.execute("UPDATE messages SET status = ? WHERE status = ? "
+                                 "AND (claimed_at IS NULL OR claimed_at < ?)",
+                                 (self.QUEUED, self.SENDING, now - self._CLAIM_LEASE_SECONDS))
+
+    def _get_due(self, now: float, limit: int) -> List[Tuple[int, str, int, float]]:
+        return self._connection.execute("SELECT id, payload, attempts, created_at FROM messages WHERE status = ? "
+                                        "AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+                                        (self.QUEUED, now, limit)).fetchall()
+
+    def _get_seconds_until_next_attempt(self, now: float) -> float:
+        row = self._connection.execute("SELECT MIN(next_attempt_at) FROM messages WHERE status = ?",
+                                       (self.QUEUED,)).fetchone()
+        if row[0] is None:
+            return self._POLL_SECONDS
+        return min(self._POLL_SECONDS, max(0.0, row[0] - now))
+
+    def _get_backoff(self, attempts: int) -> float:
+        return random.uniform(0.5, 1.0) * min(self._MAX_BACKOFF_SECONDS, self._BASE_BACKOFF_SECONDS * 2 ** attempts)
+
+    def _set_depth_gauge(self):
+        depth = self._connection.execute("SELECT COUNT(*) FROM messages WHERE status IN (?, ?)",
+                                         (self.QUEUED, self.SENDING)).fetchone()[0]
+        Metrics.set_gauge(Metrics.NOTIFICATION_QUEUE_DEPTH, depth, channel='email')
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Every commit reaches the disk before enqueue() returns, so a queued email survives a crash.
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.execute("CREATE TABLE IF NOT EXISTS messages ("
+                           "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                           "attempts INTEGER NOT NULL, created_at REAL NOT NULL, next_attempt_at REAL NOT NULL, "
+                           "sent_at REAL, last_error TEXT, claimed_at REAL)")
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(messages)").fetchall()]
+        if 'claimed_at' not in columns:
+            connection.execute("ALTER TABLE messages ADD COLUMN claimed_at REAL")
+        connection.execute("CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt_at)")
+        connection.commit()
+        return connection
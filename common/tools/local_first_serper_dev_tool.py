@@ -0,0 +1,16 @@
+from typing import Any
+
+from common.search_index.local_search import LocalSearch
+from common.tools.cached_serper_dev_tool import CachedSerperDevTool
+
+class LocalFirstSerperDevTool(CachedSerperDevTool):
+    """ Drop-in SerperDevTool that answers from the local index of past results when it holds enough recent ones on
+        the query """
+
+    def _run(self, **kwargs: Any) -> Any:
+        query = kwargs.get('search_query') or kwargs.get('query')
+        if query:
+            hits = LocalSearch.get_local_answer(query, getattr(self, 'n_results', None) or 10)
+            if hits is not None:
+                return LocalSearch.to_serper_results(query, hits)
+        return super()._run(**kwargs)
@@ -0,0 +1,260 @@
+import html
+import re
+from typing import Dict, List, Optional, Tuple
+
+class MarkdownRenderer:
+    """ Deterministic Markdown to HTML email renderer. Styles come from a template of per-tag inline CSS, since many
+        mail clients strip <style> blocks, and the same input always renders to the same HTML """
+
+    DEFAULT_TEMPLATE = 'default'
+    TEMPLATES: Dict[str, Dict[str, str]] = {
+        'default': {
+            'body': "margin:0;padding:24px;background:#f4f5f7;",
+            'container': ("max-width:680px;margin:0 auto;padding:32px;background:#ffffff;border-radius:8px;"
+                          "font-family:-apple-system,'Segoe UI',Helvetica,Arial,sans-serif;font-size:15px;"
+                          "line-height:1.6;color:#222222;"),
+            'h1': "font-size:26px;line-height:1.3;margin:0 0 16px;color:#111111;",
+            'h2': "font-size:21px;line-height:1.3;margin:28px 0 12px;color:#111111;border-bottom:1px solid #e5e7eb;"
+                  "padding-bottom:6px;",
+            'h3': "font-size:18px;margin:24px 0 8px;color:#111111;",
+            'h4': "font-size:16px;margin:20px 0 8px;color:#111111;",
+            'h5': "font-size:15px;margin:16px 0 8px;color:#111111;",
+            'h6': "font-size:14px;margin:16px 0 8px;color:#555555;",
+            'p': "margin:0 0 14px;",
+            'ul': "margin:0 0 14px;padding-left:24px;",
+            'ol': "margin:0 0 14px;padding-left:24px;",
+            'li': "margin:0 0 6px;",
+            'blockquote': "margin:0 0 14px;padding:8px 16px;border-left:4px solid #d1d5db;color:#555555;",
+            'pre': "margin:0 0 14px;padding:12px;background:#f6f8fa;border-radius:6px;overflow-x:auto;"
+                   "font-size:13px;line-height:1.45;",
+            'code': "font-family:SFMono-Regular,Consolas,Menlo,monospace;background:#f6f8fa;padding:1px 4px;"
+                    "border-radius:4px;font-size:13px;",
+            'table': "border-collapse:collapse;width:100%;margin:0 0 14px;font-size:14px;",
+            'th': "border:1px solid #d1d5db;padding:6px 10px;background:#f3f4f6;text-align:left;",
+            'td': "border:1px solid #d1d5db;padding:6px 10px;",
+            'a': "color:#1a73e8;text-decoration:underline;",
+            'hr': "border:0;border-top:1px solid #e5e7eb;margin:24px 0;",
+            'img': "max-width:100%;height:auto;",
+        },
+        'plain': {
+            'container': "font-family:Arial,sans-serif;font-size:14px;line-height:1.5;color:#000000;",
+            'table': "border-collapse:collapse;",
+            'th': "border:1px solid #999999;padding:4px 8px;text-align:left;",
+            'td': "border:1px solid #999999;padding:4px 8px;",
+        },
+    }
+
+    _PAGE = ('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+             '<meta name="viewport" content="width=device-width, initial-scale=1">\n<title>{title}</title>\n'
+             '</head>\n<body{body_style}>\n<div{container_style}>\n{content}\n</div>\n</body>\n</html>\n')
+
+    _FENCE = re.compile(r'^\s*(```|~~~)')
+    _HEADING = re.compile(r'^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$')
+    _RULE = re.compile(r'^\s{0,3}([-*_])(\s*\1){2,}\s*$')
+    _QUOTE = re.compile(r'^\s{0,3}>\s?(.*)$')
+    _LIST_ITEM = re.compile(r'^(\s*)([-*+]|\d{1,9}[.)])\s+(.*)$')
+    _TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+
+    _CODE_SPAN = re.compile(r'(`+)(.+?)\1')
+    _IMAGE = re.compile(r'!\[([^\]]*)\]\(([^()\s]+(?:\([^()\s]*\)[^()\s]*)*)(?:\s+&quot;(.*?)&quot;)?\)')
+    _LINK = re.compile(r'\[([^\]]+)\]\(([^()\s]+(?:\([^()\s]*\)[^()\s]*)*)(?:\s+&quot;(.*?)&quot;)?\)')
+    _AUTOLINK = re.compile(r'&lt;((?:https?|mailto):[^\s&]+)&gt;')
+    _BOLD = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+    _ITALIC = re.compile(r'(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?!\*)|(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?!\w)')
+    _STRIKE = re.compile(r'~~(?=\S)(.+?)(?<=\S)~~')
+    _HARD_BREAK = re.compile(r'( {2,}|\\)$', re.MULTILINE)
+    _PLACEHOLDER = '\x00{}\x00'
+    _UNSAFE_SCHEMES = ('javascript:', 'vbscript:', 'data:')
+
+    def __init__(self, template: str = DEFAULT_TEMPLATE):
+        if template not in self.TEMPLATES:
+            raise ValueError(f"Unknown template {template!r}, expected one of {sorted(self.TEMPLATES)}")
+        self._styles = self.TEMPLATES[template]
+
+    def render(self, markdown: str) -> str:
+        """ HTML fragment for the markdown, with inline styles from the template """
+        return '\n'.join(self._render_blocks(markdown.replace('\r\n', '\n').replace('\r', '\n').split('\n')))
+
+    def render_email(self, markdown: str, title: Optional[str] = None) -> str:
+        """ Complete HTML email document for the markdown """
+        return self._PAGE.format(title=html.escape(title or ''),
+                                 body_style=self._get_style_attribute('body'),
+                                 container_style=self._get_style_attribute('container'),
+                                 content=self.render(markdown))
+
+    def _render_blocks(self, lines: List[str]) -> List[str]:
+        blocks = []
+        index = 0
+        while index < len(lines):
+            line = lines[index]
+            if not line.strip():
+                index += 1
+            elif self._FENCE.match(line):
+                index = self._render_code_block(lines, index, blocks)
+            elif self._HEADING.match(line):
+                level, text = self._HEADING.match(line).groups()
+                tag = f'h{len(level)}'
+                blocks.append(f'{self._open(tag)}{self._render_inline(text)}</{tag}>')
+                index += 1
+            elif self._RULE.match(line):
+                blocks.append(self._open('hr'))
+                index += 1
+            elif self._QUOTE.match(line):
+                quoted = []
+                while index < len(lines) and lines[index].strip() and self._QUOTE.match(lines[index]):
+                    quoted.append(self._QUOTE.match(lines[index]).group(1))
+                    index += 1
+                blocks.append(f"{self._open('blockquote')}\n{chr(10).join(self._render_blocks(quoted))}\n</blockquote>")
+            elif self._LIST_ITEM.match(line):
+                index = self._render_list(lines, index, blocks)
+            elif self._is_table_start(lines, index):
+                index = self._render_table(lines, index, blocks)
+            else:
+                paragraph = []
+                while index < len(lines) and lines[index].strip() and not self._starts_block(lines, index):
+                    paragraph.append(lines[index].strip() if not lines[index].endswith('  ') else lines[index].lstrip())
+                    index += 1
+                blocks.append(f"{self._open('p')}{self._render_inline(chr(10).join(paragraph))}</p>")
+        return blocks
+
+    def _starts_block(self, lines: List[str], index: int) -> bool:
+        line = lines[index]
+        return bool(self._FENCE.match(line) or self._HEADING.match(line) or self._RULE.match(line)
+                    or self._QUOTE.match(line) or self._LIST_ITEM.match(line) or self._is_table_start(lines, index))
+
+    def _render_code_block(self, lines: List[str], index: int, blocks: List[str]) -> int:
+        fence = self._FENCE.match(lines[index]).group(1)
+        code = []
+        index += 1
+        while index < len(lines) and not lines[index].strip().startswith(fence):
+            code.append(lines[index])
+            index += 1
+        # The code style is for inline spans; inside a block the pre element carries the background.
+        blocks.append(f"{self._open('pre')}<code>{html.escape(chr(10).join(code), quote=False)}</code></pre>")
+        return index + 1
+
+    def _render_list(self, lines: List[str], index: int, blocks: List[str]) -> int:
+        # Gather the items with their indent, folding continuation lines into the item above them.
+        items: List[Tuple[int, str, str, str]] = []
+        while index < len(lines):
+            line = lines[index]
+            match = self._LIST_ITEM.match(line)
+            if match:
+                indent, marker, text = match.groups()
+                tag = 'ul' if marker in '-*+' else 'ol'
+                # A different kind of list at the outer level starts a new list.
+                if items and len(indent.expandtabs(4)) <= items[0][0] and tag != items[0][1]:
+                    break
+                items.append((len(indent.expandtabs(4)), tag, marker.rstrip('.)'), text))
+            elif line.strip() and line[:1].isspace() and items:
+                indent, tag, marker, text = items[-1]
+                items[-1] = (indent, tag, marker, f'{text}\n{line.strip()}')
+            elif not line.strip() and index + 1 < len(lines) and (self._LIST_ITEM.match(lines[index + 1])
+                                                                 or lines[index + 1][:1].isspace()):
+                pass
+            else:
+                break
+            index += 1
+
+        html_parts = []
+        stack: List[Tuple[int, str]] = []
+        for indent, tag, marker, text in items:
+            if not stack or indent > stack[-1][0]:
+                start = f' start="{marker}"' if tag == 'ol' and marker not in ('', '1') else ''
+                html_parts.append(self._open(tag).replace('>', f'{start}>', 1))
+                stack.append((indent, tag))
+            else:
+                while len(stack) > 1 and indent < stack[-1][0]:
+                    html_parts.append(f'</li></{stack.pop()[1]}>')
+                html_parts.append('</li>')
+            html_parts.append(f"{self._open('li')}{self._render_inline(text)}")
+        while stack:
+            html_parts.append(f'</li></{stack.pop()[1]}>')
+        blocks.append(''.join(html_parts))
+        return index
+
+    def _is_table_start(self, lines: List[str], index: int) -> bool:
+        return ('|' in lines[index] and index + 1 < len(lines) and '-' in lines[index + 1]
+                and bool(self._TABLE_SEPARATOR.match(lines[index + 1])))
+
+    def _render_table(self, lines: List[str], index: int, blocks: List[str]) -> int:
+        header = self._split_row(lines[index])
+        alignments = [self._get_alignment(cell) for cell in self._split_row(lines[index + 1])]
+        index += 2
+        rows = []
+        while index < len(lines) and lines[index].strip() and '|' in lines[index]:
+            rows.append(self._split_row(lines[index]))
+            index += 1
+
+        def render_row(cells: List[str], tag: str) -> str:
+            rendered = []
+            for column in range(len(header)):
+                style = self._styles.get(tag, '')
+                alignment = alignments[column] if column < len(alignments) else None
+                if alignment:
+                    style = f'{style}text-align:{alignment};'
+                cell = cells[column] if column < len(cells) else ''
+                attribute = f' style="{style}"' if style else ''
+                rendered.append(f'<{tag}{attribute}>{self._render_inline(cell)}</{tag}>')
+            return f"<tr>{''.join(rendered)}</tr>"
+
+        body = ''.join(render_row(row, 'td') for row in rows)
+        blocks.append(f"{self._open('table')}<thead>{render_row(header, 'th')}</thead><tbody>{body}</tbody></table>")
+        return index
+
+    @staticmethod
+    def _split_row(line: str) -> List[str]:
+        line = line.strip()
+        if line.startswith('|'):
+            line = line[1:]
+        if line.endswith('|') and not line.endswith('\\|'):
+            line = line[:-1]
+        return [cell.strip().replace('\\|', '|') for cell in re.split(r'(?<!\\)\|', line)]
+
+    @staticmethod
+    def _get_alignment(cell: str) -> Optional[str]:
+        if cell.startswith(':') and cell.endswith(':'):
+            return 'center'
+        if cell.endswith(':'):
+            return 'right'
+        return None
+
+    def _render_inline(self, text: str) -> str:
+        # Code spans are set aside first so nothing inside them is treated as markup.
+        protected: List[str] = []
+
+        def protect(fragment: str) -> str:
+            protected.append(fragment)
+            return self._PLACEHOLDER.format(len(protected) - 1)
+
+        text = self._CODE_SPAN.sub(lambda match: protect(f"{self._open('code')}{html.escape(match.group(2).strip())}"
+                                                         f"</code>"), text)
+        text = html.escape(text)
+        text = self._IMAGE.sub(lambda match: protect(self._get_image(*match.groups())), text)
+        text = self._LINK.sub(lambda match: self._get_link(*match.groups()), text)
+        text = self._AUTOLINK.sub(lambda match: self._get_link(match.group(1), match.group(1), None), text)
+        text = self._BOLD.sub(lambda match: f'<strong>{match.group(2)}</strong>', text)
+        text = self._ITALIC.sub(lambda match: f'<em>{match.group(1) or match.group(2)}</em>', text)
+        text = self._STRIKE.sub(lambda match: f'<del>{match.group(1)}</del>', text)
+        text = self._HARD_BREAK.sub('<br>', text)
+        return re.sub('\x00(\\d+)\x00', lambda match: protected[int(match.group(1))], text)
+
+    def _get_link(self, text: str, url: str, title: Optional[str]) -> str:
+        title_attribute = f' title="{title}"' if title else ''
+        style = self._get_style_attribute('a')
+        return f'<a href="{self._get_safe_url(url)}"{title_attribute}{style}>{text}</a>'
+
+    def _get_image(self, alt: str, url: str, title: Optional[str]) -> str:
+        title_attribute = f' title="{title}"' if title else ''
+        return f'<img src="{self._get_safe_url(url)}" alt="{alt}"{title_attribute}{self._get_style_attribute("img")}>'
+
+    def _get_safe_url(self, url: str) -> str:
+        # The url is already HTML escaped; only script-capable schemes need neutralising.
+        return '#' if html.unescape(url).strip().lower().startswith(self._UNSAFE_SCHEMES) else url
+
+    def _open(self, tag: str) -> str:
+        return f'<{tag}{self._get_style_attribute(tag)}>'
+
+    def _get_style_attribute(self, tag: str) -> str:
+        style = self._styles.get(tag)
+        return f' style="{style}"' if style else ''
@@ -1,18 +1,97 @@
+import atexit
 import os
-import requests
+import threading
+from typing import Optional
 
+from common.cassettes.cassette import Cassette
 from common.constants import Constants
+from common.metrics.metrics import Metrics
+from common.tools.pushover_digest import PushoverDigest
+from common.tools.pushover_dispatcher import PushoverDispatcher
+from common.tools.pushover_quota import PushoverQuota
 
 class Pushover:
 
     _PUSHOVER_USER = os.getenv(Constants.PUSHOVER_USER)
     _PUSHOVER_TOKEN = os.getenv(Constants.PUSHOVER_TOKEN)
+    # Overridable so tests and benchmarks can point at a local stand-in instead of the real API.
+    _PUSHOVER_URL = (f"{os.environ[Constants.PUSHOVER_HOST].rstrip('/')}/1/messages.json"
+                     if os.getenv(Constants.PUSHOVER_HOST) else Constants.PUSHOVER_URL)
+    # Notifications are delivered in the background by default so a slow API never stalls an agent turn.
+    _BACKGROUND = os.getenv(Constants.PUSHOVER_DELIVERY, 'background') != 'sync'
+    _DEFAULT_QUOTA_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'agentic-ai', 'pushover_quota.json')
+    # Setting PUSHOVER_DIGEST_SECONDS puts every push through the digest, not only callers that ask for it.
+    _DIGEST_EVERYWHERE = bool(os.getenv(Constants.PUSHOVER_DIGEST_SECONDS))
+    # Built on first use, so importing the tools doesn't open a session or read the quota file.
+    _DISPATCHER: Optional[PushoverDispatcher] = None
+    _QUOTA: Optional[PushoverQuota] = None
+    _DIGEST: Optional[PushoverDigest] = None
+    _LOCK = threading.Lock()
 
     @classmethod
-    def push(cls, message):
+    @Cassette.recorded('pushover')
+    def push(cls, message, digest: bool = False):
+        """ Send a notification, or with digest=True fold it into the next digest and drop repeats of recent ones """
         # Note: this should not return anything (like status code), else langgraph breaks with internal server error.
+        if digest or cls._DIGEST_EVERYWHERE:
+            cls._get_digest().add(message)
+        else:
+            cls._deliver(message)
+
+    @classmethod
+    def flush(cls, timeout: float = PushoverDispatcher.DEFAULT_FLUSH_TIMEOUT_SECONDS) -> bool:
+        """ Send any pending digest and block until queued notifications are delivered; also runs at interpreter exit """
+        # Nothing to do for whatever was never used, so a process that never pushed exits without building them.
+        if cls._DIGEST is not None:
+            cls._DIGEST.flush()
+        delivered = cls._DISPATCHER.flush(timeout) if cls._DISPATCHER is not None else True
+        if cls._QUOTA is not None:
+            cls._QUOTA.save()
+        return delivered
+
+    @classmethod
+    def _deliver(cls, message: str) -> bool:
+        if not cls._get_quota().try_acquire():
+            Metrics.increment(Metrics.NOTIFICATIONS, channel='pushover', outcome='over_quota')
+            print("Pushover: quota reached, holding back notification")
+            return False
         payload = {"user": cls._PUSHOVER_USER, "token": cls._PUSHOVER_TOKEN, "message": message}
-        requests.post(Constants.PUSHOVER_URL, data=payload)
+        if cls._BACKGROUND:
+            cls._get_dispatcher().submit(payload)
+        else:
+            cls._get_dispatcher().send(payload)
+        return True
+
+    @classmethod
+    def _get_dispatcher(cls) -> PushoverDispatcher:
+        with cls._LOCK:
+            if cls._DISPATCHER is None:
+                cls._DISPATCHER = PushoverDispatcher(cls._PUSHOVER_URL)
+            return cls._DISPATCHER
+
+    @classmethod
+    def _get_quota(cls) -> PushoverQuota:
+        with cls._LOCK:
+            if cls._QUOTA is None:
+                cls._QUOTA = PushoverQuota(
+                    os.getenv(Constants.PUSHOVER_QUOTA_PATH) or cls._DEFAULT_QUOTA_PATH,
+                    int(os.getenv(Constants.PUSHOVER_QUOTA_PER_MINUTE, PushoverQuota.DEFAULT_PER_MINUTE)),
+                    int(os.getenv(Constants.PUSHOVER_QUOTA_PER_MONTH, PushoverQuota.DEFAULT_PER_MONTH)))
+            return cls._QUOTA
+
+    @classmethod
+    def _get_digest(cls) -> PushoverDigest:
+        with cls._LOCK:
+            if cls._DIGEST is None:
+                cls._DIGEST = PushoverDigest(
+                    cls._deliver,
+                    float(os.getenv(Constants.PUSHOVER_DIGEST_SECONDS, PushoverDigest.DEFAULT_INTERVAL_SECONDS)),
+                    int(os.getenv(Constants.PUSHOVER_DIGEST_MAX_MESSAGES, PushoverDigest.DEFAULT_MAX_MESSAGES)),
+                    float(os.getenv(Constants.PUSHOVER_DEDUPE_SECONDS, PushoverDigest.DEFAULT_DEDUPE_SECONDS)))
+            return cls._DIGEST
+
+# Registered at import, so it runs after the dispatcher's own exit hook and the final digest still gets delivered.
+atexit.register(Pushover.flush)
 
 if __name__ == '__main__':
     Pushover.push("HEY!!")
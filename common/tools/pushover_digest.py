@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from common.metrics.metrics import Metrics
+
+class PushoverDigest:
+    """ Collapses bursts of notifications: identical messages within the dedupe window are counted rather than
+        resent, and the rest are summarized into one push every interval_seconds or max_messages distinct messages """
+
+    DEFAULT_INTERVAL_SECONDS = 60.0
+    DEFAULT_MAX_MESSAGES = 20
+    DEFAULT_DEDUPE_SECONDS = 600.0
+    # Pushover truncates longer messages, and undelivered digests shouldn't pile up without bound.
+    _MAX_MESSAGE_LENGTH = 1024
+    _MAX_PENDING_MESSAGES = 200
+
+    def __init__(self,
+                 deliver: Callable[[str], bool],
+                 interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+                 max_messages: int = DEFAULT_MAX_MESSAGES,
+                 dedupe_seconds: float = DEFAULT_DEDUPE_SECONDS):
+        self._deliver = deliver
+        self._interval_seconds = interval_seconds
+        self._max_messages = max_messages
+        self._dedupe_seconds = dedupe_seconds
+        self._condition = threading.Condition()
+        # Distinct messages waiting for the next digest, with how many times each was reported.
+        self._pending: OrderedDict[str, int] = OrderedDict()
+        # When each message last went into a digest, oldest first, for the dedupe window.
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        self._window_started_at: Optional[float] = None
+        self._worker: Optional[threading.Thread] = None
+        self._stats = {"received": 0, "deduplicated": 0, "digests": 0, "deferred": 0}
+
+    def add(self, message: str):
+        now = time.monotonic()
+        with self._condition:
+            self._stats["received"] += 1
+            self._forget_expired(now)
+            # A repeat of a message already sent within the window is only counted.
+            if message in self._last_seen:
+                if message in self._pending:
+                    self._pending[message] += 1
+                self._stats["deduplicated"] += 1
+                Metrics.increment(Metrics.NOTIFICATIONS, channel='pushover', outcome='deduplicated')
+                return
+            self._pending[message] = 1
+            self._last_seen[message] = now
+            if len(self._pending) < self._max_messages:
+                self._start_window(now)
+                return
+            batch = self._take()
+        self._send(batch)
+
+    def flush(self):
+        """ Send whatever is pending now rather than waiting for the interval """
+        with self._condition:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {**self._stats, "pending": len(self._pending)}
+
+    def _start_window(self, now: float):
+        if self._window_started_at is None:
+            self._window_started_at = now
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='pushover-digest', daemon=True)
+                self._worker.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._window_started_at is None:
+                    self._condition.wait()
+                remaining = self._window_started_at + self._interval_seconds - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                batch = self._take()
+            if batch:
+                self._send(batch)
+
+    def _take(self) -> OrderedDict[str, int]:
+        batch, self._pending = self._pending, OrderedDict()
+        self._window_started_at = None
+        return batch
+
+    def _send(self, batch: OrderedDict[str, int]):
+        if self._deliver(self._summarize(batch)):
+            with self._condition:
+                self._stats["digests"] += 1
+            return
+        # Over quota: keep the messages for the next digest instead of losing them, oldest dropped first if need be.
+        with self._condition:
+            self._stats["deferred"] += 1
+            for message, count in self._pending.items():
+                batch[message] = batch.get(message, 0) + count
+            while len(batch) > self._MAX_PENDING_MESSAGES:
+                batch.popitem(last=False)
+            self._pending = batch
+            self._start_window(time.monotonic())
+
+    def _summarize(self, batch: OrderedDict[str, int]) -> str:
+        lines = [message if count == 1 else f"{message} (x{count})" for message, count in batch.items()]
+        if len(lines) == 1:
+            summary = lines[0]
+        else:
+            summary = f"{sum(batch.values())} notifications:\n" + '\n'.join(f"- {line}" for line in lines)
+        if len(summary) > self._MAX_MESSAGE_LENGTH:
+            summary = summary[:self._MAX_MESSAGE_LENGTH - 1] + '…'
+        return summary
+
+    def _forget_expired(self, now: float):
+        while self._last_seen:
+            message, seen_at = next(iter(self._last_seen.items()))
+            if seen_at > now - self._dedupe_seconds:
+                break
+            del self._last_seen[message]
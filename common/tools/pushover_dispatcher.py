@@ -0,0 +1,132 @@
+import atexit
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.metrics.metrics import Metrics
+
+@dataclass
+class _Notification:
+    payload: Dict[str, str]
+    enqueued_at: float
+
+class PushoverDispatcher:
+    """ Delivers Pushover notifications over one pooled keep-alive session, retrying with backoff, either inline
+        (send) or from a background worker so callers return as soon as the notification is queued (submit) """
+
+    DEFAULT_MAX_QUEUE_SIZE = 1000
+    DEFAULT_FLUSH_TIMEOUT_SECONDS = 10.0
+    _MAX_ATTEMPTS = 5
+    _BASE_BACKOFF_SECONDS = 0.5
+    _MAX_BACKOFF_SECONDS = 30.0
+    _CONNECT_TIMEOUT_SECONDS = 3.0
+    _READ_TIMEOUT_SECONDS = 10.0
+    _POOL_SIZE = 4
+
+    def __init__(self, url: str, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self._url = url
+        self._queue: 'queue.Queue[_Notification]' = queue.Queue(max_queue_size)
+        self._session = requests.Session()
+        self._session.mount(url.split('://')[0] + '://', HTTPAdapter(pool_connections=1, pool_maxsize=self._POOL_SIZE))
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stats = {"queued": 0, "delivered": 0, "failed": 0, "dropped": 0, "retries": 0}
+
+    def submit(self, payload: Dict[str, str]) -> bool:
+        """ Queue a notification for background delivery; False if the queue is full and it was dropped """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(_Notification(payload, time.monotonic()))
+        except queue.Full:
+            self._count('dropped')
+            Metrics.increment(Metrics.NOTIFICATIONS, channel='pushover', outcome='dropped')
+            print("Pushover: queue full, dropping notification")
+            return False
+        self._count('queued')
+        Metrics.set_gauge(Metrics.NOTIFICATION_QUEUE_DEPTH, self._queue.qsize(), channel='pushover')
+        return True
+
+    def send(self, payload: Dict[str, str]) -> bool:
+        """ Deliver a notification on the calling thread """
+        return self._deliver(_Notification(payload, time.monotonic()))
+
+    def flush(self, timeout: Optional[float] = DEFAULT_FLUSH_TIMEOUT_SECONDS) -> bool:
+        """ Wait for queued notifications to be delivered; False if some were still pending at the timeout """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    print(f"Pushover: {self._queue.unfinished_tasks} notifications still pending at shutdown")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "queue_depth": self._queue.qsize()}
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='pushover-dispatcher', daemon=True)
+                self._worker.start()
+                # Runs before the interpreter tears down daemon threads, so queued notifications aren't lost.
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            notification = self._queue.get()
+            try:
+                self._deliver(notification)
+            finally:
+                self._queue.task_done()
+                Metrics.set_gauge(Metrics.NOTIFICATION_QUEUE_DEPTH, self._queue.qsize(), channel='pushover')
+
+    def _deliver(self, notification: _Notification) -> bool:
+        for attempt in range(self._MAX_ATTEMPTS):
+            retry_after = None
+            try:
+                response = self._session.post(self._url, data=notification.payload,
+                                               timeout=(self._CONNECT_TIMEOUT_SECONDS, self._READ_TIMEOUT_SECONDS))
+                if response.status_code < 400:
+                    self._count('delivered')
+                    Metrics.increment(Metrics.NOTIFICATIONS, channel='pushover', outcome='delivered')
+                    Metrics.observe(Metrics.NOTIFICATION_DELIVERY_SECONDS, time.monotonic() - notification.enqueued_at,
+                                    channel='pushover')
+                    return True
+                # Other client errors (bad token, invalid user) won't succeed on a retry.
+                if response.status_code != 429 and response.status_code < 500:
+                    print(f"Pushover: rejected with {response.status_code}: {response.text[:200]}")
+                    break
+                retry_after = self._get_retry_after(response)
+            except requests.RequestException as e:
+                print(f"Pushover: delivery attempt {attempt + 1} failed: {e}")
+            if attempt + 1 < self._MAX_ATTEMPTS:
+                self._count('retries')
+                Metrics.increment(Metrics.RETRIES, reason='pushover')
+                time.sleep(min(retry_after or self._get_backoff(attempt), self._MAX_BACKOFF_SECONDS))
+        self._count('failed')
+        Metrics.increment(Metrics.NOTIFICATIONS, channel='pushover', outcome='failed')
+        return False
+
+    def _get_backoff(self, attempt: int) -> float:
+        # Full jitter, so a burst of failed notifications doesn't retry in lockstep.
+        return random.uniform(0, min(self._MAX_BACKOFF_SECONDS, self._BASE_BACKOFF_SECONDS * 2 ** attempt))
+
+    @staticmethod
+    def _get_retry_after(response: requests.Response) -> Optional[float]:
+        try:
+            return float(response.headers.get('retry-after', ''))
+        except ValueError:
+            return None
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
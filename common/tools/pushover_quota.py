@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+class PushoverQuota:
+    """ Per-minute and per-month push allowance, counted locally and saved to a JSON file so restarts don't reset it.
+        The file is written by a background thread, so counting a push never waits on the disk """
+
+    # The Pushover free tier allows 10,000 messages per application per month.
+    DEFAULT_PER_MONTH = 10_000
+    DEFAULT_PER_MINUTE = 60
+
+    def __init__(self, path: str, per_minute: Optional[int] = DEFAULT_PER_MINUTE,
+                 per_month: Optional[int] = DEFAULT_PER_MONTH):
+        self._path = path
+        self._per_minute = per_minute
+        self._per_month = per_month
+        self._condition = threading.Condition()
+        self._month, self._sent_this_month, self._recent = self._load(path)
+        self._dirty = False
+        # Held across taking and writing a snapshot, so an older snapshot can never overwrite a newer one.
+        self._save_lock = threading.Lock()
+        self._saver: Optional[threading.Thread] = None
+
+    def try_acquire(self) -> bool:
+        """ Count one push against the quota; False, without counting it, if either limit has been reached """
+        now = time.time()
+        with self._condition:
+            month = self._get_month(now)
+            if month != self._month:
+                self._month, self._sent_this_month = month, 0
+            self._recent = [sent_at for sent_at in self._recent if sent_at > now - 60]
+            if self._per_minute is not None and len(self._recent) >= self._per_minute:
+                return False
+            if self._per_month is not None and self._sent_this_month >= self._per_month:
+                return False
+            self._recent.append(now)
+            self._sent_this_month += 1
+            self._dirty = True
+            if self._saver is None:
+                self._saver = threading.Thread(target=self._run, name='pushover-quota', daemon=True)
+                self._saver.start()
+            self._condition.notify()
+            return True
+
+    def save(self):
+        """ Write the counters now if they changed since the last save; run at exit so the last pushes are kept """
+        with self._save_lock:
+            with self._condition:
+                state = self._take_state()
+            if state is not None:
+                self._save(state)
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {"sent_this_month": self._sent_this_month,
+                    "sent_last_minute": sum(1 for sent_at in self._recent if sent_at > time.time() - 60)}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._dirty:
+                    self._condition.wait()
+            # A burst of pushes while one snapshot is written is saved once, by the next pass.
+            self.save()
+
+    def _take_state(self) -> Optional[Dict]:
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return {"month": self._month, "sent_this_month": self._sent_this_month, "recent": list(self._recent)}
+
+    def _save(self, state: Dict):
+        # Written to the side and renamed, so a crash mid-write never leaves a corrupt counter behind.
+        temporary_path = f"{self._path}.tmp"
+        try:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temporary_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(temporary_path, self._path)
+        except OSError as e:
+            # A read-only cache directory only costs the counter surviving a restart, not the notification.
+            print(f"Pushover quota: could not save counter to {self._path}: {e}")
+
+    @classmethod
+    def _load(cls, path: str) -> Tuple[str, int, List[float]]:
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            return state["month"], int(state["sent_this_month"]), [float(sent_at) for sent_at in state["recent"]]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Pushover quota: ignoring unreadable counter at {path}: {e}")
+        return cls._get_month(time.time()), 0, []
+
+    @staticmethod
+    def _get_month(timestamp: float) -> str:
+        return time.strftime('%Y-%m', time.gmtime(timestamp))
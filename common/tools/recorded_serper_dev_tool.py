@@ -0,0 +1,15 @@
+from typing import Any
+
+from crewai_tools import SerperDevTool
+
+from common.cassettes.cassette import Cassette
+
+class RecordedSerperDevTool(SerperDevTool):
+    """ Drop-in SerperDevTool whose searches go through the active cassette """
+
+    def _run(self, **kwargs: Any) -> Any:
+        cassette = Cassette.get_active()
+        if cassette is None:
+            return super()._run(**kwargs)
+        run = super()._run
+        return cassette.record_or_replay('serper_dev', kwargs, lambda: run(**kwargs))
@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from common.cache.response_cache import ResponseCache
+from common.concurrency.single_flight import SingleFlight
+from common.constants import Constants
+from common.metrics.metrics import Metrics
+
+T = TypeVar('T')
+
+class SearchCache:
+    """ Caches search results on disk under a normalized form of the query, keeps time-sensitive queries for less
+        time, and runs concurrent identical lookups only once """
+
+    DEFAULT_TTL_SECONDS = 24 * 60 * 60
+    TIME_SENSITIVE_TTL_SECONDS = 60 * 60
+    _DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'agentic-ai', 'search_results.sqlite')
+
+    # Queries about what is happening now go stale within hours rather than days.
+    _TIME_SENSITIVE_WORDS = frozenset(("breaking current currently latest live news now price prices quote recent "
+                                       "recently today todays tonight trending weather yesterday").split())
+    _WORD = re.compile(r"[\w$%&+#.'-]+")
+
+    _DEFAULT: Optional['SearchCache'] = None
+    _DEFAULT_LOCK = threading.Lock()
+
+    def __init__(self, name: str, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self._name = name
+        self._ttl_seconds = ttl_seconds
+        self._cache = ResponseCache(path, ttl_seconds=ttl_seconds)
+        self._single_flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def get_default(cls) -> 'SearchCache':
+        """ Process-wide cache shared by every Serper client, stored at SEARCH_CACHE_PATH if set """
+        with cls._DEFAULT_LOCK:
+            if cls._DEFAULT is None:
+                cls._DEFAULT = SearchCache('search', os.getenv(Constants.SEARCH_CACHE_PATH) or cls._DEFAULT_PATH)
+            return cls._DEFAULT
+
+    @classmethod
+    def normalize(cls, query: str) -> str:
+        """ Same key for queries differing only in case, spacing or punctuation. Question words and word order stay:
+            "who founded Tesla" and "when was Tesla founded" want different answers """
+        words = [word.strip(".'-") for word in cls._WORD.findall(query.lower())]
+        return ' '.join(word for word in words if word)
+
+    @classmethod
+    def is_time_sensitive(cls, query: str) -> bool:
+        return bool(set(cls.normalize(query).split()) & cls._TIME_SENSITIVE_WORDS)
+
+    def get_ttl(self, query: str) -> float:
+        return self.TIME_SENSITIVE_TTL_SECONDS if self.is_time_sensitive(query) else self._ttl_seconds
+
+    def get_or_fetch(self, query: str, fetch: Callable[[], T], variant: str = '',
+                     ttl_seconds: Optional[float] = None) -> T:
+        """ Cached result for the query, or fetch() once however many callers ask for it concurrently. variant
+            separates results of differently configured searches; fetch() must return JSON serializable results """
+        cached = self.get(query, variant)
+        if cached is not None:
+            return cached
+
+        def fetch_and_store() -> T:
+            result = fetch()
+            self.set(query, result, variant, ttl_seconds)
+            return result
+
+        return self._single_flight.do_sync(self._get_key(query, variant), fetch_and_store)
+
+    def get(self, query: str, variant: str = '') -> Optional[Any]:
+        cached = self._cache.get(self._get_key(query, variant))
+        self._count(hit=cached is not None)
+        return None if cached is None else json.loads(cached)
+
+    def set(self, query: str, result: Any, variant: str = '', ttl_seconds: Optional[float] = None):
+        self._cache.set(self._get_key(query, variant), json.dumps(result),
+                        ttl_seconds if ttl_seconds is not None else self.get_ttl(query))
+
+    def stats(self) -> Dict[str, Any]:
+        coalesced = self._single_flight.stats()["coalesced"]
+        with self._lock:
+            lookups = self._hits + self._misses
+            # Lookups that shared another caller's in-flight search didn't reach the API either.
+            return {"hits": self._hits,
+                    "misses": self._misses,
+                    "coalesced": coalesced,
+                    "hit_ratio": (self._hits + coalesced) / lookups if lookups else 0.0,
+                    "disk_bytes": self._cache.stats()["disk_bytes"]}
+
+    def _get_key(self, query: str, variant: str) -> str:
+        return f"{variant}\n{self.normalize(query)}"
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+        Metrics.increment(Metrics.CACHE_HITS if hit else Metrics.CACHE_MISSES, cache=self._name)
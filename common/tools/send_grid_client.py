@@ -0,0 +1,55 @@
+import random
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class SendGridClient:
+    """ Posts to the SendGrid v3 mail send endpoint over one pooled keep-alive session, retrying rate limits and
+        server errors with backoff. The SDK's own client opens a fresh connection for every request """
+
+    _MAX_ATTEMPTS = 4
+    _BASE_BACKOFF_SECONDS = 0.5
+    _MAX_BACKOFF_SECONDS = 30.0
+    _CONNECT_TIMEOUT_SECONDS = 3.0
+    _READ_TIMEOUT_SECONDS = 30.0
+    _POOL_SIZE = 8
+
+    def __init__(self, api_key: Optional[str], host: str):
+        self._url = f"{host.rstrip('/')}/v3/mail/send"
+        self._session = requests.Session()
+        self._session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        self._session.mount(host.split('://')[0] + '://',
+                            HTTPAdapter(pool_connections=1, pool_maxsize=self._POOL_SIZE))
+
+    def send(self, mail: Dict[str, Any]) -> int:
+        """ Send a mail request body (as built by the SDK's Mail.get()) and return the final status code """
+        response = None
+        for attempt in range(self._MAX_ATTEMPTS):
+            retry_after = None
+            try:
+                response = self._session.post(self._url, json=mail,
+                                              timeout=(self._CONNECT_TIMEOUT_SECONDS, self._READ_TIMEOUT_SECONDS))
+                if response.status_code != 429 and response.status_code < 500:
+                    if response.status_code >= 400:
+                        print(f"SendGrid: rejected with {response.status_code}: {response.text[:200]}")
+                    return response.status_code
+                retry_after = self._get_retry_after(response)
+            except requests.RequestException as e:
+                if attempt + 1 == self._MAX_ATTEMPTS:
+                    raise
+                print(f"SendGrid: attempt {attempt + 1} failed: {e}")
+            if attempt + 1 < self._MAX_ATTEMPTS:
+                time.sleep(min(retry_after or self._get_backoff(attempt), self._MAX_BACKOFF_SECONDS))
+        return response.status_code
+
+    def _get_backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self._MAX_BACKOFF_SECONDS, self._BASE_BACKOFF_SECONDS * 2 ** attempt))
+
+    @staticmethod
+    def _get_retry_after(response: requests.Response) -> Optional[float]:
+        try:
+            return float(response.headers.get('retry-after', ''))
+        except ValueError:
+            return None
@@ -1,11 +1,19 @@
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
 
-import sendgrid
-from agents import Agent, OpenAIChatCompletionsModel, function_tool
-from sendgrid.helpers.mail import Mail, Email, To, Content
+from agents import Agent, Model, function_tool
+from sendgrid.helpers.mail import Mail, Email, To, Content, Personalization, Substitution
 
+from common.cassettes.cassette import Cassette
 from common.constants import Constants
+from common.metrics.metrics import Metrics
+from common.tools.email_outbox import EmailOutbox
+from common.tools.markdown_renderer import MarkdownRenderer
+from common.tools.send_grid_client import SendGridClient
 
 load_dotenv(override=True)
 
@@ -13,9 +21,23 @@ class SendGridEmail:
 
     EMAIL_TYPE_HTML = 'text/html'
     EMAIL_TYPE_PLAIN = 'text/plain'
+    # SendGrid accepts at most 1000 personalizations in one mail send request.
+    MAX_PERSONALIZATIONS_PER_REQUEST = 1000
+    _MAX_CONCURRENT_REQUESTS = 4
     _EMAIL_ID_FROM = os.environ.get(Constants.EMAIL_ID_FROM)
-    _EMAIL_ID_TO = os.environ.get(Constants.EMAIL_ID_TO)
+    # EMAIL_ID_TO may list several comma separated addresses; single sends go to the first, bulk sends to all of them.
+    _EMAIL_IDS_TO = [email_id.strip() for email_id in os.environ.get(Constants.EMAIL_ID_TO, '').split(',')
+                     if email_id.strip()]
     _SENDGRID_KEY = os.environ.get(Constants.SENDGRID_API_KEY)
+    # Overridable so benchmarks can point at a local stand-in instead of the real API.
+    _SENDGRID_HOST = os.environ.get(Constants.SENDGRID_HOST, 'https://api.sendgrid.com')
+    # Sends are queued to a durable outbox and delivered in the background; EMAIL_DELIVERY=sync sends them inline.
+    _USE_OUTBOX = os.environ.get(Constants.EMAIL_DELIVERY, 'outbox') != 'sync'
+    _DEFAULT_OUTBOX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'agentic-ai', 'email_outbox.sqlite')
+    _CLIENT: Optional[SendGridClient] = None
+    _OUTBOX: Optional[EmailOutbox] = None
+    _RENDERER = MarkdownRenderer()
+    _CLIENT_LOCK = threading.Lock()
 
     @staticmethod
     @function_tool
@@ -29,8 +51,47 @@ class SendGridEmail:
         # function_tool cannot be called directly so have split it into 2 separate methods.
         SendGridEmail.send_email(subject, mail_body, SendGridEmail.EMAIL_TYPE_HTML, None)
 
+    @staticmethod
+    @function_tool
+    def send_bulk_email_tool_html(subject: str, mail_body: str) -> Dict[str, int]:
+        """ Send the HTML email to every recipient on the mailing list """
+        return SendGridEmail.send_bulk_email(subject, mail_body, SendGridEmail.EMAIL_TYPE_HTML)
+
+    @staticmethod
+    @function_tool
+    def send_markdown_email_tool(subject: str, markdown_body: str):
+        """ Send an email whose markdown body is rendered to HTML for you """
+        SendGridEmail.send_email(subject, SendGridEmail.render_html(markdown_body, subject),
+                                 SendGridEmail.EMAIL_TYPE_HTML, None)
+
+    @staticmethod
+    @function_tool
+    def send_bulk_markdown_email_tool(subject: str, markdown_body: str) -> Dict[str, int]:
+        """ Send an email whose markdown body is rendered to HTML for you to every recipient on the mailing list """
+        return SendGridEmail.send_bulk_email(subject, SendGridEmail.render_html(markdown_body, subject),
+                                             SendGridEmail.EMAIL_TYPE_HTML)
+
+    @staticmethod
+    @function_tool(name_override='html_converter')
+    def html_converter_tool(mail_body: str) -> str:
+        """ Convert a text email body, which may contain markdown, to an HTML email body """
+        return SendGridEmail.render_html(mail_body)
+
     @classmethod
-    def get_html_converter_tool(cls, model: OpenAIChatCompletionsModel):
+    def render_html(cls, markdown_body: str, title: Optional[str] = None) -> str:
+        """ Render a markdown email body to a complete, inline-styled HTML email, locally and deterministically """
+        return cls._RENDERER.render_email(markdown_body, title)
+
+    @staticmethod
+    def use_llm_html_converter() -> bool:
+        # The LLM converter costs a model call per email and its output varies, so it is opt-in.
+        return os.environ.get(Constants.EMAIL_HTML_CONVERTER, 'local') == 'llm'
+
+    @classmethod
+    def get_html_converter_tool(cls, model: Model):
+        """ The local html_converter tool, or with EMAIL_HTML_CONVERTER=llm an agent that does the conversion """
+        if not cls.use_llm_html_converter():
+            return cls.html_converter_tool
         html_converter = Agent(name="HTML email body converter",
                                instructions=cls._get_html_email_instructions(),
                                model=model)
@@ -39,17 +100,96 @@ class SendGridEmail:
         return html_tool
 
     @classmethod
+    @Cassette.recorded('sendgrid')
     def send_email(cls, subject: str, mail_body: str, email_type: str, to_email_id: str = None):
-        to_email_id = to_email_id if to_email_id else cls._EMAIL_ID_TO
-        sg = sendgrid.SendGridAPIClient(api_key=cls._SENDGRID_KEY)
+        to_email_id = to_email_id if to_email_id else next(iter(cls._EMAIL_IDS_TO), None)
         from_email = Email(cls._EMAIL_ID_FROM)
         to_email = To(to_email_id)
         content = Content(email_type, mail_body)
         mail = Mail(from_email, to_email, subject, content).get()
-        response = sg.client.mail.send.post(request_body=mail)
-        print(f'Email sent to: {to_email_id} - Response Code: {response.status_code}')
+        print(f'Email {cls._submit(mail)}: {to_email_id}')
         print(f'Mail body: \n{mail_body}')
 
+    @classmethod
+    @Cassette.recorded('sendgrid')
+    def send_bulk_email(cls,
+                        subject: str,
+                        mail_body: str,
+                        email_type: str,
+                        to_email_ids: Optional[List[str]] = None,
+                        substitutions: Optional[List[Dict[str, str]]] = None) -> Dict[str, int]:
+        """ Send one message to many recipients, each in their own personalization so no one sees the others, in as
+            few requests as SendGrid allows. substitutions, if given, holds per-recipient values for tags in the body """
+        to_email_ids = to_email_ids if to_email_ids else cls._EMAIL_IDS_TO
+        substitutions = substitutions if substitutions else [{} for _ in to_email_ids]
+        if len(substitutions) != len(to_email_ids):
+            raise ValueError(f"Got {len(substitutions)} substitutions for {len(to_email_ids)} recipients")
+        recipients = list(zip(to_email_ids, substitutions))
+        chunks = [recipients[start:start + cls.MAX_PERSONALIZATIONS_PER_REQUEST]
+                  for start in range(0, len(recipients), cls.MAX_PERSONALIZATIONS_PER_REQUEST)]
+        with ThreadPoolExecutor(max_workers=cls._MAX_CONCURRENT_REQUESTS) as executor:
+            outcomes = list(executor.map(lambda chunk: cls._send_chunk(subject, mail_body, email_type, chunk), chunks))
+        counts = {outcome: sum(len(chunk) for chunk, chunk_outcome in zip(chunks, outcomes) if chunk_outcome == outcome)
+                  for outcome in ('queued', 'sent', 'failed')}
+        print(f'Bulk email to {len(recipients)} recipients in {len(chunks)} requests: {counts}')
+        return {**counts, "requests": len(chunks)}
+
+    @classmethod
+    def flush(cls, timeout: Optional[float] = EmailOutbox.DEFAULT_FLUSH_TIMEOUT_SECONDS) -> bool:
+        """ Block until queued emails are delivered; also runs automatically at interpreter exit """
+        return cls._get_outbox().flush(timeout) if cls._USE_OUTBOX else True
+
+    @classmethod
+    def _send_chunk(cls, subject: str, mail_body: str, email_type: str,
+                    recipients: List[Tuple[str, Dict[str, str]]]) -> str:
+        mail = Mail()
+        mail.from_email = Email(cls._EMAIL_ID_FROM)
+        mail.subject = subject
+        mail.add_content(Content(email_type, mail_body))
+        for email_id, values in recipients:
+            personalization = Personalization()
+            personalization.add_to(To(email_id))
+            for key, value in values.items():
+                personalization.add_substitution(Substitution(key, value))
+            mail.add_personalization(personalization)
+        return cls._submit(mail.get())
+
+    @classmethod
+    def _submit(cls, mail: Dict) -> str:
+        if cls._USE_OUTBOX:
+            cls._get_outbox().enqueue(mail)
+            return 'queued'
+        recipients = sum(len(personalization.get('to', [])) for personalization in mail.get('personalizations', []))
+        started = time.monotonic()
+        try:
+            status_code = cls._get_client().send(mail)
+        except Exception as e:
+            print(f'Email request for {recipients} recipients failed: {e}')
+            status_code = None
+        outcome = 'sent' if status_code is not None and status_code < 400 else 'failed'
+        Metrics.increment(Metrics.NOTIFICATIONS, recipients, channel='email',
+                          outcome='delivered' if outcome == 'sent' else 'failed')
+        Metrics.observe(Metrics.NOTIFICATION_DELIVERY_SECONDS, time.monotonic() - started, channel='email')
+        return outcome
+
+    @classmethod
+    def _get_client(cls) -> SendGridClient:
+        # One client for the process, so every send reuses the same pooled connections.
+        with cls._CLIENT_LOCK:
+            if cls._CLIENT is None:
+                cls._CLIENT = SendGridClient(cls._SENDGRID_KEY, cls._SENDGRID_HOST)
+            return cls._CLIENT
+
+    @classmethod
+    def _get_outbox(cls) -> EmailOutbox:
+        with cls._CLIENT_LOCK:
+            if cls._OUTBOX is None:
+                cls._OUTBOX = EmailOutbox(os.environ.get(Constants.EMAIL_OUTBOX_PATH) or cls._DEFAULT_OUTBOX_PATH,
+                                          lambda mail: cls._get_client().send(mail))
+                # Emails queued by an earlier run that exited before delivering them go out now.
+                cls._OUTBOX.start()
+            return cls._OUTBOX
+
     @staticmethod
     def _get_html_email_instructions() -> str:
         return ("You can convert a text email body to an HTML email body. "
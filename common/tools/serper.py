@@ -1,9 +1,218 @@
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass, replace
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import httpx
+from agents import function_tool
 from langchain_community.utilities import GoogleSerperAPIWrapper
+from langchain_core.tools import StructuredTool
+
+from common.cassettes.cassette import Cassette
+from common.cassettes.cassette_transport import AsyncCassetteTransport
+from common.search_index.bm25_index import Bm25Index
+from common.tools.search_cache import SearchCache
+
+@dataclass
+class SerperResult:
+    query: str
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+@dataclass
+class _LoopHttpClient:
+    client: httpx.AsyncClient
+    shutdown_hook: AsyncGenerator[None, None]
 
 class Serper:
 
+    DEFAULT_MAX_CONCURRENCY = 8
+    # Serper accepts up to 100 queries in one batch request.
+    _MAX_BATCH_SIZE = 100
+    _SEARCH_URL = 'https://google.serper.dev/search'
+    _CACHE_VARIANT = 'serper'
+    _NO_RESULTS = 'No good Google Search Result was found'
+    _TIMEOUT_SECONDS = 30.0
+    _CONNECT_TIMEOUT_SECONDS = 10.0
     _SERPER = GoogleSerperAPIWrapper()
+    _LOCK = threading.Lock()
+    _HTTP_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopHttpClient]" = weakref.WeakKeyDictionary()
 
     @classmethod
+    @Cassette.recorded('serper')
     def run(cls, query: str) -> str:
-        return cls._SERPER.run(query)
\ No newline at end of file
+        return SearchCache.get_default().get_or_fetch(query, lambda: cls._fetch(query), cls._CACHE_VARIANT)
+
+    @classmethod
+    async def arun_many(cls, queries: List[str], max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[SerperResult]:
+        """ Search for every query in as few requests as possible. Results come back in input order, with an error in
+            place of the result for any query whose search failed """
+        cache = SearchCache.get_default()
+        results: Dict[str, SerperResult] = {}
+        pending: Dict[str, str] = {}
+        for query in queries:
+            key = cache.normalize(query)
+            if key in results or key in pending:
+                continue
+            cached = cache.get(query, cls._CACHE_VARIANT)
+            if cached is not None:
+                results[key] = SerperResult(query, cached)
+            else:
+                pending[key] = query
+
+        if pending:
+            semaphore = asyncio.Semaphore(max_concurrency)
+            client = cls._get_http_client()
+            misses = list(pending.values())
+            chunks = [misses[start:start + cls._MAX_BATCH_SIZE] for start in range(0, len(misses), cls._MAX_BATCH_SIZE)]
+            for fetched in await asyncio.gather(*(cls._search_batch(client, semaphore, chunk) for chunk in chunks)):
+                for result in fetched:
+                    results[cache.normalize(result.query)] = result
+                    if result.error is None:
+                        cache.set(result.query, result.result, cls._CACHE_VARIANT)
+        return [replace(results[cache.normalize(query)], query=query) for query in queries]
+
+    @classmethod
+    def run_many(cls, queries: List[str]) -> List[SerperResult]:
+        return asyncio.run(cls.arun_many(queries))
+
+    @classmethod
+    def get_langchain_batch_tool(cls) -> StructuredTool:
+        return StructuredTool.from_function(func=cls._run_many_formatted,
+                                            coroutine=cls._arun_many_formatted,
+                                            name="batch_search",
+                                            description="Use this tool to run several online web searches at once; "
+                                                        "pass every query you need in one call")
+
+    @staticmethod
+    @function_tool
+    async def batch_search_tool(queries: List[str]) -> str:
+        """ Run several online web searches at once; pass every query you need in one call """
+        return await Serper._arun_many_formatted(queries)
+
+    @classmethod
+    def _fetch(cls, query: str) -> str:
+        results = cls._SERPER.results(query)
+        # Every result paid for goes into the local index, so later searches can be answered without the API.
+        Bm25Index.get_default().add_serper_results(results)
+        return cls._format_results(results)
+
+    @classmethod
+    def _run_many_formatted(cls, queries: List[str]) -> str:
+        return cls._format(cls.run_many(queries))
+
+    @classmethod
+    async def _arun_many_formatted(cls, queries: List[str]) -> str:
+        return cls._format(await cls.arun_many(queries))
+
+    @staticmethod
+    def _format(results: List[SerperResult]) -> str:
+        return '\n\n'.join(f"## {result.query}\n"
+                           + (result.result if result.error is None else f"Search failed: {result.error}")
+                           for result in results)
+
+    @classmethod
+    async def _search_batch(cls, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                            queries: List[str]) -> List[SerperResult]:
+        if len(queries) > 1:
+            try:
+                async with semaphore:
+                    response = await client.post(cls._SEARCH_URL, json=[cls._get_params(query) for query in queries],
+                                                 headers=cls._get_headers())
+                response.raise_for_status()
+                payload = response.json()
+                if isinstance(payload, list) and len(payload) == len(queries):
+                    return [cls._to_result(query, item) for query, item in zip(queries, payload)]
+                print("Serper: unexpected batch response, searching one query at a time")
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Serper: batch request failed ({e}), searching one query at a time")
+        return list(await asyncio.gather(*(cls._search_one(client, semaphore, query) for query in queries)))
+
+    @classmethod
+    async def _search_one(cls, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, query: str) -> SerperResult:
+        try:
+            async with semaphore:
+                response = await client.post(cls._SEARCH_URL, json=cls._get_params(query), headers=cls._get_headers())
+            response.raise_for_status()
+            return cls._to_result(query, response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            return SerperResult(query, error=f"{type(e).__name__}: {e}")
+
+    @classmethod
+    def _to_result(cls, query: str, item: Any) -> SerperResult:
+        # Failed queries in a batch come back as error objects in their slot rather than failing the whole request.
+        if not isinstance(item, dict) or item.get('statusCode', 200) >= 400:
+            message = item.get('message') if isinstance(item, dict) else None
+            return SerperResult(query, error=message or f"unexpected result {str(item)[:200]}")
+        Bm25Index.get_default().add_serper_results(item)
+        return SerperResult(query, cls._format_results(item))
+
+    @classmethod
+    def _format_results(cls, results: Dict[str, Any]) -> str:
+        """ Flattens a Serper response into snippets: the answer box alone if there is one, otherwise the knowledge
+            graph followed by the organic results, the same text GoogleSerperAPIWrapper.run gives """
+        answer_box = results.get('answerBox') or {}
+        if answer_box.get('answer'):
+            return answer_box['answer']
+        if answer_box.get('snippet'):
+            return answer_box['snippet'].replace('\n', ' ')
+        if answer_box.get('snippetHighlighted'):
+            return ' '.join(answer_box['snippetHighlighted'])
+        snippets = []
+        knowledge_graph = results.get('knowledgeGraph') or {}
+        title = knowledge_graph.get('title')
+        if knowledge_graph.get('type'):
+            snippets.append(f"{title}: {knowledge_graph['type']}.")
+        if knowledge_graph.get('description'):
+            snippets.append(knowledge_graph['description'])
+        for attribute, value in knowledge_graph.get('attributes', {}).items():
+            snippets.append(f"{title} {attribute}: {value}.")
+        for item in results.get('organic', [])[:cls._SERPER.k]:
+            if 'snippet' in item:
+                snippets.append(item['snippet'])
+            for attribute, value in item.get('attributes', {}).items():
+                snippets.append(f"{attribute}: {value}.")
+        return ' '.join(snippets) if snippets else cls._NO_RESULTS
+
+    @classmethod
+    def _get_params(cls, query: str) -> Dict[str, Any]:
+        params = {"q": query, "gl": cls._SERPER.gl, "hl": cls._SERPER.hl, "num": cls._SERPER.k}
+        if cls._SERPER.tbs:
+            params["tbs"] = cls._SERPER.tbs
+        return params
+
+    @classmethod
+    def _get_headers(cls) -> Dict[str, str]:
+        return {"X-API-KEY": cls._SERPER.serper_api_key or '', "Content-Type": "application/json"}
+
+    @classmethod
+    def _get_http_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with cls._LOCK:
+            entry = cls._HTTP_CLIENTS.get(loop)
+            if entry is None:
+                # Its own pool rather than the Gemini one, so searching needs no Gemini key and isn't throttled as a
+                # model call; the cassette still records and replays searches.
+                limits = httpx.Limits(max_keepalive_connections=cls.DEFAULT_MAX_CONCURRENCY)
+                timeout = httpx.Timeout(cls._TIMEOUT_SECONDS, connect=cls._CONNECT_TIMEOUT_SECONDS)
+                client = httpx.AsyncClient(transport=AsyncCassetteTransport(httpx.AsyncHTTPTransport(limits=limits)),
+                                           timeout=timeout)
+                entry = _LoopHttpClient(client, cls._close_on_loop_shutdown(weakref.ref(loop), client))
+                cls._HTTP_CLIENTS[loop] = entry
+                # Advancing the hook once registers it with the loop, so asyncio.run() finalizes it on shutdown.
+                asyncio.ensure_future(entry.shutdown_hook.__anext__(), loop=loop)
+        return entry.client
+
+    @classmethod
+    async def _close_on_loop_shutdown(cls,
+                                      loop_ref: "weakref.ref[asyncio.AbstractEventLoop]",
+                                      client: httpx.AsyncClient) -> AsyncGenerator[None, None]:
+        try:
+            yield
+        finally:
+            loop = loop_ref()
+            with cls._LOCK:
+                if loop is not None and loop in cls._HTTP_CLIENTS:
+                    del cls._HTTP_CLIENTS[loop]
+            await client.aclose()
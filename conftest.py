@@ -0,0 +1 @@
+# Lets the tests import the repo's packages (common, foundations_01, ...) the same way the entry points do.
@@ -6,6 +6,7 @@ from datetime import datetime
 
 dotenv.load_dotenv(override=True)
 
+from common.metrics.crew_metrics import CrewMetrics
 from crew import Coder
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -17,7 +18,7 @@ def run():
     inputs = {'assignment': _ASSIGNMENT}
 
     try:
-        result = Coder().crew().kickoff(inputs=inputs)
+        result = CrewMetrics.kickoff('coder', Coder().crew(), inputs)
         print(result.raw)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
@@ -6,6 +6,7 @@ from datetime import datetime
 
 dotenv.load_dotenv(override=True)
 
+from common.metrics.crew_metrics import CrewMetrics
 from crew import Debate
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -17,7 +18,7 @@ def run():
     inputs = {'motion': 'There needs to be strict laws to regulate LLMs'}
 
     try:
-        result = Debate().crew().kickoff(inputs=inputs)
+        result = CrewMetrics.kickoff('debate', Debate().crew(), inputs)
         print(result.raw)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
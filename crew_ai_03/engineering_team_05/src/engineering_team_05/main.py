@@ -4,6 +4,7 @@ import warnings
 
 dotenv.load_dotenv(override=True)
 
+from common.metrics.crew_metrics import CrewMetrics
 from crew import EngineeringTeam
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -33,7 +34,7 @@ def run():
     }
 
     try:
-        result = EngineeringTeam().crew().kickoff(inputs=inputs)
+        result = CrewMetrics.kickoff('engineering_team', EngineeringTeam().crew(), inputs)
         print(result.raw)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
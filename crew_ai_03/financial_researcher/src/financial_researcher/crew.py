@@ -1,9 +1,11 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from crewai.project import CrewBase, agent, crew, task
-from crewai_tools import SerperDevTool # This should not be crewai.tool
 from typing import List
 
+from common.cassettes.recorded_llm import RecordedLLM
+from common.tools.local_first_serper_dev_tool import LocalFirstSerperDevTool
+
 @CrewBase
 class FinancialResearcher():
     """FinancialResearcher crew"""
@@ -13,7 +15,7 @@ class FinancialResearcher():
 
     @agent
     def researcher(self) -> Agent:
-        return Agent(config=self.agents_config['researcher'], tools=[SerperDevTool()], verbose=True)
+        return Agent(config=self.agents_config['researcher'], tools=[LocalFirstSerperDevTool()], verbose=True)
 
     @agent
     def analyst(self) -> Agent:
@@ -29,7 +31,7 @@ class FinancialResearcher():
 
     @crew
     def crew(self) -> Crew:
-
+        RecordedLLM.wrap_agents(self.agents)
         return Crew(
             agents=self.agents,
             tasks=self.tasks,
@@ -3,6 +3,7 @@ import warnings
 
 dotenv.load_dotenv(override=True)
 
+from common.metrics.crew_metrics import CrewMetrics
 from crew import FinancialResearcher
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -16,7 +17,7 @@ def run():
     }
 
     try:
-        result = FinancialResearcher().crew().kickoff(inputs=inputs)
+        result = CrewMetrics.kickoff('financial_researcher', FinancialResearcher().crew(), inputs)
         print(result.raw)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
@@ -7,11 +7,13 @@ from crewai.memory import LongTermMemory, ShortTermMemory, EntityMemory
 from crewai.memory.storage.rag_storage import RAGStorage
 from crewai.memory.storage.ltm_sqlite_storage import LTMSQLiteStorage
 from crewai.project import CrewBase, agent, crew, task
-from crewai_tools import SerperDevTool
 
+from common.cassettes.recorded_llm import RecordedLLM
 from common.constants import Constants
+from common.parsing.repairing_converter import RepairingConverter
 from common.response_formats.trending_company_list import TrendingCompanyList
 from common.response_formats.trending_company_research_list import TrendingCompanyResearchList
+from common.tools.local_first_serper_dev_tool import LocalFirstSerperDevTool
 from tools.push_notification_tool import PushNotificationTool
 
 @CrewBase
@@ -23,11 +25,11 @@ class StockPicker03():
 
     @agent
     def trending_company_finder(self) -> Agent:
-        return Agent(config=self.agents_config['trending_company_finder'], tools=[SerperDevTool()], memory=True)
+        return Agent(config=self.agents_config['trending_company_finder'], tools=[LocalFirstSerperDevTool()], memory=True)
 
     @agent
     def financial_researcher(self) -> Agent:
-        return Agent(config=self.agents_config['financial_researcher'], tools=[SerperDevTool()])
+        return Agent(config=self.agents_config['financial_researcher'], tools=[LocalFirstSerperDevTool()])
 
 
     @agent
@@ -36,11 +38,13 @@ class StockPicker03():
 
     @task
     def find_trending_companies(self) -> Task:
-        return Task(config=self.tasks_config['find_trending_companies'], output_pydantic=TrendingCompanyList)
+        return Task(config=self.tasks_config['find_trending_companies'], output_pydantic=TrendingCompanyList,
+                    converter_cls=RepairingConverter)
 
     @task
     def research_trending_companies(self) -> Task:
-        return Task(config=self.tasks_config['research_trending_companies'], output_pydantic=TrendingCompanyResearchList)
+        return Task(config=self.tasks_config['research_trending_companies'], output_pydantic=TrendingCompanyResearchList,
+                    converter_cls=RepairingConverter)
 
     @task
     def pick_best_company(self) -> Task:
@@ -54,6 +58,7 @@ class StockPicker03():
             config=self.agents_config['manager'],
             allow_delegation=True
         )
+        RecordedLLM.wrap_agents(self.agents + [manager])
 
         embedder_config = {"provider": "google",
                            "config": {"model": "models/gemini-embedding-001",
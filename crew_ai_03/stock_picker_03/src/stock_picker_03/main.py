@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+from common.metrics.crew_metrics import CrewMetrics
 from crew import StockPicker03
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -17,7 +18,7 @@ def run():
     }
 
     try:
-        result = StockPicker03().crew().kickoff(inputs=inputs)
+        result = CrewMetrics.kickoff('stock_picker', StockPicker03().crew(), inputs)
         print(result.raw)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
@@ -1,33 +1,41 @@
 import json
-import os
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
-import gradio as gr
-from openai import OpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
 from pypdf import PdfReader
 
+from common.clients.gemini_client_registry import GeminiClientRegistry
 from common.constants import Constants
+from common.resilience.model_failover import ModelFailover
 from common.tools.pushover import Pushover
 from foundations_01.helpers import Helpers
+from foundations_01.persona_context import PersonaContext
 
 load_dotenv(override=True)
 
 class AgentWithPushover:
 
-    def __init__(self, name: str, linked_in_path: str, summary_path: str):
-        self._agent = OpenAI(base_url=Constants.GEMINI_BASE_URL, api_key=os.getenv(Constants.GOOGLE_API_KEY))
+    def __init__(self, name: str, linked_in_path: str, summary_path: str, context_mode: Optional[str] = None):
+        self._completions = GeminiClientRegistry.get_chat_completions()
+        self._async_completions = GeminiClientRegistry.get_async_chat_completions()
         self._tools = [{"type": "function", "function": self._get_user_details_json()},
                        {"type": "function", "function": self._get_unknown_question_json()}]
         self._name = name
         self._linked_in_path = linked_in_path
         self._summary_path = summary_path
-        self._system_prompt = self._get_system_prompt(self._name,
-                                                      Helpers.get_summary_at(self._summary_path),
-                                                      Helpers.get_linked_in_details(self._linked_in_path))
+        # Full context puts the whole profile in every prompt; retrieval only a short bio and the relevant chunks.
+        self._persona_context = None
+        self._system_prompt = None
+        if (context_mode or PersonaContext.get_mode()) == PersonaContext.MODE_RETRIEVAL:
+            self._persona_context = PersonaContext.get_for(self._summary_path, self._linked_in_path)
+        else:
+            self._system_prompt = self._get_system_prompt(self._name,
+                                                          Helpers.get_summary_at(self._summary_path),
+                                                          Helpers.get_linked_in_details(self._linked_in_path))
 
     def chat(self, message, history):
-        messages = ([{"role": "system", "content": self._system_prompt}]
+        messages = ([{"role": "system", "content": self._get_prompt_for(message, history)}]
                     + history
                     + [{"role": "user", "content": message}])
         done = False
@@ -35,7 +43,8 @@ class AgentWithPushover:
 
             # This is the call to the LLM - see that we pass in the tools json
 
-            response = self._agent.chat.completions.create(model=Constants.GEMINI_MODEL_LITE, messages=messages, tools=self._tools)
+            response = ModelFailover.call(lambda model: self._completions.create(
+                model=model, messages=messages, tools=self._tools, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
 
             finish_reason = response.choices[0].finish_reason
             print(f'Finish reason: {finish_reason}', flush=True)
@@ -52,14 +61,101 @@ class AgentWithPushover:
                 done = True
         return response.choices[0].message.content
 
+    def chat_stream(self, message, history) -> Iterator[str]:
+        """ Streaming chat for gradio: yields the reply so far as it arrives, running any tool calls the model makes
+            along the way and carrying on with the conversation after them """
+        messages = ([{"role": "system", "content": self._get_prompt_for(message, history)}]
+                    + history
+                    + [{"role": "user", "content": message}])
+        reply = ''
+        while True:
+            stream = ModelFailover.call(lambda model: self._completions.create(
+                model=model, messages=messages, tools=self._tools, stream=True,
+                timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+            content = ''
+            tool_calls: Dict[Any, Dict[str, str]] = {}
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content += delta.content
+                    yield reply + content
+                self._accumulate_tool_calls(tool_calls, delta.tool_calls)
+            reply += content
+            if not tool_calls:
+                return
+            messages.extend(self._run_streamed_tool_calls(content, tool_calls))
+
+    async def achat(self, message, history) -> str:
+        """ Async chat: waits on the model without holding a thread, so concurrent sessions don't need one each """
+        messages = ([{"role": "system", "content": self._get_prompt_for(message, history)}]
+                    + history
+                    + [{"role": "user", "content": message}])
+        while True:
+            response = await ModelFailover.call_async(lambda model: self._async_completions.create(
+                model=model, messages=messages, tools=self._tools, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+            if response.choices[0].finish_reason != Constants.OPEN_AI_TOOL_CALL:
+                return response.choices[0].message.content
+            message = response.choices[0].message
+            messages.append(message)
+            messages.extend(self._handle_tool_calls(message.tool_calls))
+
+    async def achat_stream(self, message, history) -> AsyncIterator[str]:
+        messages = ([{"role": "system", "content": self._get_prompt_for(message, history)}]
+                    + history
+                    + [{"role": "user", "content": message}])
+        reply = ''
+        while True:
+            stream = await ModelFailover.call_async(lambda model: self._async_completions.create(
+                model=model, messages=messages, tools=self._tools, stream=True,
+                timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+            content = ''
+            tool_calls: Dict[Any, Dict[str, str]] = {}
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content += delta.content
+                    yield reply + content
+                self._accumulate_tool_calls(tool_calls, delta.tool_calls)
+            reply += content
+            if not tool_calls:
+                return
+            messages.extend(self._run_streamed_tool_calls(content, tool_calls))
+
+    @classmethod
+    def _run_streamed_tool_calls(cls, content: str, tool_calls: Dict[Any, Dict[str, str]]) -> List[Dict[str, Any]]:
+        """ The assistant message with the accumulated tool calls, followed by the results of running them """
+        calls = [ChatCompletionMessageToolCall(id=call["id"], type="function",
+                                               function={"name": call["name"], "arguments": call["arguments"] or '{}'})
+                 for call in tool_calls.values()]
+        print(f"Streamed tool calls: {', '.join(call.function.name for call in calls)}", flush=True)
+        return ([{"role": "assistant", "content": content or None, "tool_calls": [call.model_dump() for call in calls]}]
+                + cls._handle_tool_calls(calls))
+
+    @staticmethod
+    def _accumulate_tool_calls(tool_calls: Dict[Any, Dict[str, str]], deltas: Any):
+        """ Tool calls arrive in pieces: the id and name first, then the arguments a fragment at a time """
+        for delta in deltas or []:
+            # Some OpenAI compatible servers leave out the index and send each call whole.
+            key = delta.index if delta.index is not None else (delta.id or next(reversed(tool_calls), 0))
+            call = tool_calls.setdefault(key, {"id": '', "name": '', "arguments": ''})
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function:
+                call["name"] += delta.function.name or ''
+                call["arguments"] += delta.function.arguments or ''
+
     @staticmethod
     def _record_user_details(email: str, name: str="Name not provided", notes: str="not provided") -> Dict[str, str]:
-        Pushover.push(f"Recording interest from {name} with email {email} and notes {notes}")
+        Pushover.push(f"Recording interest from {name} with email {email} and notes {notes}", digest=True)
         return {"recorded": "ok"}
 
     @staticmethod
     def _record_unknown_question(question: str) -> Dict[str, str]:
-        Pushover.push(f"Recording {question} asked that I couldn't answer")
+        Pushover.push(f"Recording {question} asked that I couldn't answer", digest=True)
         return {"recorded": "ok"}
 
     @classmethod
@@ -76,8 +172,16 @@ class AgentWithPushover:
             results.append({"role": "tool","content": json.dumps(result),"tool_call_id": tool_call.id})
         return results
 
+    def _get_prompt_for(self, message: str, history: List[Dict[str, str]]) -> str:
+        if self._persona_context is None:
+            return self._system_prompt
+        return self._get_system_prompt(self._name, self._persona_context.bio,
+                                       self._persona_context.retrieve(message, history),
+                                       PersonaContext.EXCERPTS_HEADING)
+
     @classmethod
-    def _get_system_prompt(cls, name: str, summary: str, linkedin: str) -> str:
+    def _get_system_prompt(cls, name: str, summary: str, linkedin: str,
+                           linkedin_heading: str = "LinkedIn Profile") -> str:
         system_prompt = (f"You are acting as {name}. You are answering questions on {name}'s website, "
                          f"particularly questions related to {name}'s career, background, skills and experience. "
                          f"Your responsibility is to represent {name} for interactions on the website as faithfully as possible. "
@@ -88,7 +192,7 @@ class AgentWithPushover:
                          f"If the user is engaging in discussion, try to steer them towards getting in touch via email; "
                          f"ask for their email and record it using your {cls._record_user_details.__name__} tool. ")
 
-        system_prompt += f"\n\n## Summary:\n{summary}\n\n## LinkedIn Profile:\n{linkedin}\n\n"
+        system_prompt += f"\n\n## Summary:\n{summary}\n\n## {linkedin_heading}:\n{linkedin}\n\n"
         system_prompt += f"With this context, please chat with the user, always staying in character as {name}."
         return system_prompt
 
@@ -139,4 +243,4 @@ class AgentWithPushover:
         return record_unknown_question_json
 
 if __name__ == '__main__':
-    gr.ChatInterface(AgentWithPushover('Ed Donner', './me/linkedin.pdf', './me/summary.txt').chat, type="messages").launch()
+    Helpers.launch_chat(AgentWithPushover('Ed Donner', './me/linkedin.pdf', './me/summary.txt').achat_stream)
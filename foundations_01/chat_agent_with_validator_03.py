@@ -1,11 +1,14 @@
+import asyncio
 import os
 from dotenv import load_dotenv
-from typing import Dict, List
-
-import gradio as gr
-from openai import OpenAI
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
+from common.clients.gemini_client_registry import GeminiClientRegistry
 from common.constants import Constants
+from common.metrics.metrics import Metrics
+from common.parsing.structured_output_repair import StructuredOutputRepair
+from common.resilience.call_budget import CallBudget
+from common.resilience.model_failover import ModelFailover
 from common.response_formats.evaluation import Evaluation
 from foundations_01.helpers import Helpers
 from foundations_01.simple_chat_agent_02 import SimpleChatAgent
@@ -14,9 +17,25 @@ load_dotenv(override=True)
 
 class ChatAgentWithValidator:
 
-    def __init__(self, name: str, linked_in_path: str, summary_path: str):
+    # Candidate replies are sampled at different temperatures, so they differ and aren't coalesced into one request.
+    # The first keeps the model's default, which is what the serial path uses.
+    CANDIDATE_TEMPERATURES = (None, 1.0, 0.6, 1.4, 0.3, 1.8)
+    DEFAULT_CANDIDATES = 1
+
+    def __init__(self, name: str, linked_in_path: str, summary_path: str, candidates: Optional[int] = None,
+                 max_calls: Optional[int] = None):
+        """ With more than one candidate the async chats speculate: the candidates are generated and evaluated
+            concurrently. max_calls caps the model calls a speculating chat makes for one message, counting every
+            attempt: generations, evaluations, evaluator re-prompts and failovers """
+        if candidates is None:
+            candidates = int(os.getenv(Constants.VALIDATOR_CANDIDATES, self.DEFAULT_CANDIDATES))
+        self._candidates = min(candidates, len(self.CANDIDATE_TEMPERATURES))
+        # By default as many as the speculation plans for: every candidate evaluated, then one rerun.
+        self._max_calls = (max_calls if max_calls is not None
+                           else int(os.getenv(Constants.VALIDATOR_MAX_CALLS, 2 * self._candidates + 1)))
         self._chat_agent = SimpleChatAgent(name, linked_in_path, summary_path)
-        self._eval_model = OpenAI(base_url=Constants.GEMINI_BASE_URL, api_key=os.getenv(Constants.GOOGLE_API_KEY))
+        self._eval_completions = GeminiClientRegistry.get_chat_completions()
+        self._async_eval_completions = GeminiClientRegistry.get_async_chat_completions()
         self._name = name
         self._linked_in_path = linked_in_path
         self._summary_path = summary_path
@@ -37,6 +56,122 @@ class ChatAgentWithValidator:
             reply = self._chat_agent.rerun(reply, message, history, evaluation.feedback)
         return reply
 
+    def chat_stream(self, message, history) -> Iterator[str]:
+        """ Streaming chat for gradio. The first reply is shown as it arrives; if the evaluator then rejects it, the
+            retried reply streams in over it """
+        reply = ''
+        for reply in self._chat_agent.chat_stream(message, history):
+            yield reply
+        evaluation = self._evaluate(reply, message, history)
+
+        if evaluation.is_acceptable:
+            print("Passed evaluation - returning reply")
+            print(evaluation.feedback)
+        else:
+            print("Failed evaluation - retrying")
+            print(evaluation.feedback)
+            yield from self._chat_agent.rerun_stream(reply, message, history, evaluation.feedback)
+
+    async def achat(self, message, history) -> str:
+        if self._is_speculative():
+            return await self._achat_speculative(message, history)
+        reply = await self._chat_agent.achat(message, history)
+        evaluation = await self._aevaluate(reply, message, history)
+
+        if evaluation.is_acceptable:
+            print("Passed evaluation - returning reply")
+            print(evaluation.feedback)
+        else:
+            print("Failed evaluation - retrying")
+            print(evaluation.feedback)
+            reply = await self._chat_agent.arerun(reply, message, history, evaluation.feedback)
+        return reply
+
+    async def achat_stream(self, message, history) -> AsyncIterator[str]:
+        if self._is_speculative():
+            # Only a reply the evaluator has accepted is shown, so there is nothing to stream before it is known.
+            yield await self._achat_speculative(message, history)
+            return
+        reply = ''
+        async for reply in self._chat_agent.achat_stream(message, history):
+            yield reply
+        evaluation = await self._aevaluate(reply, message, history)
+
+        if evaluation.is_acceptable:
+            print("Passed evaluation - returning reply")
+            print(evaluation.feedback)
+        else:
+            print("Failed evaluation - retrying")
+            print(evaluation.feedback)
+            async for updated in self._chat_agent.arerun_stream(reply, message, history, evaluation.feedback):
+                yield updated
+
+    def _is_speculative(self) -> bool:
+        # Each candidate costs a generation and an evaluation.
+        return min(self._candidates, self._max_calls // 2) > 1
+
+    async def _achat_speculative(self, message, history) -> str:
+        """ The first candidate the evaluator accepts, with the rest cancelled. A rejected candidate costs no extra
+            round trip while another is still in flight; only when every candidate is rejected is there a rerun """
+        # Tasks started inside the block share its budget, so the candidates draw on one count between them.
+        with CallBudget.limit(self._max_calls) as budget:
+            return await self._arun_candidates(message, history, budget)
+
+    async def _arun_candidates(self, message, history, budget: CallBudget) -> str:
+        candidates = min(self._candidates, self._max_calls // 2)
+        tasks = [asyncio.create_task(self._agenerate_and_evaluate(message, history, temperature))
+                 for temperature in self.CANDIDATE_TEMPERATURES[:candidates]]
+        rejected: List[Tuple[str, Evaluation]] = []
+        error: Optional[Exception] = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    reply, evaluation = await next_done
+                except Exception as e:
+                    # One failed candidate doesn't fail the message while others may still be accepted.
+                    print(f"Speculative candidate failed: {e}")
+                    Metrics.increment(Metrics.SPECULATIVE_CANDIDATES, outcome='failed')
+                    error = e
+                    continue
+                Metrics.increment(Metrics.SPECULATIVE_CANDIDATES,
+                                  outcome='accepted' if evaluation.is_acceptable else 'rejected')
+                if evaluation.is_acceptable:
+                    print("Passed evaluation - returning reply")
+                    print(evaluation.feedback)
+                    return reply
+                print("Failed evaluation - waiting for other candidates")
+                print(evaluation.feedback)
+                rejected.append((reply, evaluation))
+        finally:
+            # Cancelling a candidate cancels the request it is waiting on, so the losers stop spending the budget.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    task.add_done_callback(self._record_cancelled)
+
+        if not rejected:
+            raise error
+        reply, evaluation = rejected[0]
+        if budget.get_remaining() < 1:
+            print("Every candidate failed evaluation and the call budget is spent - returning the first")
+            return reply
+        print("Every candidate failed evaluation - retrying")
+        return await self._chat_agent.arerun(reply, message, history, evaluation.feedback)
+
+    @staticmethod
+    def _record_cancelled(task: asyncio.Task):
+        if task.cancelled():
+            Metrics.increment(Metrics.SPECULATIVE_CANDIDATES, outcome='cancelled')
+        elif not task.exception():
+            # Its requests ran to completion after all, so they were paid for despite the cancel.
+            print("Speculative candidate finished despite being cancelled")
+            Metrics.increment(Metrics.SPECULATIVE_CANDIDATES, outcome='finished_after_cancel')
+
+    async def _agenerate_and_evaluate(self, message, history,
+                                      temperature: Optional[float]) -> Tuple[str, Evaluation]:
+        reply = await self._chat_agent.achat(message, history, temperature)
+        return reply, await self._aevaluate(reply, message, history)
+
     @staticmethod
     def _get_evaluation_system_prompt(name: str, summary: str, linkedin: str) -> str:
         evaluator_system_prompt = (f"You are an evaluator that decides whether a response to a question is acceptable. "
@@ -62,12 +197,41 @@ class ChatAgentWithValidator:
 
 
     def _evaluate(self, reply: str, message: str, history: List[Dict[str, str]]) -> Evaluation:
-        messages = ([{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_SYSTEM,
-                      Constants.OPEN_AI_CONTENT: self._eval_system_prompt}]
-                    + [{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_USER,
-                        Constants.OPEN_AI_CONTENT: self._get_evaluator_user_prompt(reply, message, history)}])
-        response = self._eval_model.beta.chat.completions.parse(model=Constants.GEMINI_MODEL_LITE, messages=messages, response_format=Evaluation)
-        return response.choices[0].message.parsed
+        messages = self._get_evaluation_messages(reply, message, history)
+        evaluation_reply = self._get_evaluation_reply(messages)
+        # Malformed JSON is repaired locally; the evaluator is only asked again when that fails.
+        return StructuredOutputRepair.parse_or_reprompt(evaluation_reply, Evaluation, lambda correction:
+            self._get_evaluation_reply(self._get_correction_messages(messages, evaluation_reply, correction)))
+
+    def _get_evaluation_messages(self, reply: str, message: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return ([{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_SYSTEM,
+                  Constants.OPEN_AI_CONTENT: self._eval_system_prompt}]
+                + [{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_USER,
+                    Constants.OPEN_AI_CONTENT: self._get_evaluator_user_prompt(reply, message, history)}])
+
+    @staticmethod
+    def _get_correction_messages(messages: List[Dict[str, str]], evaluation_reply: str,
+                                 correction: str) -> List[Dict[str, str]]:
+        return messages + [{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_ASSISTANT, Constants.OPEN_AI_CONTENT: evaluation_reply},
+                           {Constants.OPEN_AI_ROLE: Constants.OPEN_AI_USER, Constants.OPEN_AI_CONTENT: correction}]
+
+    def _get_evaluation_reply(self, messages: List[Dict[str, str]]) -> str:
+        response = ModelFailover.call(lambda model: self._eval_completions.create(
+            model=model, messages=messages, response_format=StructuredOutputRepair.get_response_format(Evaluation),
+            timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+        return response.choices[0].message.content or ''
+
+    async def _aevaluate(self, reply: str, message: str, history: List[Dict[str, str]]) -> Evaluation:
+        messages = self._get_evaluation_messages(reply, message, history)
+        evaluation_reply = await self._aget_evaluation_reply(messages)
+        return await StructuredOutputRepair.aparse_or_reprompt(evaluation_reply, Evaluation, lambda correction:
+            self._aget_evaluation_reply(self._get_correction_messages(messages, evaluation_reply, correction)))
+
+    async def _aget_evaluation_reply(self, messages: List[Dict[str, str]]) -> str:
+        response = await ModelFailover.call_async(lambda model: self._async_eval_completions.create(
+            model=model, messages=messages, response_format=StructuredOutputRepair.get_response_format(Evaluation),
+            timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+        return response.choices[0].message.content or ''
 
 if __name__ == '__main__':
-    gr.ChatInterface(ChatAgentWithValidator('Ed Donner', './me/linkedin.pdf', './me/summary.txt').chat, type='messages').launch()
+    Helpers.launch_chat(ChatAgentWithValidator('Ed Donner', './me/linkedin.pdf', './me/summary.txt').achat_stream)
@@ -1,19 +1,40 @@
-from pypdf import PdfReader
+import os
+from typing import Callable, Optional
+
+import gradio as gr
+
+from common.constants import Constants
+from foundations_01.pdf_text_cache import PdfTextCache
 
 class Helpers:
 
+    # Async handlers wait on the network without holding a thread, so one process can serve hundreds of chats.
+    DEFAULT_CONCURRENCY_LIMIT = 256
+    DEFAULT_MAX_QUEUE_SIZE = 1024
+    # gradio's own default; only sync handlers run on these threads.
+    DEFAULT_MAX_THREADS = 40
+
     @staticmethod
     def get_linked_in_details(profile_path: str) -> str:
-        reader = PdfReader(profile_path)
-        linkedin = ''
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                linkedin += text
-        return linkedin
+        return PdfTextCache.get_text(profile_path)
 
     @staticmethod
     def get_summary_at(path: str) -> str:
         with open(path, 'r', encoding='utf-8') as f:
             summary = f.read()
         return summary
+
+    @classmethod
+    def launch_chat(cls, chat: Callable):
+        """ Serve a chat handler with the concurrency limits from GRADIO_CONCURRENCY_LIMIT, GRADIO_MAX_QUEUE_SIZE and
+            GRADIO_MAX_THREADS; a limit of 0 means none """
+        concurrency_limit = cls._get_limit(Constants.GRADIO_CONCURRENCY_LIMIT, cls.DEFAULT_CONCURRENCY_LIMIT)
+        max_queue_size = cls._get_limit(Constants.GRADIO_MAX_QUEUE_SIZE, cls.DEFAULT_MAX_QUEUE_SIZE)
+        max_threads = int(os.getenv(Constants.GRADIO_MAX_THREADS, cls.DEFAULT_MAX_THREADS))
+        interface = gr.ChatInterface(chat, type='messages', concurrency_limit=concurrency_limit)
+        interface.queue(max_size=max_queue_size).launch(max_threads=max_threads)
+
+    @staticmethod
+    def _get_limit(name: str, default: int) -> Optional[int]:
+        limit = int(os.getenv(name, default))
+        return limit or None
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+class PdfTextCache:
+    """ Text of a PDF, extracted once and saved next to it as <name>.pdf.text.json. The saved text is reused for as
+        long as the file's size and mtime, or failing those its content hash, still match """
+
+    # Below this many pages starting worker processes costs more than it saves.
+    PARALLEL_MIN_PAGES = 16
+    _MIN_PAGES_PER_WORKER = 8
+    _SUFFIX = '.text.json'
+    _HASH_CHUNK_BYTES = 1 << 20
+
+    _LOCK = threading.Lock()
+    # (path, size, mtime) -> text, so agents constructed in the same process don't even read the cache file.
+    _MEMORY: Dict[Tuple[str, int, int], str] = {}
+
+    @classmethod
+    def get_text(cls, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with cls._LOCK:
+            if key in cls._MEMORY:
+                return cls._MEMORY[key]
+            text = cls._load_or_extract(path, stat.st_size, stat.st_mtime_ns)
+            cls._MEMORY[key] = text
+            return text
+
+    @classmethod
+    def _load_or_extract(cls, path: str, size: int, mtime_ns: int) -> str:
+        cached = cls._read_cache(path)
+        if cached and cached.get("size") == size and cached.get("mtime_ns") == mtime_ns:
+            return cached["text"]
+        content_hash = cls._hash(path)
+        if cached and cached.get("sha256") == content_hash:
+            # Touched or copied but unchanged: keep the text and just record the new size and mtime.
+            text = cached["text"]
+        else:
+            print(f"Extracting text from {path}...")
+            text = cls._extract(path)
+        cls._write_cache(path, {"size": size, "mtime_ns": mtime_ns, "sha256": content_hash, "text": text})
+        return text
+
+    @classmethod
+    def _extract(cls, path: str) -> str:
+        page_count = len(PdfReader(path).pages)
+        cpus = os.cpu_count() or 1
+        if page_count < cls.PARALLEL_MIN_PAGES or cpus < 2:
+            return ''.join(cls._extract_pages(path, 0, page_count))
+        workers = min(cpus, page_count // cls._MIN_PAGES_PER_WORKER)
+        # Each worker opens the file itself; a parsed PdfReader isn't worth pickling across processes.
+        step = -(-page_count // workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = executor.map(cls._extract_pages, [path] * len(ranges), *zip(*ranges))
+            return ''.join(text for pages in chunks for text in pages)
+
+    @staticmethod
+    def _extract_pages(path: str, start: int, stop: int) -> List[str]:
+        reader = PdfReader(path)
+        return [reader.pages[index].extract_text() or '' for index in range(start, stop)]
+
+    @classmethod
+    def _hash(cls, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(cls._HASH_CHUNK_BYTES), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def _read_cache(cls, path: str) -> Optional[Dict]:
+        try:
+            with open(path + cls._SUFFIX, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _write_cache(cls, path: str, entry: Dict):
+        cache_path = path + cls._SUFFIX
+        temporary_path = f"{cache_path}.tmp"
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(temporary_path, cache_path)
+        except OSError as e:
+            # A read-only profile directory only costs the saving, not the extraction.
+            print(f"Could not save extracted text to {cache_path}: {e}")
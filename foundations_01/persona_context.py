@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from common.constants import Constants
+from common.search_index.bm25_index import Bm25Index
+from foundations_01.helpers import Helpers
+
+class PersonaContext:
+    """ The persona's summary and LinkedIn profile split into chunks and indexed with BM25, so that each request
+        carries a short fixed bio and only the chunks relevant to the conversation instead of the whole profile.
+        The index is cached per pair of source files and rebuilt whenever either of them changes """
+
+    MODE_FULL = 'full'
+    MODE_RETRIEVAL = 'retrieval'
+    DEFAULT_TOP_K = 4
+    EXCERPTS_HEADING = "Relevant excerpts from the full summary and LinkedIn profile"
+
+    _CHUNK_WORDS = 120
+    _BIO_CHARS = 600
+    _INDEX_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'agentic-ai', 'persona_index')
+    _SOURCES = ('summary', 'linkedin')
+    _PARAGRAPH = re.compile(r"\n\s*\n|\n(?=[A-Z•\-*])")
+
+    _LOCK = threading.Lock()
+    _INSTANCES: Dict[Tuple[str, str], 'PersonaContext'] = {}
+
+    def __init__(self, summary_path: str, linked_in_path: str, top_k: int = DEFAULT_TOP_K):
+        self._summary_path = summary_path
+        self._linked_in_path = linked_in_path
+        self._top_k = top_k
+        summary = Helpers.get_summary_at(summary_path)
+        self.bio = self._get_bio(summary)
+        self._index = self._open_index(summary, Helpers.get_linked_in_details(linked_in_path))
+
+    @classmethod
+    def get_mode(cls) -> str:
+        """ PERSONA_CONTEXT selects retrieval; full context, the whole profile in every prompt, is the default """
+        mode = os.getenv(Constants.PERSONA_CONTEXT, cls.MODE_FULL).lower()
+        return mode if mode in (cls.MODE_FULL, cls.MODE_RETRIEVAL) else cls.MODE_FULL
+
+    @classmethod
+    def get_for(cls, summary_path: str, linked_in_path: str) -> 'PersonaContext':
+        """ One instance per pair of persona files, shared by every agent in the process """
+        key = (os.path.abspath(summary_path), os.path.abspath(linked_in_path))
+        with cls._LOCK:
+            if key not in cls._INSTANCES:
+                top_k = int(os.getenv(Constants.PERSONA_CONTEXT_TOP_K, cls.DEFAULT_TOP_K))
+                cls._INSTANCES[key] = PersonaContext(summary_path, linked_in_path, top_k)
+            return cls._INSTANCES[key]
+
+    def retrieve(self, message: str, history: List[Dict[str, str]]) -> str:
+        """ The chunks most relevant to the message, with the previous user turn added so follow-ups still match """
+        previous = [turn.get('content') for turn in history if turn.get('role') == 'user']
+        query = ' '.join(text for text in previous[-1:] + [message] if isinstance(text, str))
+        hits = self._index.search(query, self._top_k)
+        return '\n\n'.join(f"[{hit.link.split('#')[0]}] {hit.snippet}" for hit in hits)
+
+    def _open_index(self, summary: str, linked_in: str) -> Bm25Index:
+        # Named after both source paths, so personas sharing a directory or a summary each get their own index, and
+        # after their sizes and times, so a rebuild goes to a new file instead of deleting one that may still be open.
+        signature = self._get_signature()
+        name = self._get_key({source: os.path.abspath(path) for source, path
+                              in zip(self._SOURCES, (self._summary_path, self._linked_in_path))})
+        index_path = os.path.join(self._INDEX_DIRECTORY, f"{name}-{self._get_key(signature)}.sqlite")
+        signature_path = os.path.join(self._INDEX_DIRECTORY, f"{name}.json")
+        if self._read_signature(signature_path) == signature and os.path.exists(index_path):
+            return Bm25Index(index_path)
+
+        print("Indexing persona documents...")
+        # A build that didn't finish left the same chunks under the same links, and adding them again replaces them.
+        index = Bm25Index(index_path)
+        for source, text in zip(self._SOURCES, (summary, linked_in)):
+            for number, chunk in enumerate(self._chunk(text)):
+                index.add(f"{source}#{number}", snippet=chunk)
+        # Written last, so an interrupted build is never mistaken for a finished one.
+        with open(signature_path, 'w', encoding='utf-8') as f:
+            json.dump(signature, f)
+        return index
+
+    @staticmethod
+    def _get_key(value: Dict) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def _get_signature(self) -> Dict[str, List[int]]:
+        signature = {}
+        for source, path in zip(self._SOURCES, (self._summary_path, self._linked_in_path)):
+            stat = os.stat(path)
+            signature[source] = [stat.st_size, stat.st_mtime_ns]
+        return signature
+
+    @staticmethod
+    def _read_signature(path: str) -> Optional[Dict[str, List[int]]]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _chunk(cls, text: str) -> List[str]:
+        """ Paragraphs packed into chunks of about _CHUNK_WORDS words; the last paragraph of each chunk starts the
+            next one as well, so a fact split across the boundary is still whole in one of them """
+        paragraphs = []
+        for paragraph in cls._PARAGRAPH.split(text):
+            tokens = paragraph.split()
+            # A paragraph longer than a chunk, as PDF text often is, is cut into chunk sized pieces first.
+            paragraphs += [' '.join(tokens[start:start + cls._CHUNK_WORDS])
+                           for start in range(0, len(tokens), cls._CHUNK_WORDS)]
+        chunks: List[str] = []
+        current: List[str] = []
+        words = 0
+        for paragraph in paragraphs:
+            length = len(paragraph.split())
+            if current and words + length > cls._CHUNK_WORDS:
+                chunks.append(' '.join(current))
+                current = current[-1:] if len(current) > 1 else []
+                words = sum(len(part.split()) for part in current)
+            current.append(paragraph)
+            words += length
+        if current:
+            chunks.append(' '.join(current))
+        return chunks
+
+    @classmethod
+    def _get_bio(cls, summary: str) -> str:
+        bio = ' '.join(summary.split())
+        if len(bio) <= cls._BIO_CHARS:
+            return bio
+        cut = bio.rfind('. ', 0, cls._BIO_CHARS)
+        return bio[:cut + 1] if cut > 0 else bio[:cls._BIO_CHARS]
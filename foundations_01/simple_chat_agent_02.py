@@ -1,49 +1,119 @@
-import os
 from dotenv import load_dotenv
-from typing import Dict, List
-
-from openai import OpenAI
-import gradio as gr
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
+from common.clients.gemini_client_registry import GeminiClientRegistry
 from common.constants import Constants
+from common.resilience.model_failover import ModelFailover
 from foundations_01.helpers import Helpers
+from foundations_01.persona_context import PersonaContext
 
 load_dotenv(override=True)
 
 class SimpleChatAgent:
 
-    _MODEL_NAME = Constants.GEMINI_MODEL_LITE
-
-    def __init__(self, name: str, linked_in_path: str, summary_path: str):
-        self._open_ai = OpenAI(base_url=Constants.GEMINI_BASE_URL, api_key=os.getenv(Constants.GOOGLE_API_KEY))
+    def __init__(self, name: str, linked_in_path: str, summary_path: str, context_mode: Optional[str] = None):
+        self._completions = GeminiClientRegistry.get_chat_completions()
+        self._async_completions = GeminiClientRegistry.get_async_chat_completions()
         self._linked_in_path = linked_in_path
         self._summary_path = summary_path
         self._name = name
-        self._system_prompt = self._get_system_prompt_for(self._name,
-                                                          Helpers.get_linked_in_details(self._linked_in_path),
-                                                          Helpers.get_summary_at(self._summary_path))
+        # Full context puts the whole profile in every prompt; retrieval only a short bio and the relevant chunks.
+        self._persona_context = None
+        self._system_prompt = None
+        if (context_mode or PersonaContext.get_mode()) == PersonaContext.MODE_RETRIEVAL:
+            self._persona_context = PersonaContext.get_for(self._summary_path, self._linked_in_path)
+        else:
+            self._system_prompt = self._get_system_prompt_for(self._name,
+                                                              Helpers.get_linked_in_details(self._linked_in_path),
+                                                              Helpers.get_summary_at(self._summary_path))
 
     def chat(self, message: str, history: List[Dict[str, str]]):
-        messages = ([{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_SYSTEM,
-                     Constants.OPEN_AI_CONTENT: self._system_prompt}]
-                     + history
-                     + [{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_USER, Constants.OPEN_AI_CONTENT: message}])
-        response = self._open_ai.chat.completions.create(model=self._MODEL_NAME, messages=messages)
-        return response.choices[0].message.content
+        return self._complete(self._get_messages(message, history))
+
+    def chat_stream(self, message: str, history: List[Dict[str, str]]) -> Iterator[str]:
+        """ Streaming chat for gradio: yields the reply so far each time more of it arrives """
+        yield from self._complete_stream(self._get_messages(message, history))
 
     def rerun(self, reply: str, message: str, history: List[Dict[str, str]], feedback: str):
-        updated_system_prompt = self._system_prompt + "\n\n## Previous answer rejected\nYou just tried to reply, but the quality control rejected your reply\n"
+        return self._complete(self._get_messages(message, history,
+                                                 self._get_rerun_prompt(reply, message, history, feedback)))
+
+    def rerun_stream(self, reply: str, message: str, history: List[Dict[str, str]], feedback: str) -> Iterator[str]:
+        yield from self._complete_stream(self._get_messages(message, history,
+                                                            self._get_rerun_prompt(reply, message, history, feedback)))
+
+    async def achat(self, message: str, history: List[Dict[str, str]], temperature: Optional[float] = None) -> str:
+        """ Async chat: waits on the model without holding a thread, so concurrent sessions don't need one each.
+            Without a temperature the model's default is used """
+        return await self._acomplete(self._get_messages(message, history), temperature)
+
+    async def achat_stream(self, message: str, history: List[Dict[str, str]]) -> AsyncIterator[str]:
+        async for reply in self._acomplete_stream(self._get_messages(message, history)):
+            yield reply
+
+    async def arerun(self, reply: str, message: str, history: List[Dict[str, str]], feedback: str) -> str:
+        return await self._acomplete(self._get_messages(message, history,
+                                                        self._get_rerun_prompt(reply, message, history, feedback)))
+
+    async def arerun_stream(self, reply: str, message: str, history: List[Dict[str, str]],
+                            feedback: str) -> AsyncIterator[str]:
+        messages = self._get_messages(message, history, self._get_rerun_prompt(reply, message, history, feedback))
+        async for updated in self._acomplete_stream(messages):
+            yield updated
+
+    def _get_system_prompt(self, message: str, history: List[Dict[str, str]]) -> str:
+        if self._persona_context is None:
+            return self._system_prompt
+        return self._get_system_prompt_for(self._name, self._persona_context.retrieve(message, history),
+                                           self._persona_context.bio, PersonaContext.EXCERPTS_HEADING)
+
+    def _get_rerun_prompt(self, reply: str, message: str, history: List[Dict[str, str]], feedback: str) -> str:
+        updated_system_prompt = self._get_system_prompt(message, history)
+        updated_system_prompt += "\n\n## Previous answer rejected\nYou just tried to reply, but the quality control rejected your reply\n"
         updated_system_prompt += f"## Your attempted answer:\n{reply}\n\n"
         updated_system_prompt += f"## Reason for rejection:\n{feedback}\n\n"
-        messages = ([{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_SYSTEM,
-                     Constants.OPEN_AI_CONTENT: updated_system_prompt}]
-                     + history
-                     + [{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_USER, Constants.OPEN_AI_CONTENT: message}])
-        response = self._openai.chat.completions.create(model=self._MODEL_NAME, messages=messages)
+        return updated_system_prompt
+
+    def _get_messages(self, message: str, history: List[Dict[str, str]],
+                      system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        return ([{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_SYSTEM,
+                  Constants.OPEN_AI_CONTENT: system_prompt or self._get_system_prompt(message, history)}]
+                + history
+                + [{Constants.OPEN_AI_ROLE: Constants.OPEN_AI_USER, Constants.OPEN_AI_CONTENT: message}])
+
+    def _complete(self, messages: List[Dict[str, str]]) -> str:
+        response = ModelFailover.call(lambda model: self._completions.create(
+            model=model, messages=messages, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
         return response.choices[0].message.content
 
+    def _complete_stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        # Failover covers opening the stream; once tokens are flowing the reply stays with that model.
+        stream = ModelFailover.call(lambda model: self._completions.create(
+            model=model, messages=messages, stream=True, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+        reply = ''
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                reply += chunk.choices[0].delta.content
+                yield reply
+
+    async def _acomplete(self, messages: List[Dict[str, str]], temperature: Optional[float] = None) -> str:
+        options = {} if temperature is None else {'temperature': temperature}
+        response = await ModelFailover.call_async(lambda model: self._async_completions.create(
+            model=model, messages=messages, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS, **options))
+        return response.choices[0].message.content
+
+    async def _acomplete_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        stream = await ModelFailover.call_async(lambda model: self._async_completions.create(
+            model=model, messages=messages, stream=True, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS))
+        reply = ''
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                reply += chunk.choices[0].delta.content
+                yield reply
+
     @staticmethod
-    def _get_system_prompt_for(name: str, linked_in_details: str, summary: str) -> str:
+    def _get_system_prompt_for(name: str, linked_in_details: str, summary: str,
+                               linked_in_heading: str = "LinkedIn Profile") -> str:
         system_prompt = (f"You are acting as {name}. You are answering questions on {name}'s website, "
                          f"particularly questions related to {name}'s career, background, skills and experience. "
                          f"Your responsibility is to represent {name} for interactions on the website as faithfully as possible. "
@@ -51,10 +121,10 @@ class SimpleChatAgent:
                          f"Be professional and engaging, as if talking to a potential client or future employer who came across the website. "
                          f"If you don't know the answer, say so.")
 
-        system_prompt += f"\n\n## Summary:\n{summary}\n\n## LinkedIn Profile:\n{linked_in_details}\n\n"
+        system_prompt += f"\n\n## Summary:\n{summary}\n\n## {linked_in_heading}:\n{linked_in_details}\n\n"
         system_prompt += f"With this context, please chat with the user, always staying in character as {name}."
 
         return system_prompt
 
 if __name__ == '__main__':
-    gr.ChatInterface(SimpleChatAgent('Ed Donner', './me/linkedin.pdf', './me/summary.txt').chat, type='messages').launch()
+    Helpers.launch_chat(SimpleChatAgent('Ed Donner', './me/linkedin.pdf', './me/summary.txt').achat_stream)
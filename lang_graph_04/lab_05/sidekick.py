@@ -1,39 +1,56 @@
 import asyncio
+import json
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import BaseTool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph import graph
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import ToolNode
 
+from common.budget.prompt_budget import PromptBudget
+from common.budget.token_estimator import TokenEstimator
 from common.constants import Constants
+from common.metrics.metrics import Metrics
+from common.parsing.structured_output_repair import StructuredOutputRepair
+from common.resilience.model_failover import ModelFailover
 from lang_graph_04.lab_05.evaluator_output import EvaluatorOutput
 from lang_graph_04.lab_05.sidekick_tools import SidekickTools
 from lang_graph_04.lab_05.state import State
 
 class Sidekick:
 
+    _WORKFLOW = 'sidekick'
+
     def __init__(self):
-        self._worker_llm_with_tools = None
-        self._evaluator_llm_with_output = None
+        self._worker_llms_with_tools = {}
+        self._evaluator_llms_with_output = {}
         self._tools = None
         self._llm_with_tools = None
         self._state_graph = None
         self._sidekick_id = str(uuid.uuid4())
         self._memory = MemorySaver()
+        self._prompt_budget = PromptBudget.get_default()
         self._browser = None
         self._playwright = None
 
-    async def setup(self):
-        self._tools, self._browser, self._playwright = await SidekickTools.playwright_tools()
-        self._tools += await SidekickTools.other_tools()
-        worker_llm = ChatGoogleGenerativeAI(model=Constants.GEMINI_MODEL_LITE)
-        self._worker_llm_with_tools = worker_llm.bind_tools(self._tools)
-        evaluator_llm = ChatGoogleGenerativeAI(model=Constants.GEMINI_MODEL_LITE)
-        self._evaluator_llm_with_output = evaluator_llm.with_structured_output(EvaluatorOutput)
+    async def setup(self, tools: Optional[List[BaseTool]] = None):
+        # Passing tools skips launching the browser, e.g. when benchmarking against the stub LLM server.
+        if tools is None:
+            self._tools, self._browser, self._playwright = await SidekickTools.playwright_tools()
+            self._tools += await SidekickTools.other_tools()
+        else:
+            self._tools = tools
+        # One LLM per Gemini model so that ModelFailover can switch to the alternate when a circuit trips.
+        for model in (Constants.GEMINI_MODEL_LITE, Constants.GEMINI_MODEL_MEDIUM):
+            worker_llm = self._create_llm(model)
+            self._worker_llms_with_tools[model] = worker_llm.bind_tools(self._tools)
+            evaluator_llm = self._create_llm(model)
+            self._evaluator_llms_with_output[model] = evaluator_llm.with_structured_output(EvaluatorOutput,
+                                                                                           include_raw=True)
         await self._build_graph()
 
     async def run_superstep(self, message: str, success_criteria: str, history: List[str]):
@@ -65,6 +82,15 @@ class Sidekick:
                 if self._playwright:
                     asyncio.run(self._playwright.stop())
 
+    @staticmethod
+    def _create_llm(model: str) -> ChatGoogleGenerativeAI:
+        options = {}
+        endpoint = Constants.GEMINI_BASE_URL.split('/v1beta/')[0]
+        # Follow Constants.GEMINI_BASE_URL when it has been pointed somewhere else, such as the local stub server.
+        if endpoint != Constants.GEMINI_NATIVE_ENDPOINT:
+            options = {"client_options": {"api_endpoint": endpoint}, "transport": "rest"}
+        return ChatGoogleGenerativeAI(model=model, timeout=ModelFailover.ATTEMPT_TIMEOUT_SECONDS, max_retries=1, **options)
+
     def _worker(self, state: State) -> Dict[str, Any]:
         system_message = f"""You are a helpful assistant that can use tools to complete tasks.
     You keep working on a task until either you have a question or clarification for the user, or the success criteria is met.
@@ -102,7 +128,8 @@ class Sidekick:
             messages = [SystemMessage(content=system_message)] + messages
 
         # Invoke the LLM with tools
-        response = self._worker_llm_with_tools.invoke(messages)
+        messages = self._prompt_budget.fit(messages)
+        response = ModelFailover.call(lambda model: self._worker_llms_with_tools[model].invoke(messages))
 
         # Return updated state
         return {
@@ -129,16 +156,57 @@ class Sidekick:
         return conversation
 
     def _evaluator(self, state: State) -> State:
-        last_response = state["messages"][-1].content
-
         system_message = f"""You are an evaluator that determines if a task has been completed successfully by an Assistant.
     Assess the Assistant's last response based on the given criteria. Respond with your feedback, and with your decision on whether the success criteria has been met,
     and whether more input is needed from the user."""
 
+        # The conversation is the only part of the prompt that grows, so it is what gets trimmed to the budget.
+        template_tokens = TokenEstimator.estimate_text(system_message + self._get_evaluator_prompt(state, ""))
+        conversation = self._prompt_budget.fit([message for message in state["messages"]
+                                                if isinstance(message, (HumanMessage, AIMessage))],
+                                               reserved_tokens=template_tokens)
+        user_message = self._get_evaluator_prompt(state, self._format_conversation(conversation))
+
+        evaluator_messages = [SystemMessage(content=system_message), HumanMessage(content=user_message)]
+
+        output = self._invoke_evaluator(evaluator_messages)
+        # Malformed output is repaired locally; the evaluator is only asked again when that fails.
+        eval_result = output["parsed"] or StructuredOutputRepair.parse_or_reprompt(
+            self._get_raw_output(output), EvaluatorOutput,
+            lambda correction: self._get_raw_output(self._invoke_evaluator(evaluator_messages
+                                                                           + [HumanMessage(content=correction)])))
+        new_state = {
+            "messages": [{"role": "assistant", "content": f"Evaluator Feedback on this answer: {eval_result.feedback}"}],
+            "feedback_on_work": eval_result.feedback,
+            "success_criteria_met": eval_result.success_criteria_met,
+            "user_input_needed": eval_result.user_input_needed
+        }
+        return new_state
+
+    def _invoke_evaluator(self, messages: List[Any]) -> Dict[str, Any]:
+        return ModelFailover.call(lambda model: self._evaluator_llms_with_output[model].invoke(messages))
+
+    @staticmethod
+    def _get_raw_output(output: Dict[str, Any]) -> str:
+        if output["parsed"] is not None:
+            return output["parsed"].model_dump_json()
+        raw = output["raw"]
+        if raw.tool_calls:
+            return json.dumps(raw.tool_calls[0]["args"])
+        if raw.invalid_tool_calls:
+            return raw.invalid_tool_calls[0]["args"] or ''
+        if isinstance(raw.content, list):
+            return ''.join(part if isinstance(part, str) else part.get("text", '') for part in raw.content)
+        return raw.content
+
+    @staticmethod
+    def _get_evaluator_prompt(state: State, conversation: str) -> str:
+        last_response = state["messages"][-1].content
+
         user_message = f"""You are evaluating a conversation between the User and Assistant. You decide what action to take based on the last response from the Assistant.
 
     The entire conversation with the assistant, with the user's original request and all replies, is:
-    {self._format_conversation(state['messages'])}
+    {conversation}
 
     The success criteria for this assignment is:
     {state['success_criteria']}
@@ -156,17 +224,7 @@ class Sidekick:
         if state["feedback_on_work"]:
             user_message += f"Also, note that in a prior attempt from the Assistant, you provided this feedback: {state['feedback_on_work']}\n"
             user_message += "If you're seeing the Assistant repeating the same mistakes, then consider responding that user input is required."
-
-        evaluator_messages = [SystemMessage(content=system_message), HumanMessage(content=user_message)]
-
-        eval_result = self._evaluator_llm_with_output.invoke(evaluator_messages)
-        new_state = {
-            "messages": [{"role": "assistant", "content": f"Evaluator Feedback on this answer: {eval_result.feedback}"}],
-            "feedback_on_work": eval_result.feedback,
-            "success_criteria_met": eval_result.success_criteria_met,
-            "user_input_needed": eval_result.user_input_needed
-        }
-        return new_state
+        return user_message
 
     def _route_based_on_evaluation(self, state: State) -> str:
         if state["success_criteria_met"] or state["user_input_needed"]:
@@ -180,9 +238,9 @@ class Sidekick:
         graph_builder = graph.StateGraph(State)
 
         # Add nodes
-        graph_builder.add_node("worker", self._worker)
+        graph_builder.add_node("worker", Metrics.instrumented(self._WORKFLOW, "worker")(self._worker))
         graph_builder.add_node("tools", ToolNode(tools=self._tools))
-        graph_builder.add_node("evaluator", self._evaluator)
+        graph_builder.add_node("evaluator", Metrics.instrumented(self._WORKFLOW, "evaluator")(self._evaluator))
 
         # Add edges
         graph_builder.add_conditional_edges("worker", self._worker_router, {"tools": "tools", "evaluator": "evaluator"})
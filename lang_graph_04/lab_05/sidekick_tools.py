@@ -4,10 +4,12 @@ from langchain.agents import Tool
 from langchain_community.agent_toolkits import FileManagementToolkit, PlayWrightBrowserToolkit
 from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
 from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
-from langchain_core.tools import BaseTool
+from langchain_core.tools import BaseTool, StructuredTool
 from langchain_experimental.tools import PythonREPLTool
 from playwright.async_api import async_playwright, Browser, Playwright
 
+from common.cassettes.cassette import Cassette
+from common.search_index.local_search import LocalSearch
 from common.tools.pushover import Pushover
 from common.tools.serper import Serper
 
@@ -18,7 +20,7 @@ class SidekickTools:
         playwright = await async_playwright().start()
         browser = await playwright.chromium.launch(headless=False)
         toolkit = PlayWrightBrowserToolkit.from_browser(async_browser=browser)
-        return toolkit.get_tools(), browser, playwright
+        return [SidekickTools._recorded(tool) for tool in toolkit.get_tools()], browser, playwright
 
     @classmethod
     async def other_tools(cls):
@@ -27,16 +29,18 @@ class SidekickTools:
 
         tool_search =Tool(
             name="search",
-            func=Serper.run,
+            func=LocalSearch.run,
             description="Use this tool when you want to get the results of an online web search"
         )
 
+        batch_search = Serper.get_langchain_batch_tool()
+
         wikipedia = WikipediaAPIWrapper()
-        wiki_tool = WikipediaQueryRun(api_wrapper=wikipedia)
+        wiki_tool = cls._recorded(WikipediaQueryRun(api_wrapper=wikipedia))
 
         python_repl = PythonREPLTool()
 
-        return file_tools + [push_tool, tool_search, python_repl,  wiki_tool]
+        return file_tools + [push_tool, tool_search, batch_search, python_repl,  wiki_tool]
 
     @staticmethod
     def _push(text: str):
@@ -44,6 +48,22 @@ class SidekickTools:
         Pushover.push(text)
         return "success"
 
+    @staticmethod
+    def _recorded(tool: BaseTool) -> BaseTool:
+        """ Route a tool that reaches the network through the active cassette, keeping its name and schema """
+        kind = f'langchain.{tool.name}'
+
+        @Cassette.recorded(kind)
+        def run(**kwargs):
+            return tool.invoke(kwargs)
+
+        @Cassette.recorded(kind)
+        async def arun(**kwargs):
+            return await tool.ainvoke(kwargs)
+
+        return StructuredTool.from_function(func=run, coroutine=arun, name=tool.name,
+                                            description=tool.description, args_schema=tool.args_schema)
+
     @staticmethod
     def _get_file_tools():
         toolkit = FileManagementToolkit(root_dir="sandbox")
@@ -1,12 +1,16 @@
 import asyncio
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List
 
-from agents import Agent, RunResult, WebSearchTool, Runner
-from agents.model_settings import ModelSettings
+from agents import Agent, RunResult, RunResultStreaming, Runner
+from openai.types.responses import ResponseTextDeltaEvent
 
+from common.metrics.metrics import Metrics
 from common.open_ai_gemini_client import OpenAIGeminiClient
+from common.parsing.streaming_list_parser import StreamingListParser
+from common.resilience.model_failover import ModelFailover
 from common.tools.send_grid_email import SendGridEmail
+from common.tools.serper import Serper, SerperResult
 from open_ai_02.output_types.report_data import ReportData
 from open_ai_02.output_types.web_search_item import WebSearchItem
 from open_ai_02.output_types.web_search_plan import WebSearchPlan
@@ -16,11 +20,10 @@ load_dotenv(override=True)
 class DeepResearch:
 
     _HOW_MANY_SEARCHES = 3
-
-    @classmethod
-    def run_search_and_print(cls, search_term: str):
-        result = asyncio.run(cls._run_search_agent(search_term))
-        print(result)
+    # A 1000+ word report takes far longer to generate than the short calls the default attempt timeout is sized for.
+    _WRITER_TIMEOUT_SECONDS = 180.0
+    # How long a batch of searches waits for the planner to write more items before it is sent.
+    _SEARCH_BATCH_WINDOW_SECONDS = 0.25
 
     @classmethod
     def run_planner_and_print(cls, search_term: str):
@@ -29,16 +32,16 @@ class DeepResearch:
 
     @classmethod
     def run_and_print_end_to_end_research(cls, search_term: str):
-        result = cls._run_end_to_end_research(search_term)
+        result = asyncio.run(cls._run_end_to_end_research(search_term))
         print(result)
 
     @classmethod
     async def _run_end_to_end_research(cls, query: str) -> RunResult:
         print("Starting research...")
-        search_plan = await cls._plan_searches(query)
-        search_results = await cls._perform_searches(search_plan)
-        report = await cls._write_report(query, search_results)
-        final_output = await cls._send_email(report)
+        with Metrics.step('deep_research', 'end_to_end'):
+            search_results = await cls._plan_and_perform_searches(query)
+            report = await cls._write_report(query, search_results)
+            final_output = await cls._send_email(report)
         print("Hooray!")
         return final_output
 
@@ -47,31 +50,56 @@ class DeepResearch:
         return await Runner.run(cls._get_planner_agent(), search_term)
 
     @classmethod
-    async def _run_search_agent(cls, search_term: str):
-        return await Runner.run(cls._get_seach_agent(), search_term)
-
-    @classmethod
-    async def _plan_searches(cls, query: str) -> WebSearchPlan:
-        """ Use the planner_agent to plan which searches to run for the query """
+    async def _plan_and_perform_searches(cls, query: str) -> List[str]:
+        """ Stream the planner's output and start searching as soon as the planner has finished writing an item. Items
+            written within a short window of each other share one batched Serper request """
         print("Planning searches...")
-        result = await Runner.run(cls._get_planner_agent(), f"Query: {query}")
-        print(f"Will perform {len(result.final_output.searches)} searches")
-        return result.final_output
-
-    @classmethod
-    async def _perform_searches(cls, search_plan: WebSearchPlan) -> List[str]:
-        """ Call search() for each item in the search plan """
-        print("Searching...")
-        tasks = [asyncio.create_task(cls._search(item)) for item in search_plan.searches]
-        results = await asyncio.gather(*tasks)
+        parser = StreamingListParser[WebSearchItem](WebSearchPlan)
+        result = Runner.run_streamed(cls._get_planner_agent(), f"Query: {query}")
+        pending: List[WebSearchItem] = []
+        batches = []
+        started = 0
+        async for item in parser.aiter_items(cls._get_text_deltas(result)):
+            print(f"Searching for {item.query}...")
+            # An empty list means the last batch has been sent, so this item opens the next one.
+            if not pending:
+                batches.append(asyncio.create_task(cls._search_and_summarize_batch(pending)))
+            pending.append(item)
+            started += 1
+        # Anything the incremental parse missed is still in the validated plan.
+        search_plan = result.final_output if isinstance(result.final_output, WebSearchPlan) else parser.finish()
+        if search_plan.searches[started:]:
+            batches.append(asyncio.create_task(cls._search_and_summarize_batch(list(search_plan.searches[started:]))))
+        print(f"Will perform {len(search_plan.searches)} searches")
+        results = [summary for batch in await asyncio.gather(*batches) for summary in batch]
         print("Finished searching")
         return results
 
+    @staticmethod
+    async def _get_text_deltas(result: RunResultStreaming) -> AsyncIterator[str]:
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                yield event.data.delta
+
+    @classmethod
+    async def _search_and_summarize_batch(cls, pending: List[WebSearchItem]) -> List[str]:
+        """ Wait out the batch window, take every item written meanwhile, search for them all in one batch and then
+            summarize each result """
+        await asyncio.sleep(cls._SEARCH_BATCH_WINDOW_SECONDS)
+        items = pending[:]
+        pending.clear()
+        search_results = await Serper.arun_many([item.query for item in items])
+        return await asyncio.gather(*(cls._summarize(item, search_result)
+                                      for item, search_result in zip(items, search_results)))
+
     @classmethod
-    async def _search(cls, item: WebSearchItem) -> str:
-        """ Use the search agent to run a web search for each item in the search plan """
-        input = f"Search term: {item.query}\nReason for searching: {item.reason}"
-        result = await Runner.run(cls._get_seach_agent(), input)
+    async def _summarize(cls, item: WebSearchItem, search_result: SerperResult) -> str:
+        """ Use the summary agent to summarize the results already fetched for an item in the search plan """
+        if search_result.error is not None:
+            return f"Search for {item.query} failed: {search_result.error}"
+        input = (f"Search term: {item.query}\nReason for searching: {item.reason}\n"
+                 f"Search results:\n{search_result.result}")
+        result = await Runner.run(cls._get_summary_agent(), input)
         return result.final_output
 
     @classmethod
@@ -79,10 +107,12 @@ class DeepResearch:
         """ Use the writer agent to write a report based on the search results"""
         print("Thinking about report...")
         input = f"Original query: {query}\nSummarized search results: {search_results}"
-        result = await Runner.run(cls._get_writer_agent(), input)
+        with ModelFailover.attempt_timeout(cls._WRITER_TIMEOUT_SECONDS):
+            result = await Runner.run(cls._get_writer_agent(), input)
         print("Finished writing report")
         return result.final_output
 
+    @classmethod
     async def _send_email(cls, report: ReportData) -> RunResult:
         """ Use the email agent to send an email with the report """
         print("Writing email...")
@@ -99,9 +129,15 @@ class DeepResearch:
 
     @classmethod
     def _get_email_agent(cls) -> Agent:
+        if SendGridEmail.use_llm_html_converter():
+            return Agent(name="Email agent",
+                         instructions=cls._get_email_agent_instructions(),
+                         tools=[SendGridEmail.send_bulk_email_tool_html],
+                         model=OpenAIGeminiClient.get_model())
+        # The report is rendered to HTML locally when sent, so the model only has to pick a subject.
         return Agent(name="Email agent",
-                     instructions=cls._get_email_agent_instructions(),
-                     tools=[SendGridEmail.send_email_tool_html],
+                     instructions=cls._get_markdown_email_agent_instructions(),
+                     tools=[SendGridEmail.send_bulk_markdown_email_tool],
                      model=OpenAIGeminiClient.get_model())
 
     @classmethod
@@ -112,17 +148,14 @@ class DeepResearch:
                      output_type=WebSearchPlan)
 
     @classmethod
-    def _get_seach_agent(cls) -> Agent:
-        # Web search tool is open ai hosted and therefore won't work unless you are using open ai model.
-        return Agent(name="Search agent",
-                     instructions=cls._get_search_agent_instructions(),
-                     tools=[WebSearchTool(search_context_size="low")],
-                     model=OpenAIGeminiClient.get_model(),
-                     model_settings=ModelSettings(tool_choice="required")) # tool_choice="required" means the agent must use the tool.
+    def _get_summary_agent(cls) -> Agent:
+        return Agent(name="Summary agent",
+                     instructions=cls._get_summary_agent_instructions(),
+                     model=OpenAIGeminiClient.get_model())
 
     @staticmethod
-    def _get_search_agent_instructions() -> str:
-        return ("You are a research assistant. Given a search term, you search the web for that term and "
+    def _get_summary_agent_instructions() -> str:
+        return ("You are a research assistant. Given a search term and the results of a web search for that term, you "
                 "produce a concise summary of the results. The summary must 2-3 paragraphs and less than 300 "
                 "words. Capture the main points. Write succintly, no need to have complete sentences or good "
                 "grammar. This will be consumed by someone synthesizing a report, so it's vital you capture the "
@@ -139,6 +172,12 @@ class DeepResearch:
                 "You will be provided with a detailed report. You should use your tool to send one email, providing the "
                 "report converted into clean, well presented HTML with an appropriate subject line.")
 
+    @staticmethod
+    def _get_markdown_email_agent_instructions() -> str:
+        return ("You are able to send an email based on a detailed report. "
+                "You will be provided with a detailed report in markdown. You should use your tool to send one email, "
+                "providing the report unchanged as the markdown body with an appropriate subject line.")
+
     @staticmethod
     def _get_writer_agent_instructions() -> str:
         return ("You are a senior researcher tasked with writing a cohesive report for a research query. "
@@ -149,50 +188,9 @@ class DeepResearch:
                 "for 5-10 pages of content, at least 1000 words.")
 
 if __name__ == '__main__':
-    # DeepResearch.run_search_and_print("Latest AI Agent frameworks in 2025")
     DeepResearch.run_planner_and_print("Latest AI Agent frameworks in 2025")
 
 #Output:
-# DeepResearch.run_search_and_print("Latest AI Agent frameworks in 2025") -->
-# Throws an error because we are trying to use non open ai model with open ai hosted tool.
-# Traceback (most recent call last):
-#   File "/home/somesh/Git/agentic-ai/open_ai_02/deep_research_03.py", line 44, in <module>
-#     DeepResearch.run_search_and_print("Latest AI Agent frameworks in 2025")
-#   File "/home/somesh/Git/agentic-ai/open_ai_02/deep_research_03.py", line 20, in run_search_and_print
-#     result = asyncio.run(cls._run_search_agent(search_term))
-#              ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/usr/lib/python3.12/asyncio/runners.py", line 194, in run
-#     return runner.run(main)
-#            ^^^^^^^^^^^^^^^^
-#   File "/usr/lib/python3.12/asyncio/runners.py", line 118, in run
-#     return self._loop.run_until_complete(task)
-#            ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/usr/lib/python3.12/asyncio/base_events.py", line 687, in run_until_complete
-#     return future.result()
-#            ^^^^^^^^^^^^^^^
-#   File "/home/somesh/Git/agentic-ai/open_ai_02/deep_research_03.py", line 25, in _run_search_agent
-#     return await Runner.run(cls._get_seach_agent(), search_term)
-#            ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/home/somesh/PythonEnvs/P3.12_LLM/lib/python3.12/site-packages/agents/run.py", line 218, in run
-#     input_guardrail_results, turn_result = await asyncio.gather(
-#                                            ^^^^^^^^^^^^^^^^^^^^^
-#   File "/home/somesh/PythonEnvs/P3.12_LLM/lib/python3.12/site-packages/agents/run.py", line 760, in _run_single_turn
-#     new_response = await cls._get_new_response(
-#                    ^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/home/somesh/PythonEnvs/P3.12_LLM/lib/python3.12/site-packages/agents/run.py", line 919, in _get_new_response
-#     new_response = await model.get_response(
-#                    ^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/home/somesh/PythonEnvs/P3.12_LLM/lib/python3.12/site-packages/agents/models/openai_chatcompletions.py", line 61, in get_response
-#     response = await self._fetch_response(
-#                ^^^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/home/somesh/PythonEnvs/P3.12_LLM/lib/python3.12/site-packages/agents/models/openai_chatcompletions.py", line 216, in _fetch_response
-#     converted_tools = [Converter.tool_to_openai(tool) for tool in tools] if tools else []
-#                        ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-#   File "/home/somesh/PythonEnvs/P3.12_LLM/lib/python3.12/site-packages/agents/models/chatcmpl_converter.py", line 452, in tool_to_openai
-#     raise UserError(
-# agents.exceptions.UserError: Hosted tools are not supported with the ChatCompletions API. Got tool type: <class 'agents.tool.WebSearchTool'>, tool: WebSearchTool(user_location=None, search_context_size='low')
-# OPENAI_API_KEY is not set, skipping trace export
-
 # DeepResearch.run_planner_and_print("Latest AI Agent frameworks in 2025") -->
 # RunResult:
 # - Last agent: Agent(name="PlannerAgent", ...)
@@ -114,11 +114,17 @@ class SalesAgent:
                                model=OpenAIGeminiClient.get_model())
         subject_tool = subject_writer.as_tool(tool_name="subject_writer",
                                               tool_description="Write a subject for a cold sales email")
-        tools = [subject_tool,
-                 SendGridEmail.get_html_converter_tool(OpenAIGeminiClient.get_model()),
-                 SendGridEmail.send_email_tool_html]
+        if SendGridEmail.use_llm_html_converter():
+            tools = [subject_tool,
+                     SendGridEmail.get_html_converter_tool(OpenAIGeminiClient.get_model()),
+                     SendGridEmail.send_email_tool_html]
+            instructions = cls._get_emailer_agent_instructions()
+        else:
+            # The body is rendered to HTML locally when sent, saving a model call and the HTML round-trip.
+            tools = [subject_tool, SendGridEmail.send_markdown_email_tool]
+            instructions = cls._get_markdown_emailer_agent_instructions()
         emailer_agent = Agent(name="Email Manager",
-                              instructions=cls._get_emailer_agent_instructions(),
+                              instructions=instructions,
                               tools=tools,
                               model=OpenAIGeminiClient.get_model(),
                               handoff_description="Convert an email to HTML and send it")
@@ -181,6 +187,12 @@ class SalesAgent:
                 "then use the html_converter tool to convert the body to HTML. "
                 "Finally, you use the send_html_email tool to send the email with the subject and HTML body.")
 
+    @staticmethod
+    def _get_markdown_emailer_agent_instructions() -> str:
+        return ("You are an email formatter and sender. You receive the body of an email to be sent. "
+                "You first use the subject_writer tool to write a subject for the email, "
+                "then use the send_markdown_email_tool tool to send the email with the subject and markdown body.")
+
 if __name__ == '__main__':
     sales_agent = SalesAgent()
     # sales_agent.print_sample_email_for_all_agents("Write a cold sales email")
@@ -0,0 +1,26 @@
+import pytest
+
+from common.cassettes.cassette import Cassette, CassetteMiss, CassetteMode
+
+def _record(path: str, calls: int):
+    cassette = Cassette(path, CassetteMode.RECORD)
+    for number in range(calls):
+        cassette.record_or_replay('tool', {"query": "q"}, lambda: f"result {number}")
+    cassette.save()
+
+def test_strict_replay_raises_on_a_call_beyond_those_recorded(tmp_path):
+    path = str(tmp_path / 'calls.jsonl.gz')
+    _record(path, 2)
+    cassette = Cassette(path, CassetteMode.REPLAY)
+    assert [cassette.record_or_replay('tool', {"query": "q"}, lambda: 'live') for _ in range(2)] == ['result 0',
+                                                                                                     'result 1']
+    with pytest.raises(CassetteMiss):
+        cassette.record_or_replay('tool', {"query": "q"}, lambda: 'live')
+
+def test_lenient_replay_reuses_the_last_result(tmp_path):
+    path = str(tmp_path / 'calls.jsonl.gz')
+    _record(path, 1)
+    cassette = Cassette(path, CassetteMode.REPLAY, strict=False)
+    assert [cassette.record_or_replay('tool', {"query": "q"}, lambda: 'live') for _ in range(2)] == ['result 0',
+                                                                                                     'result 0']
+    assert cassette.record_or_replay('tool', {"query": "other"}, lambda: 'live') == 'live'
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from common.resilience.call_budget import CallBudget, CallBudgetExceeded
+from common.resilience.circuit_breaker import CircuitBreaker, CircuitState
+from common.resilience.model_failover import ModelFailover
+
+MODEL = ModelFailover._MODELS[0]
+FALLBACK_MODEL = ModelFailover._MODELS[1]
+
+def _get_half_open_breaker(monkeypatch) -> CircuitBreaker:
+    breaker = CircuitBreaker(MODEL, min_calls=1, open_seconds=0.0)
+    monkeypatch.setitem(ModelFailover._BREAKERS, MODEL, breaker)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitState.OPEN
+    return breaker
+
+def test_cancelled_probe_releases_the_half_open_breaker(monkeypatch):
+    breaker = _get_half_open_breaker(monkeypatch)
+
+    async def run():
+        probe = asyncio.create_task(ModelFailover.call_async(lambda model: asyncio.sleep(60), [MODEL]))
+        await asyncio.sleep(0.05)
+        assert breaker.state == CircuitState.HALF_OPEN
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+    asyncio.run(run())
+    assert breaker.allow_request()
+
+def test_successful_probe_closes_the_breaker(monkeypatch):
+    breaker = _get_half_open_breaker(monkeypatch)
+
+    async def reply(model: str) -> str:
+        return model
+
+    assert asyncio.run(ModelFailover.call_async(reply, [MODEL])) == MODEL
+    assert breaker.state == CircuitState.CLOSED
+
+def test_call_budget_counts_failover_attempts_across_tasks(monkeypatch):
+    for model in (MODEL, FALLBACK_MODEL):
+        monkeypatch.setitem(ModelFailover._BREAKERS, model, CircuitBreaker(model))
+    attempted = []
+
+    async def fail_over(model: str) -> str:
+        attempted.append(model)
+        if model == MODEL:
+            raise RuntimeError("model unavailable")
+        return model
+
+    async def run():
+        with CallBudget.limit(3) as budget:
+            # The first call fails over, so it spends two attempts and leaves one for the second task.
+            assert await asyncio.create_task(ModelFailover.call_async(fail_over)) == FALLBACK_MODEL
+            assert budget.get_remaining() == 1
+            with pytest.raises(CallBudgetExceeded):
+                await asyncio.create_task(ModelFailover.call_async(fail_over))
+            assert budget.get_remaining() == 0
+
+    asyncio.run(run())
+    assert attempted == [MODEL, FALLBACK_MODEL, MODEL]
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from common.concurrency.single_flight import SingleFlight
+
+class _Call:
+    """ A call that blocks until released, recording how often it started and whether it was cancelled """
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return 'result'
+
+def test_identical_calls_share_one_execution():
+    single_flight = SingleFlight()
+
+    async def run():
+        call = _Call()
+        waiters = [asyncio.create_task(single_flight.do('key', call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        call.release.set()
+        assert await asyncio.gather(*waiters) == ['result'] * 3
+        assert call.started == 1
+
+    asyncio.run(run())
+    assert single_flight.stats() == {"calls": 3, "coalesced": 2}
+
+def test_one_waiter_leaving_does_not_cancel_the_call_for_the_others():
+    single_flight = SingleFlight()
+
+    async def run():
+        call = _Call()
+        leaving = asyncio.create_task(single_flight.do('key', call))
+        staying = asyncio.create_task(single_flight.do('key', call))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.gather(leaving, return_exceptions=True)
+        call.release.set()
+        assert await staying == 'result'
+        assert not call.cancelled
+
+    asyncio.run(run())
+
+def test_last_waiter_leaving_cancels_the_call_and_releases_the_key():
+    single_flight = SingleFlight()
+
+    async def run():
+        abandoned = _Call()
+        waiters = [asyncio.create_task(single_flight.do('key', abandoned)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert abandoned.cancelled
+
+        # A new caller starts a fresh call rather than joining the cancelled one.
+        fresh = _Call()
+        fresh.release.set()
+        assert await single_flight.do('key', fresh) == 'result'
+        assert fresh.started == 1
+
+    asyncio.run(run())
+    assert not single_flight._waiters
+
+def test_failed_call_is_shared_and_then_forgotten():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("model unavailable")
+
+    async def run():
+        results = await asyncio.gather(single_flight.do('key', fail), single_flight.do('key', fail),
+                                       return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        retry = _Call()
+        retry.release.set()
+        assert await single_flight.do('key', retry) == 'result'
+
+    asyncio.run(run())
+    assert single_flight.stats() == {"calls": 3, "coalesced": 1}
+
+def test_sync_callers_share_the_leader_result():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow() -> str:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do_sync('key', slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(single_flight.do_sync('key', slow)))
+    follower.start()
+    while single_flight.stats()["coalesced"] == 0:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ['result', 'result']
+    assert len(calls) == 1
+
+def test_sync_failure_is_not_kept_for_later_callers():
+    single_flight = SingleFlight()
+
+    def fail():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        single_flight.do_sync('key', fail)
+    with pytest.raises(ValueError):
+        single_flight.do_sync('key', fail)
+    assert single_flight.stats() == {"calls": 2, "coalesced": 0}
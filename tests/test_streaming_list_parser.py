@@ -0,0 +1,63 @@
+import asyncio
+from typing import List
+
+import pytest
+
+pytest.importorskip('pydantic')
+from pydantic import BaseModel
+
+from common.parsing.streaming_list_parser import StreamingListParser
+
+class Search(BaseModel):
+    reason: str
+    query: str
+
+class SearchPlan(BaseModel):
+    summary: str
+    searches: List[Search]
+
+class Tags(BaseModel):
+    tags: List[int]
+
+PLAN = ('```json\n{"summary": "a {tricky} \\"plan\\"", "searches": ['
+        '{"reason": "brackets ] and } in strings", "query": "first"}, '
+        '{"reason": "escaped \\\\ and \\" quotes", "query": "second"}]}\n```')
+
+def _feed(parser: StreamingListParser, chunks: List[str]) -> List[list]:
+    return [parser.feed(chunk) for chunk in chunks]
+
+def test_emits_each_item_as_soon_as_it_is_complete():
+    parser = StreamingListParser(SearchPlan)
+    first_end = PLAN.index('}, ') + 1
+    emitted = _feed(parser, [PLAN[:first_end - 1], PLAN[first_end - 1:first_end], PLAN[first_end:]])
+    assert emitted[0] == []
+    assert [search.query for search in emitted[1]] == ['first']
+    assert [search.query for search in emitted[2]] == ['second']
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64])
+def test_items_split_across_any_chunk_boundary(size):
+    parser = StreamingListParser(SearchPlan)
+    items = [item for emitted in _feed(parser, [PLAN[i:i + size] for i in range(0, len(PLAN), size)])
+             for item in emitted]
+    assert [search.reason for search in items] == ['brackets ] and } in strings', 'escaped \\ and " quotes']
+    assert parser.finish().summary == 'a {tricky} "plan"'
+
+def test_scalar_items_end_at_the_comma_or_bracket():
+    parser = StreamingListParser(Tags)
+    assert _feed(parser, ['{"tags": [1', '2, 3', '4', ']}']) == [[], [12], [], [34]]
+
+def test_skips_invalid_items_and_keeps_going():
+    parser = StreamingListParser(SearchPlan)
+    items = parser.feed('{"summary": "s", "searches": [{"reason": "no query"}, {"reason": "r", "query": "q"}]}')
+    assert [search.query for search in items] == ['q']
+    assert parser.invalid_items == 1
+
+def test_aiter_items_yields_items_from_a_stream():
+    async def stream():
+        for i in range(0, len(PLAN), 5):
+            yield PLAN[i:i + 5]
+
+    async def collect():
+        return [search.query async for search in StreamingListParser(SearchPlan).aiter_items(stream())]
+
+    assert asyncio.run(collect()) == ['first', 'second']
@@ -0,0 +1,62 @@
+from enum import Enum
+from typing import List
+
+import pytest
+
+pytest.importorskip('pydantic')
+from pydantic import BaseModel
+
+from common.parsing.structured_output_repair import StructuredOutputRepair
+from common.response_formats.evaluation import Evaluation
+
+class Verdict(str, Enum):
+    APPROVE = 'approve'
+    REJECT = 'reject'
+
+class Review(BaseModel):
+    verdict: Verdict
+    passed: bool
+    notes: List[str]
+
+@pytest.mark.parametrize('text', [
+    '{"is_acceptable": true, "feedback": "Good",}',
+    '```json\n{"is_acceptable": true, "feedback": "Good"}\n```',
+    "{'is_acceptable': True, 'feedback': 'Good'}",
+    '{is_acceptable: true, feedback: "Good"}',
+    'Here is my evaluation: {"is_acceptable": true, "feedback": "Good"} Hope that helps.',
+])
+def test_repairs_almost_json(text):
+    assert StructuredOutputRepair.parse(text, Evaluation) == Evaluation(is_acceptable=True, feedback='Good')
+
+def test_keeps_a_fence_inside_a_string_value():
+    text = '{"is_acceptable": true, "feedback": "Use ```python\\nprint(1)\\n``` here",}'
+    assert StructuredOutputRepair.parse(text, Evaluation).feedback == 'Use ```python\nprint(1)\n``` here'
+
+def test_closes_a_string_and_brackets_cut_off_by_truncation():
+    evaluation = StructuredOutputRepair.parse('{"is_acceptable": false, "feedback": "Too vag', Evaluation)
+    assert evaluation == Evaluation(is_acceptable=False, feedback='Too vag')
+
+def test_drops_a_value_cut_off_before_it_started():
+    assert StructuredOutputRepair.repair('{"passed": true, "notes": ["a", "b"], "verdict": ') == \
+        '{"passed": true, "notes": ["a", "b"]}'
+
+def test_coerces_loosely_written_enums_and_booleans():
+    review = StructuredOutputRepair.parse('{"Verdict": "APPROVE", "passed": "Yes.", "notes": ["fine"]}', Review)
+    assert review == Review(verdict=Verdict.APPROVE, passed=True, notes=['fine'])
+
+def test_raises_when_the_text_cannot_be_repaired():
+    with pytest.raises(ValueError):
+        StructuredOutputRepair.parse('I cannot evaluate this response.', Evaluation)
+
+def test_reprompts_only_when_repair_fails():
+    corrections = []
+
+    def reprompt(correction: str) -> str:
+        corrections.append(correction)
+        return '{"is_acceptable": true, "feedback": "Fixed"}'
+
+    assert StructuredOutputRepair.parse_or_reprompt('{"is_acceptable": true, "feedback": "Ok",}', Evaluation,
+                                                    reprompt).feedback == 'Ok'
+    assert not corrections
+    assert StructuredOutputRepair.parse_or_reprompt('no json here', Evaluation, reprompt).feedback == 'Fixed'
+    assert len(corrections) == 1 and 'Evaluation' in corrections[0]